@@ -0,0 +1,70 @@
+"""
+Benchmark of the library API: task operations per second through `TaskStore`, one write per
+mutation, against `AsyncTaskStore` with many concurrent callers, whose queued mutations are
+written together with one flush per batch. Half of the operations are `add`, the other half
+`mark` of a task added before.
+
+Usage:
+    python benchmarks/bench_async.py [operations] [callers] [backend]
+"""
+import os, sys, json, time, asyncio, tempfile
+from common import load_cli, synthetic_tasks
+
+cli = load_cli()
+
+
+def open_store(directory: str, backend: str, tasks: int):
+    path = os.path.join(directory, backend, 'Database.json')
+    os.makedirs(os.path.dirname(path))
+    with open(path, mode="w", encoding="utf-8") as fp:
+        json.dump(synthetic_tasks(tasks), fp)
+    if backend in ('json', 'wal'):
+        return cli.TaskStore(cli.STORAGE_BACKENDS[backend](path))
+    extension = {'sqlite': '.sqlite3', 'binary': '.tasks', 'segments': '.segments'}[backend]
+    database = cli.STORAGE_BACKENDS[backend](os.path.splitext(path)[0] + extension)
+    database.migrate(cli.Database(path).data)
+    return cli.TaskStore(database)
+
+
+def sequential(store, operations: int) -> float:
+    start = time.perf_counter()
+    for n in range(operations // 2):
+        task = store.add(f"benchmark task {n}")
+        store.mark(task.id, 'done')
+    return time.perf_counter() - start
+
+
+async def concurrent(store, operations: int, callers: int) -> float:
+    async def caller(count: int):
+        for n in range(count):
+            task = await store.add(f"benchmark task {n}")
+            await store.mark(task.id, 'done')
+
+    start = time.perf_counter()
+    await asyncio.gather(*(caller(operations // 2 // callers) for _ in range(callers)))
+    await store.flush()
+    return time.perf_counter() - start
+
+
+def main():
+    operations = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000
+    callers = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    backend = sys.argv[3] if len(sys.argv) > 3 else 'wal'
+    os.environ['TASKCLI_HISTORY'] = '0'
+    with tempfile.TemporaryDirectory() as directory:
+        store = open_store(os.path.join(directory, 'sequential'), backend, 10_000)
+        before = sequential(store, operations)
+        store.close()
+
+        store = cli.AsyncTaskStore(open_store(os.path.join(directory, 'concurrent'), backend, 10_000))
+        after = asyncio.run(concurrent(store, operations, callers))
+        asyncio.run(store.aclose())
+
+    print(f"{operations} operations, {backend}, 10000 tasks")
+    print(f"TaskStore           : {operations / before:10.0f} operations/s")
+    print(f"AsyncTaskStore x{callers:<4}: {operations / after:10.0f} operations/s")
+    print(f"speedup             : {before / after:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Micro-benchmark of the `list` table renderer: per-row cost of `Database._format` with the
+compiled row templates and memoized dates, against the renderer it replaced (kept below
+as `legacy_format`, calling `Color.color` and `strftime` for every cell).
+
+Usage:
+    python benchmarks/bench_format.py [tasks] [repeat]
+"""
+import re, sys, time
+from common import load_cli, synthetic_tasks
+
+cli = load_cli()
+Color = cli.Color
+
+
+def legacy_format(tasks):
+    header = f"{Color.color('Task ID', color='b-blue'):<18} | " \
+            f"{Color.color('Description', color='b-green'):<60} | " \
+            f"{Color.color('Status', color='b-yellow'):<22} | " \
+            f"{Color.color('Created At', color='b-cyan'):<25} | " \
+            f"{Color.color('Updated At', color='b-cyan'):<25}"
+    yield header
+    yield "-" * 112
+    
+    def create_new_raw(key, task, status, created_at, updated_at):
+        task_color = 'green' if status == 'Completed' else 'red'
+        return (
+            f"{Color.color(key, color='red'):<18} | " 
+            f"{Color.color(task, color='cyan'):<60} | " 
+            f"{Color.color(status, color=task_color):<22} | " 
+            f"{Color.color(created_at, color='cyan'):<25} | " 
+            f"{Color.color(updated_at, color='cyan'):<25}"
+        )
+    
+    for key, task in tasks:
+        created_at = time.strftime("%d %b %y", time.localtime(task['createdAt']))
+        updated_at = time.strftime("%d %b %y", time.localtime(task['updatedAt']))
+        description = task['description']
+        yield create_new_raw(key, description[:50], task['status'], created_at, updated_at)
+        remaining_description = description[50:]
+        while remaining_description:
+            yield create_new_raw('', remaining_description[:50], '', '', '')
+            remaining_description = remaining_description[50:]
+
+
+def measure(render, items, repeat: int) -> tuple[float, int]:
+    best, rows = float('inf'), 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = sum(1 for _ in render(items))
+        best = min(best, time.perf_counter() - start)
+    return best, rows
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    items = list(synthetic_tasks(count).items())
+    database = cli.Database.__new__(cli.Database)
+    
+    # the templates pad inside the color codes, so compare what ends up on the terminal
+    plain = lambda rows: [re.sub(r'\x1b\[[0-9;]*m', '', row) for row in rows]
+    assert plain(legacy_format(items[:2000])) == plain(database._format(items[:2000])), "renderers disagree"
+    
+    before, rows = measure(legacy_format, items, repeat)
+    after, _ = measure(database._format, items, repeat)
+    print(f"{count} tasks, {rows} rows")
+    print(f"legacy    : {before * 1e9 / rows:8.0f} ns/row  {before:.3f} s")
+    print(f"templates : {after * 1e9 / rows:8.0f} ns/row  {after:.3f} s")
+    print(f"speedup   : {before / after:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Memory benchmark of the in-memory task store: bytes per task, load time and full listing
+time of the default dict of task dicts against the columnar `TaskTable` (`TASKCLI_COMPACT=1`),
+both loaded from the same synthetic `Database.json`.
+
+Usage:
+    python benchmarks/bench_memory.py [tasks]
+"""
+import os, gc, sys, json, time, tempfile, tracemalloc
+from common import load_cli, synthetic_tasks
+
+cli = load_cli()
+
+
+def measure(path: str, columnar: bool) -> dict:
+    os.environ['TASKCLI_COMPACT'] = '1' if columnar else '0'
+    database = cli.Database(path)
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    data = database.data
+    load = time.perf_counter() - start
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    rows = sum(1 for _ in database.List('all'))
+    listing = time.perf_counter() - start
+    return {'tasks': len(data), 'retained': retained, 'peak': peak, 'load': load, 'list': listing, 'rows': rows}
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'Database.json')
+        with open(path, mode="w", encoding="utf-8") as fp:
+            json.dump(synthetic_tasks(count), fp)
+
+        results = {name: measure(path, columnar) for name, columnar in (('dict', False), ('columnar', True))}
+
+    assert results['dict']['rows'] == results['columnar']['rows'], "stores disagree"
+    print(f"{count} tasks")
+    for name, result in results.items():
+        print(f"{name:<9}: {result['retained'] / count:7.0f} B/task retained  {result['peak'] / count:7.0f} B/task peak  "
+              f"load {result['load']:.3f} s  list {result['list']:.3f} s")
+    print(f"memory   : {results['dict']['retained'] / results['columnar']['retained']:.2f}x less retained")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Benchmark of the output formats of `list all`: time to render every task of a synthetic database
+as the colored table, the plain table (stdout not a terminal) and as `--format json|ndjson|tsv`,
+written to /dev/null through `write_output` like the CLI does.
+
+Usage:
+    python benchmarks/bench_output.py [tasks]
+"""
+import os, sys, json, time, tempfile
+from common import load_cli, synthetic_tasks
+
+cli = load_cli()
+
+
+def measure(database, format: str, colored: bool, repeat: int = 3) -> float:
+    cli.Color.enabled = colored
+    database.structured = format != 'table'
+    best = float('inf')
+    with open(os.devnull, mode="w", encoding="utf-8") as devnull:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            cli.write_output(database.List('all'), devnull, format)
+            best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'Database.json')
+        with open(path, mode="w", encoding="utf-8") as fp:
+            json.dump(synthetic_tasks(count), fp)
+        database = cli.Database(path)
+        database.data
+
+        print(f"{count} tasks")
+        baseline = None
+        for name, format, colored in (('table', 'table', True), ('plain', 'table', False),
+                                      ('json', 'json', False), ('ndjson', 'ndjson', False), ('tsv', 'tsv', False)):
+            seconds = measure(database, format, colored)
+            baseline = baseline or seconds
+            print(f"  {name:<7}: {seconds:7.3f} s  {count / seconds:10.0f} tasks/s  {seconds / baseline:5.2f}x the colored table")
+
+
+if __name__ == "__main__":
+    main()
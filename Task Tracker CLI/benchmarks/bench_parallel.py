@@ -0,0 +1,47 @@
+"""
+Scaling benchmark of parallel `list` rendering: time to format every task of a synthetic
+database with `Database.List('all', workers=n)` for 1, 2, 4 and 8 worker processes, with the
+speedup over the single-process listing. The speedup is bounded by the cores the process may run
+on: with a single core `list --workers` formats in-process, so every run measures the same path.
+
+Usage:
+    python benchmarks/bench_parallel.py [tasks] [workers,...]
+"""
+import os, sys, json, time, tempfile
+from common import load_cli, synthetic_tasks
+
+cli = load_cli()
+
+
+def measure(database, workers: int, repeat: int = 3) -> tuple[float, int]:
+    best, size = float('inf'), 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = sum(len(block) + 1 for block in database.List('all', workers=workers))
+        best = min(best, time.perf_counter() - start)
+    return best, size
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    workers = [int(n) for n in (sys.argv[2] if len(sys.argv) > 2 else '1,2,4,8').split(',')]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'Database.json')
+        with open(path, mode="w", encoding="utf-8") as fp:
+            json.dump(synthetic_tasks(count), fp)
+        database = cli.Database(path)
+        database.data
+
+        cores = cli.parallel_workers(0)
+        print(f"{count} tasks, {cores} core{'s' if cores > 1 else ''} available"
+              + (", every run formats in-process" if cores == 1 else ""))
+        serial = None
+        for n in workers:
+            seconds, size = measure(database, n)
+            serial = serial or seconds
+            print(f"  {n} worker{'s' if n > 1 else ' '}: {seconds:7.3f} s  {count / seconds:10.0f} tasks/s  "
+                  f"{size / 1e6:6.1f} MB  {serial / seconds:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
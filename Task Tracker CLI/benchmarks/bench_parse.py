@@ -0,0 +1,70 @@
+"""
+Micro-benchmark of command validation: commands per second through `Parser.check_syntax` with
+the compiled `CommandSpec`s, against the validator it replaced (kept below as `legacy_check_syntax`,
+rebuilding the argument lists and fallbacks of the token on every call and casting twice).
+
+Usage:
+    python benchmarks/bench_parse.py [commands] [repeat]
+"""
+import sys, time
+from common import load_cli
+
+cli = load_cli()
+COMMANDS = [['add', 'x'], ['update', '1', 'y'], ['delete', '3'], ['mark-done', '4'],
+            ['mark-in-progress', '5'], ['list', 'done', '--limit', '10'], ['list'], ['search', 'report', '--limit', '5']]
+
+
+def legacy_check_syntax(parser, token):
+    if not token[0].lower() in parser.valid_keywords.keys():
+        raise cli.SyntaxError(text="Invalid command", data_list=token, index=0)
+    validate = parser.valid_keywords[token[0]]
+    args_provided, positions, flags = parser.split_flags(token, validate.flags or {})
+    expected_args = list(validate.argument.keys())
+    options = validate.optiones if validate.optiones is not None else {}
+    fallbacks = validate.fallback if validate.fallback is not None else {}
+    if len(args_provided) < len(expected_args):
+        for missing_arg in expected_args[len(args_provided):]:
+            if missing_arg in fallbacks:
+                args_provided.append(fallbacks[missing_arg])
+            else:
+                raise cli.SyntaxError(text=f"Missing required argument: {missing_arg}", data_list=token, index=len(token))
+    elif len(args_provided) > len(expected_args):
+        raise cli.SyntaxError(text="Too many arguments provided", data_list=token, index=len(token) - 1)
+    for num, (arg, (arg_name, expected_type)) in enumerate(zip(args_provided, validate.argument.items())):
+        try:
+            expected_type(arg)
+        except ValueError:
+            raise cli.SyntaxError(text=f"Argument '{arg}' should be of type {expected_type.__name__}", data_list=token, index=positions[num])
+        if arg_name in options and arg not in options[arg_name]:
+            raise cli.SyntaxError(text=f"Argument '{arg}' should be one of {options[arg_name]}", data_list=token, index=positions[num])
+    # the keyword arguments were built on every call of the returned lambda, built here to compare the same work
+    arguments = validate.generate_key(args_provided)
+    return lambda: validate.method(**arguments, **flags)
+
+
+def measure(check, commands, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for command in commands:
+            check(command)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    commands = (COMMANDS * (count // len(COMMANDS) + 1))[:count]
+    parser = cli.build_parser(cli.Database.__new__(cli.Database))
+
+    before = measure(lambda command: legacy_check_syntax(parser, command), commands, repeat)
+    after = measure(parser.check_syntax, commands, repeat)
+    print(f"{count} commands")
+    print(f"legacy   : {count / before:12.0f} commands/s  {before * 1e9 / count:6.0f} ns/command")
+    print(f"compiled : {count / after:12.0f} commands/s  {after * 1e9 / count:6.0f} ns/command")
+    print(f"speedup  : {before / after:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Benchmark of the deadline commands: `next`, `overdue` and `due --before` answered from the sorted
+`Schedule` index of a loaded database (the daemon keeps it between commands), against a scan of
+every task with `heapq.nsmallest`. Also reports the time the index takes to build on first use,
+which a one-shot CLI process pays once per command (sqlite keeps a SQL index instead).
+
+Usage:
+    python benchmarks/bench_schedule.py [tasks] [share with a due time] [backend]
+"""
+import os, sys, json, time, heapq, random, tempfile
+from common import load_cli, synthetic_tasks
+
+cli = load_cli()
+
+
+def best(function, repeat: int = 20) -> float:
+    fastest = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        fastest = min(fastest, time.perf_counter() - start)
+    return fastest
+
+
+def scan(data, since: float, before: float, limit: int) -> list:
+    """The scheduled tasks without an index: every task is checked, the `limit` first kept."""
+    entries = (cli.Schedule.entry(key, task) for key, task in data.items())
+    return heapq.nsmallest(limit, (entry for entry in entries if entry is not None and since <= entry[0] < before))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    share = float(sys.argv[2]) if len(sys.argv) > 2 else 0.3
+    backend = sys.argv[3] if len(sys.argv) > 3 else 'json'
+    os.environ['TASKCLI_STORAGE'] = backend
+    os.environ['TASKCLI_HISTORY'] = '0'
+    now = time.time()
+    rng = random.Random(0)
+    tasks = synthetic_tasks(count)
+    for task in tasks.values():
+        if rng.random() < share:
+            task['due'] = now + rng.uniform(-30, 30) * 86400
+            task['priority'] = rng.randint(0, 5)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'Database.json')
+        with open(path, mode="w", encoding="utf-8") as fp:
+            json.dump(tasks, fp)
+        del tasks
+        if backend != 'json':
+            cli.open_database(path).migrate(cli.Database(path).data)
+        database = cli.open_database(path)
+
+        week = now + 7 * 86400
+        queries = (
+            ('next 10', lambda: database._scheduled(None, None, 10), lambda: scan(database.data, -float('inf'), float('inf'), 10)),
+            ('overdue --limit 20', lambda: database._scheduled(None, now, 20), lambda: scan(database.data, -float('inf'), now, 20)),
+            ('due --before +7d', lambda: database._scheduled(None, week, None), lambda: scan(database.data, -float('inf'), week, count)),
+        )
+        print(f"{count} tasks, {share:.0%} with a due time, {backend}")
+        if type(database)._select_scheduled is cli.Database._select_scheduled:
+            build = best(lambda: cli.Schedule(database._deadlines()), 5)
+            print(f"  index build (once per load): {build * 1e3:9.1f} ms")
+        else:
+            print("  index: the partial SQL index `tasks_due`, kept by sqlite")
+        print(f"  {'command':<20} {'index':>12} {'scan':>12} {'speedup':>9} {'rows':>7}")
+        for name, indexed, scanned in queries:
+            rows = len(indexed())
+            assert [key for key, _ in indexed()] == [str(entry[2]) for entry in scanned()], name
+            fast, slow = best(indexed), best(scanned, 3)
+            print(f"  {name:<20} {fast * 1e3:9.3f} ms {slow * 1e3:9.1f} ms {slow / fast:8.0f}x {rows:>7}")
+        database.close()
+
+
+if __name__ == "__main__":
+    main()
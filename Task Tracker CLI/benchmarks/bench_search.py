@@ -0,0 +1,61 @@
+"""
+Benchmark of `search`: builds the inverted index over a synthetic database and times queries
+answered from it against a substring scan over every description, the way piping `list`
+through grep works.
+
+Usage:
+    python benchmarks/bench_search.py [tasks] [backend]
+"""
+import os, sys, json, time, tempfile
+from common import load_cli, synthetic_tasks
+
+cli = load_cli()
+QUERIES = ('word42', 'word42 word7', 'word42 OR word4242', 'word424*', 'word4*')
+
+
+def best(function, repeat: int = 5) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    backend = sys.argv[2] if len(sys.argv) > 2 else 'binary'
+    with tempfile.TemporaryDirectory() as directory:
+        json_path = os.path.join(directory, 'Database.json')
+        with open(json_path, mode="w", encoding="utf-8") as fp:
+            json.dump(synthetic_tasks(count), fp)
+        database = cli.Database(json_path)
+        if backend != 'json':
+            path = os.path.splitext(json_path)[0] + {'binary': '.tasks', 'sqlite': '.sqlite3', 'wal': '.json'}[backend]
+            target = cli.STORAGE_BACKENDS[backend](path)
+            if backend != 'wal':
+                target.migrate(database.data)
+            database = target
+
+        start = time.perf_counter()
+        database.search_index
+        print(f"{count} tasks, {backend}: index built in {time.perf_counter() - start:.2f} s, "
+              f"{os.path.getsize(database.search_path) / 1e6:.1f} MB")
+
+        reopened = type(database)(database.database_path)
+        start = time.perf_counter()
+        reopened.search_index
+        print(f"index opened in {(time.perf_counter() - start) * 1e3:.2f} ms")
+
+        for query in QUERIES:
+            indexed = best(lambda: reopened.search_index.search(query, limit=20))
+            matches = len(reopened.search_index.search(query))
+            print(f"  {query!r:<24} {matches:>8} matches  index {indexed * 1e3:9.2f} ms")
+
+        words = [word for word in QUERIES[0].split()]
+        scan = best(lambda: [key for key, task in database.data.items() if all(word in task['description'] for word in words)], 1)
+        print(f"  substring scan for {QUERIES[0]!r}: {scan * 1e3:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark of the sharded mode: the same synthetic tasks in one database and split over the
+projects of a `ShardedDatabase`. Times `add` to one project, `mark-done` by ID and listings over
+every project with a fresh database per command, like one CLI process per command, and reports
+the bytes every command read and wrote (`rchar`/`wchar` of `/proc/self/io`, so Linux only).
+
+Usage:
+    python benchmarks/bench_shards.py [tasks] [projects] [backend]
+"""
+import os, sys, json, time, tempfile
+from common import load_cli, synthetic_tasks
+
+cli = load_cli()
+
+
+def io() -> tuple[int, int]:
+    with open('/proc/self/io', mode="rb") as fp:
+        counters = dict(line.split(b': ') for line in fp.read().splitlines())
+    return int(counters[b'rchar']), int(counters[b'wchar'])
+
+
+def measure(function, repeat: int = 5) -> tuple[float, int, int]:
+    """Best time of `repeat` calls, with the bytes read and written by the last one."""
+    best = float('inf')
+    for _ in range(repeat):
+        read, written = io()
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+        after = io()
+    return best, after[0] - read, after[1] - written
+
+
+def build_shards(root: str, tasks: dict, projects: int) -> list:
+    """Splits the tasks over `projects` shards with IDs from the global allocator, returns one ID per project."""
+    database = cli.ShardedDatabase(root)
+    items = list(tasks.values())
+    size = -(-len(items) // projects)
+    ids = []
+    for number in range(projects):
+        shard = database.shard(f"project-{number}", create=True)
+        chunk, copied = items[number * size:(number + 1) * size], {}
+        while len(copied) < len(chunk):
+            for id_ in shard._allocate_ids(len(chunk) - len(copied)):
+                copied[str(id_)] = chunk[len(copied)]
+        shard.migrate(copied)
+        ids.append(next(iter(copied)))
+    database.close()
+    return ids
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    projects = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    os.environ['TASKCLI_STORAGE'] = sys.argv[3] if len(sys.argv) > 3 else 'json'
+    os.environ['TASKCLI_HISTORY'] = '0'
+    with tempfile.TemporaryDirectory() as directory:
+        tasks = synthetic_tasks(count)
+        path = os.path.join(directory, 'single', 'Database.json')
+        os.makedirs(os.path.dirname(path))
+        with open(path, mode="w", encoding="utf-8") as fp:
+            json.dump(tasks, fp)
+        if os.environ['TASKCLI_STORAGE'] != 'json':
+            cli.open_database(path).migrate(cli.Database(path).data)
+        root = os.path.join(directory, 'shards')
+        ids = build_shards(root, tasks, projects)
+        del tasks
+
+        single = lambda: cli.open_database(path)
+        sharded = lambda project=None: cli.ShardedDatabase(root, project)
+        middle = str(count // 2)
+        commands = (
+            ('add', lambda: single().Add('benchmark task'), lambda: sharded('project-0').Add('benchmark task')),
+            ('mark-done', lambda: single().Mark(middle, 'done'), lambda: sharded().Mark(ids[projects // 2], 'done')),
+            ('list --limit 20', lambda: sum(1 for _ in single().List('all', limit=20)),
+             lambda: sum(1 for _ in sharded().List('all', limit=20))),
+            ('list --project', None, lambda: sum(1 for _ in sharded('project-1').List('all'))),
+            ('list all', lambda: sum(1 for _ in single().List('all')), lambda: sum(1 for _ in sharded().List('all'))),
+        )
+        print(f"{count} tasks, {projects} projects, {os.environ['TASKCLI_STORAGE']}")
+        print(f"  {'command':<16} {'one database':>42} {'sharded':>42}")
+        for name, one, split in commands:
+            cells = []
+            for function in (one, split):
+                if function is None:
+                    cells.append(f"{'-':>42}")
+                    continue
+                seconds, read, written = measure(function, 3)
+                cells.append(f"{seconds * 1e3:9.1f} ms {read / 1e6:7.2f} MB r {written / 1e6:7.2f} MB w")
+            print(f"  {name:<16} " + ' '.join(cells))
+
+
+if __name__ == "__main__":
+    main()
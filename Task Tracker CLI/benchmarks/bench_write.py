@@ -0,0 +1,59 @@
+"""
+Write amplification benchmark: bytes written to disk by one `add`, `mark-done`, `update` and
+`delete` on a synthetic database, for every storage backend. The bytes come from the `wchar`
+counter of `/proc/self/io`, so the script needs Linux.
+
+Usage:
+    python benchmarks/bench_write.py [tasks] [backend,...]
+"""
+import os, sys, json, tempfile
+from common import load_cli, synthetic_tasks
+
+cli = load_cli()
+PATHS = {'json': 'Database.json', 'wal': 'Database.json', 'sqlite': 'Database.sqlite3',
+         'binary': 'Database.tasks', 'segments': 'Database.segments'}
+
+
+def written() -> int:
+    with open('/proc/self/io', mode="rb") as fp:
+        counters = dict(line.split(b': ') for line in fp.read().splitlines())
+    return int(counters[b'wchar'])
+
+
+def measure(function) -> int:
+    start = written()
+    function()
+    return written() - start
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    backends = (sys.argv[2] if len(sys.argv) > 2 else ','.join(PATHS)).split(',')
+    print(f"{count} tasks, bytes written per command")
+    print(f"  {'backend':<9} {'add':>12} {'mark-done':>12} {'update':>12} {'delete':>12}")
+    with tempfile.TemporaryDirectory() as directory:
+        json_path = os.path.join(directory, 'Database.json')
+        with open(json_path, mode="w", encoding="utf-8") as fp:
+            json.dump(synthetic_tasks(count), fp)
+        source = cli.Database(json_path).data
+        for backend in backends:
+            path = os.path.join(directory, backend, PATHS[backend])
+            os.makedirs(os.path.dirname(path))
+            database = cli.STORAGE_BACKENDS[backend](path)
+            database.migrate(source)
+            if backend == 'wal':
+                database = cli.STORAGE_BACKENDS[backend](path)  # migrate compacted the log
+            middle = str(count // 2)
+            # a fresh instance per command, like one CLI process per command
+            fresh = lambda: cli.STORAGE_BACKENDS[backend](path)
+            results = (
+                measure(lambda: fresh().Add('benchmark task')),
+                measure(lambda: fresh().Mark(middle, 'done')),
+                measure(lambda: fresh().Update(middle, 'benchmark task, updated')),
+                measure(lambda: fresh().Delete(middle)),
+            )
+            print(f"  {backend:<9}" + ''.join(f" {value:>12,}" for value in results))
+
+
+if __name__ == "__main__":
+    main()
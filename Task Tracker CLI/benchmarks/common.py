@@ -0,0 +1,54 @@
+"""
+Shared helpers for the task-cli benchmarks.
+
+`task-cli.py` is a script with a dash in its name, so it is loaded from its file path
+instead of being imported by name.
+"""
+import os, sys, random, importlib.util
+
+location = os.path.abspath(os.path.dirname(os.path.realpath(__file__)))
+script_path = os.path.join(os.path.dirname(location), 'task-cli.py')
+
+
+def load_cli():
+    """Loads `task-cli.py` as a module named `task_cli` and returns it."""
+    if 'task_cli' in sys.modules:
+        return sys.modules['task_cli']
+    spec = importlib.util.spec_from_file_location('task_cli', script_path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules['task_cli'] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def synthetic_tasks(count: int, status_mix: dict | None = None, long_ratio: float = 0.1, days: int = 365, seed: int = 0) -> dict:
+    """
+    Generates tasks in the `Database.json` format.
+
+    Args:
+        count (int): Number of tasks to generate.
+        status_mix (dict, optional): Status names mapped to their relative weight.
+                                     Defaults to 60% todo, 25% in-progress, 15% done.
+        long_ratio (float, optional): Share of descriptions longer than one 50 character table row. Defaults to 0.1.
+        days (int, optional): Number of days the creation times are spread over. Defaults to 365.
+        seed (int, optional): Seed of the random generator, so runs are comparable. Defaults to 0.
+
+    Returns:
+        dict: Tasks keyed by their string ID.
+    """
+    status_mix = status_mix or {'todo': 60, 'in-progress': 25, 'done': 15}
+    rng = random.Random(seed)
+    statuses = rng.choices(list(status_mix), weights=list(status_mix.values()), k=count)
+    start = 1_700_000_000.0
+    span = days * 86400
+    tasks = {}
+    for id_ in range(count):
+        created = start + span * id_ / max(count, 1)
+        words = rng.randint(12, 30) if rng.random() < long_ratio else rng.randint(2, 8)
+        tasks[str(id_)] = {
+            'description': ' '.join(f"word{rng.randint(0, 5000)}" for _ in range(words)),
+            'status': statuses[id_],
+            'createdAt': created,
+            'updatedAt': created + rng.random() * 86400 * 7,
+        }
+    return tasks
@@ -0,0 +1,248 @@
+"""
+Benchmark suite for task-cli.
+
+Generates synthetic databases of every requested size and times the `Database` operations
+(`_load`, `_update`, `_unique_id`, `Add`, `Update`, `Mark`, `Delete`, `List`/`_format`),
+`Parser.check_syntax` and the end-to-end `task-cli.py` process. Every operation reports
+latency percentiles and throughput, loading and listing also report their tracemalloc peak,
+and every size reports the peak RSS of the benchmark process and of the CLI child processes.
+
+Results are written as JSON, so runs on different commits can be compared with `--compare`.
+
+Usage:
+    python benchmarks/run.py --sizes 1000,10000,100000,1000000
+    python benchmarks/run.py --sizes 1000,10000 --compare benchmarks/results/<older run>.json
+"""
+import os, sys, gc, json, time, argparse, platform, tempfile, subprocess, tracemalloc
+from common import load_cli, synthetic_tasks, script_path, location
+
+try:
+    import resource
+except ImportError:  # not available on windows
+    resource = None
+
+cli = load_cli()
+
+
+def stats(samples: list[float], unit: int = 1) -> dict:
+    """
+    Summarizes latency samples in seconds.
+
+    Args:
+        samples (list[float]): Duration of every run, in seconds.
+        unit (int, optional): Number of items one run handled, used for the throughput. Defaults to 1.
+
+    Returns:
+        dict: Run count, mean/p50/p90/p99/max latency in milliseconds and items per second.
+    """
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    mean = sum(ordered) / len(ordered)
+    return {
+        'runs': len(ordered),
+        'mean_ms': mean * 1e3,
+        'p50_ms': pick(0.50) * 1e3,
+        'p90_ms': pick(0.90) * 1e3,
+        'p99_ms': pick(0.99) * 1e3,
+        'max_ms': ordered[-1] * 1e3,
+        'per_second': unit / mean if mean else None,
+    }
+
+
+def timed(function, runs: int, unit: int = 1) -> dict:
+    """Calls `function` `runs` times and returns the `stats` of the calls."""
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+    return stats(samples, unit)
+
+
+def traced_peak(function) -> int:
+    """Returns the tracemalloc peak in bytes of one call of `function`."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def peak_rss() -> int | None:
+    """Returns the peak resident set size of this process in bytes, if the platform reports it."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def run_cli(command: list, env: dict) -> tuple[float, int | None]:
+    """
+    Runs `task-cli.py` in a child process.
+
+    Returns:
+        tuple[float, int | None]: Wall time in seconds and the peak RSS of the child in bytes.
+    """
+    start = time.perf_counter()
+    child = subprocess.Popen([sys.executable, script_path, *command], env=env,
+                             stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    if hasattr(os, 'wait4'):
+        _, _, usage = os.wait4(child.pid, 0)
+        child.returncode = 0
+        rss = usage.ru_maxrss if sys.platform == 'darwin' else usage.ru_maxrss * 1024
+    else:
+        child.wait()
+        rss = None
+    return time.perf_counter() - start, rss
+
+
+def open_store(backend: str, json_path: str):
+    """Opens the database of `backend` on the synthetic `json_path`, migrating it first if needed."""
+    if backend == 'json':
+        return cli.Database(json_path)
+    if backend in ('sqlite', 'binary', 'segments'):
+        extension = {'sqlite': '.sqlite3', 'binary': '.tasks', 'segments': '.segments'}[backend]
+        database = cli.STORAGE_BACKENDS[backend](os.path.splitext(json_path)[0] + extension)
+        database.migrate(cli.Database(json_path).data)
+        return database
+    return cli.STORAGE_BACKENDS[backend](json_path)
+
+
+def bench_size(size: int, args) -> dict:
+    """Runs every benchmark on a synthetic database of `size` tasks and returns the results."""
+    ops = max(3, min(args.ops, args.ops * 100_000 // size))
+    repeats = max(3, min(args.ops, args.ops * 10_000 // size))
+    tasks = synthetic_tasks(size, args.status_mix, seed=args.seed)
+    results = {'ops': ops, 'repeats': repeats}
+
+    with tempfile.TemporaryDirectory() as directory:
+        json_path = os.path.join(directory, 'Database.json')
+        with open(json_path, mode="w", encoding="utf-8") as fp:
+            json.dump(tasks, fp)
+        results['file_bytes'] = os.path.getsize(json_path)
+        del tasks
+
+        database = open_store(args.backend, json_path)
+        reopen = lambda: type(database)(database.database_path)
+        results['load'] = timed(reopen, repeats)
+        results['load']['traced_peak_bytes'] = traced_peak(reopen)
+        results['unique_id'] = timed(lambda: [database._unique_id() for _ in range(1000)], repeats, 1000)
+        if args.backend != 'sqlite':
+            results['update_file'] = timed(lambda: database._update(database.data), repeats)
+
+        ids = []
+        results['add'] = timed(lambda: database.Add('benchmark task') and ids.append(next(reversed(database.data))), ops)
+        results['update'] = timed(lambda: database.Update(str(ids[0]), 'benchmark task, updated'), ops)
+        results['mark'] = timed(lambda: database.Mark(str(ids[0]), 'done'), ops)
+        results['delete'] = timed(lambda: database.Delete(str(ids.pop())), ops)
+
+        rows = []
+        list_all = lambda: rows.append(sum(1 for _ in database.List('all')))
+        results['list_all'] = timed(list_all, repeats)
+        results['list_all']['rows'] = rows[-1]
+        results['list_all']['rows_per_second'] = rows[-1] * 1e3 / results['list_all']['mean_ms']
+        results['list_all']['traced_peak_bytes'] = traced_peak(list_all)
+        results['list_done'] = timed(lambda: sum(1 for _ in database.List('done')), repeats)
+        results['list_page'] = timed(lambda: sum(1 for _ in database.List('all', limit=20, after=size // 2)), ops)
+        results['list_recent'] = timed(lambda: sum(1 for _ in database.List('in-progress', limit=20, sort='updated')), ops)
+
+        parser = cli.build_parser(database)
+        commands = [['add', 'x'], ['update', '1', 'y'], ['delete', '3'], ['mark-done', '4'],
+                    ['mark-in-progress', '5'], ['list', 'done', '--limit', '10']] * 500
+        results['parse'] = timed(lambda: [parser.check_syntax(list(command)) for command in commands], repeats, len(commands))
+
+        if args.backend == 'sqlite':
+            database.connection.close()  # an unfinished cursor would block the child's writes
+
+        env = dict(os.environ, TASKCLI_DATABASE=json_path, TASKCLI_STORAGE=args.backend,
+                   TASKCLI_SOCKET=os.path.join(directory, 'none.sock'))
+        commands = (('cli_list_page', ['list', 'done', '--limit', '10']), ('cli_add', ['add', 'benchmark task']),
+                    ('cli_mark', ['mark-done', str(size // 2)]))
+        for name, command in commands:
+            samples, child_rss = [], []
+            for _ in range(repeats):
+                seconds, rss = run_cli(command, env)
+                samples.append(seconds)
+                child_rss.append(rss)
+            results[name] = stats(samples)
+            results[name]['peak_rss_bytes'] = max(child_rss) if None not in child_rss else None
+
+    results['process_peak_rss_bytes'] = peak_rss()
+    return results
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=location, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: dict, previous: dict) -> None:
+    """Prints the p50 latency ratio (current / previous) of every operation both runs measured."""
+    print(f"\ncompared with {previous['meta'].get('revision')} ({previous['meta'].get('date')}), p50 current/previous:")
+    for size, results in current['results'].items():
+        old = previous['results'].get(size)
+        if not old:
+            continue
+        for name, value in results.items():
+            if isinstance(value, dict) and name in old and old[name].get('p50_ms'):
+                ratio = value['p50_ms'] / old[name]['p50_ms']
+                print(f"  {size:>8} {name:<14} {ratio:6.2f}x  {'slower' if ratio > 1.05 else 'faster' if ratio < 0.95 else ''}")
+
+
+def report(size: str, results: dict) -> None:
+    print(f"\n{size} tasks ({results['file_bytes'] / 1e6:.1f} MB, peak RSS {(results['process_peak_rss_bytes'] or 0) / 1e6:.0f} MB)")
+    for name, value in results.items():
+        if isinstance(value, dict):
+            print(f"  {name:<14} p50 {value['p50_ms']:10.3f} ms  p99 {value['p99_ms']:10.3f} ms  "
+                  f"{value['per_second'] or 0:14.1f}/s")
+
+
+def parse_mix(text: str) -> dict:
+    return {name: float(weight) for name, weight in (item.split('=') for item in text.split(','))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,10000,100000,1000000', help='comma separated task counts')
+    parser.add_argument('--ops', type=int, default=20, help='mutations per size, scaled down for large sizes')
+    parser.add_argument('--status-mix', type=parse_mix, default=None, help='e.g. todo=60,in-progress=25,done=15')
+    parser.add_argument('--backend', default='json', choices=tuple(cli.STORAGE_BACKENDS))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='result file, defaults to benchmarks/results/<revision>-<time>.json')
+    parser.add_argument('--compare', help='earlier result file to compare with')
+    args = parser.parse_args()
+
+    revision = git_revision()
+    run = {
+        'meta': {
+            'revision': revision,
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'backend': args.backend,
+            'status_mix': args.status_mix,
+        },
+        'results': {},
+    }
+    for size in (int(size) for size in args.sizes.split(',')):
+        run['results'][str(size)] = results = bench_size(size, args)
+        report(str(size), results)
+
+    output = args.output or os.path.join(location, 'results', f"{revision or 'unknown'}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, mode="w", encoding="utf-8") as fp:
+        json.dump(run, fp, indent=2)
+    print(f"\nresults written to {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as fp:
+            compare(run, json.load(fp))
+
+
+if __name__ == "__main__":
+    main()
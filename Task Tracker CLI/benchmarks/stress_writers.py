@@ -0,0 +1,80 @@
+"""
+Stress test for concurrent writers: N processes share one database file and each runs a mix
+of `Add`, `Update` and `Mark` calls through its own `Database` instance, like cron jobs and
+people running `task-cli.py` at the same time.
+
+Afterwards it checks that no update was lost (every added task exists exactly once, every
+counter task holds the sum of all increments) and that no ID was handed out twice, and it
+reports how the throughput scales with the number of writers.
+
+Usage:
+    python benchmarks/stress_writers.py [writers,...] [operations per writer] [backend]
+"""
+import os, sys, time, tempfile, multiprocessing
+from common import load_cli
+
+cli = load_cli()
+
+
+def writer(path: str, backend: str, number: int, operations: int, barrier) -> None:
+    database = cli.STORAGE_BACKENDS[backend](path)
+    barrier.wait()
+    for operation in range(operations):
+        database.Add(f"writer {number} task {operation}")
+        # read-modify-write of a task every writer touches: lost updates show as a wrong count
+        with database.locked():
+            task = database.data['0']
+            database.Update('0', str(int(task['description']) + 1))
+        if operation % 10 == 0:
+            database.Mark('0', 'in-progress' if operation % 20 else 'todo')
+    database.close()
+
+
+def run(writers: int, operations: int, backend: str) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'Database.json' if backend != 'sqlite' else 'Database.sqlite3')
+        seed = cli.STORAGE_BACKENDS[backend](path)
+        seed.Add('0')
+        seed.close()
+        if backend == 'sqlite':
+            seed.connection.close()
+
+        barrier = multiprocessing.Barrier(writers + 1)
+        processes = [multiprocessing.Process(target=writer, args=(path, backend, number, operations, barrier))
+                     for number in range(writers)]
+        for process in processes:
+            process.start()
+        barrier.wait()
+        start = time.perf_counter()
+        for process in processes:
+            process.join()
+        seconds = time.perf_counter() - start
+
+        data = dict(cli.STORAGE_BACKENDS[backend](path).data.items())
+        descriptions = [task['description'] for key, task in data.items() if key != '0']
+        expected = {f"writer {number} task {operation}" for number in range(writers) for operation in range(operations)}
+        return {
+            'writers': writers,
+            'seconds': seconds,
+            'mutations_per_second': writers * operations * 2 / seconds,
+            'lost_adds': len(expected - set(descriptions)),
+            'duplicate_adds': len(descriptions) - len(set(descriptions)),
+            'lost_updates': writers * operations - int(data['0']['description']),
+        }
+
+
+def main():
+    counts = [int(count) for count in (sys.argv[1] if len(sys.argv) > 1 else '1,2,4,8').split(',')]
+    operations = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    backend = sys.argv[3] if len(sys.argv) > 3 else 'json'
+    failed = False
+    for writers in counts:
+        result = run(writers, operations, backend)
+        failed |= bool(result['lost_adds'] or result['duplicate_adds'] or result['lost_updates'])
+        print(f"{writers:>3} writers  {result['mutations_per_second']:10.1f} mutations/s  "
+              f"lost adds {result['lost_adds']}  duplicate adds {result['duplicate_adds']}  lost updates {result['lost_updates']}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,20 @@
-import sys, os, json, time
+import time
+started = time.perf_counter()  # taken before the other imports, for --profile-startup
+import sys, os, re, json, math, shlex, functools, itertools, collections, bisect, heapq, socket, signal, contextlib, mmap, struct
+from array import array
+from collections.abc import Mapping, MutableMapping
+from typing import NamedTuple
+try:
+    import fcntl
+except ImportError:  # windows has no advisory file locks, writers are not serialized there
+    fcntl = None
+try:
+    import sqlite3
+except ImportError:  # python builds without the sqlite3 module
+    sqlite3 = None
 location = os.path.abspath(os.path.dirname(os.path.realpath(__file__)))
+# the JSON database, `Database.json` next to the script unless `TASKCLI_DATABASE` names another file
+database_location = lambda: os.environ.get('TASKCLI_DATABASE') or os.path.join(location, 'Database.json')
 # verstion 1.0
 
 class CILcolor:
@@ -51,8 +66,33 @@ class CILcolor:
     }
     
     def __init__(self) -> None:
-        """Initializes an instance of the CILcolor class, preparing the ANSI color and style management methods."""
-        pass
+        """
+        Initializes an instance of the CILcolor class, preparing the ANSI color and style management methods.
+        
+        Attributes:
+            enabled (bool): When False `color` and `style` return the text unchanged, for output that is not a terminal.
+        """
+        self._codes = {}
+        self.enabled = True
+    
+    def codes(self, color: str | tuple | list) -> tuple[str, str]:
+        """
+        Resolves a foreground color to the ANSI prefix and suffix wrapped around colored text.
+        Every color is resolved once and then served from a cache.
+
+        Parameters:
+            color (str | tuple | list): The name of the color (as a key in fg_color) or an RGB tuple/list.
+
+        Returns:
+            tuple[str, str]: The escape sequences to put before and after the text.
+        """
+        key = tuple(color) if isinstance(color, list) else color
+        try:
+            return self._codes[key]
+        except KeyError:
+            prefix, _, suffix = self.__check_color('\0', color, self.fg_color, 38, 39).partition('\0')
+            self._codes[key] = (prefix, suffix)
+            return prefix, suffix
 
     def color(self, string: str, color: str | tuple | list) -> str:
         """
@@ -65,7 +105,10 @@ class CILcolor:
         Returns:
             str: The colored string with ANSI escape codes.
         """
-        return self.__check_color(string, color, self.fg_color, 38, 39) if color else string
+        if not color or not self.enabled:
+            return string
+        prefix, suffix = self.codes(color)
+        return f"{prefix}{string}{suffix}"
 
     def style(self, string: str, color: str | tuple | list = None, background: str | tuple | list = None, bold: bool = False, italic: bool = False, underline: bool = False) -> str:
         """
@@ -82,6 +125,7 @@ class CILcolor:
         Returns:
             str: The styled string with ANSI escape codes.
         """
+        if not self.enabled: return string
         if color: string = self.__check_color(string, color, self.fg_color, 38, 39)
         if background: string = self.__check_color(string, background, self.bg_color, 48, 49)
         if bold: string = f"\x1b[1m{string}\x1b[0m"
@@ -113,6 +157,33 @@ class CILcolor:
 Color = CILcolor()
 
 
+@functools.lru_cache(maxsize=4096)
+def _day_string(quarter_hour: int) -> str:
+    return time.strftime("%d %b %y", time.localtime(quarter_hour * 900))
+
+
+def format_date(timestamp: float) -> str:
+    """
+    Renders a timestamp as the day it falls on, e.g. '01 Nov 24'.
+    
+    Every UTC offset is a multiple of 15 minutes, so a day never starts in the middle of a
+    quarter hour and the rendered day is memoized per quarter hour in a bounded LRU cache.
+    """
+    return _day_string(int(timestamp // 900))
+
+
+def format_deadline(timestamp: float) -> str:
+    """Renders a due time down to the minute, e.g. '01 Nov 24 14:30'."""
+    return time.strftime("%d %b %y %H:%M", time.localtime(timestamp))
+
+
+def format_field(field: str, value) -> str:
+    """Renders one field of a task for the update, undo and history messages, a cleared field as 'none'."""
+    if value is None:
+        return 'none'
+    return format_deadline(value) if field == 'due' else str(value)
+
+
 class SyntaxError(Exception):
     """
     Custom SyntaxError Exception class that provides enhanced error messages with customizable colors and 
@@ -142,7 +213,13 @@ class SyntaxError(Exception):
             text (str, optional): The main error message text to display. It will be shown in red color. Defaults to None.
             data_list (list, optional): A list of strings representing parts of the code or tokens. Defaults to None.
             index (int, optional): Specifies the position in `data_list` to highlight, marking the location of the syntax error. Defaults to 0.
+        
+        Attributes:
+            text (str): The error message without colors, for the structured outputs.
+            arguments (list): The uncolored `data_list`, an empty list if none was given.
+            index (int): The position of the offending argument in `arguments`.
         """
+        self.text, self.arguments, self.index = text, list(data_list or ()), index
         error_message = ''
         
         if text:
@@ -169,6 +246,7 @@ class Database_error(Exception):
 
     Attributes:
         message (str): A formatted message describing the error.
+        text (str): The main error message without colors, for programs using `TaskStore`.
         error (str): An optional additional error message that provides more context.
 
     Parameters:
@@ -181,279 +259,3995 @@ class Database_error(Exception):
     """
 
     def __init__(self, text, error=None):
+        self.text, self.error = text, error
         message = Color.color(text, color='red')
         error = Color.color(error if error else '', color='b-red')
         super().__init__(message + ':' + error)
 
 
-class Database:
+class TaskIndex:
     """
-    Database class for managing a JSON-based database of tasks with unique IDs, descriptions, statuses, 
-    and timestamps.
+    Secondary indexes over the tasks of a `Database`, kept per status:
+    
+    - `ids`: sorted task IDs, for filtered listings in ID order and `--after` cursors.
+    - `updated` / `created`: sorted `(timestamp, id)` pairs, for time-ordered listings.
+    
+    The indexes are updated incrementally through `changed`, so a filtered or time-ordered
+    listing costs work proportional to its output instead of to the database size.
     """
-    def __init__(self) -> None:
+    def __init__(self, items=()) -> None:
         """
-        Initializes the Database object.
-        
-        Attributes:
-            database_name(str): The name of the database file.
-            database_path(str): The full path to the database file.
-            data(dict): Loaded data from the database file, structured as a dictionary.
-        
-        Notes:
-            Calls the `_load` method to load existing data or create a new file if none exists.
+        Builds the indexes.
+
+        Args:
+            items (Iterable[tuple], optional): `(key, task)` pairs to index. Defaults to no tasks.
         """
-        self.database_name = 'Database.json'
-        self.database_path = os.path.join(location, self.database_name)
-        self.data = self._load()
+        self.ids = {}
+        self.updated = {}
+        self.created = {}
+        for key, task in items:
+            self._insert(int(key), task)
     
-    def _create(self) -> dict:
+    @staticmethod
+    def _add(index: dict, status: str, entry) -> None:
+        entries = index.setdefault(status, [])
+        if not entries or entries[-1] < entry:
+            entries.append(entry)  # the common case, new tasks have the highest ID and timestamps
+        else:
+            bisect.insort(entries, entry)
+    
+    @staticmethod
+    def _discard(index: dict, status: str, entry) -> None:
+        entries = index.get(status, [])
+        position = bisect.bisect_left(entries, entry)
+        if position < len(entries) and entries[position] == entry:
+            del entries[position]
+    
+    @staticmethod
+    def _after(entries: list, after: int | None):
+        start = 0 if after is None else bisect.bisect_right(entries, after)
+        for position in range(start, len(entries)):
+            yield entries[position]
+    
+    def _insert(self, id_: int, task: dict) -> None:
+        status = task['status']
+        self._add(self.ids, status, id_)
+        self._add(self.updated, status, (task['updatedAt'], id_))
+        self._add(self.created, status, (task['createdAt'], id_))
+    
+    def changed(self, key, old: dict | None, new: dict | None) -> None:
         """
-        Creates an empty JSON database file.
+        Moves a task from its old to its new index entries.
 
-        Returns:
-            dict:  An empty dictionary representing the initial database state.
+        Args:
+            key: The ID of the task.
+            old (dict | None): The task before the change, None if it was added.
+            new (dict | None): The task after the change, None if it was deleted.
         """
-        try:
-            with open(self.database_path, encoding="Utf-8", mode="w") as fp:
-                fp.write("{}")
-        except PermissionError as e:
-            raise Database_error('Permission denied while creating the database', e)
-        return {}
+        id_ = int(key)
+        if old is not None:
+            status = old['status']
+            self._discard(self.ids, status, id_)
+            self._discard(self.updated, status, (old['updatedAt'], id_))
+            self._discard(self.created, status, (old['createdAt'], id_))
+        if new is not None:
+            self._insert(id_, new)
     
-    def _load(self):
+    def select(self, status: str | None = None, sort: str | None = None, after: int | None = None):
         """
-        Loads data from the JSON database file.
+        Lazily yields task IDs from the indexes.
+
+        Args:
+            status (str, optional): Only yield tasks with this status. Defaults to every status.
+            sort (str, optional): 'updated' or 'created' for the most recent tasks first,
+                                  None for ascending ID order. Defaults to None.
+            after (int, optional): Only yield IDs greater than this cursor, in ID order only. Defaults to None.
 
         Returns:
-            dict: Data loaded from the JSON file.
-        
-        Note:
-            1. if Catch JSONDecodeError data reset to {}
-            2. if Catch FileNotFoundError triger `_create()` method
+            Iterator[int]: The matching task IDs.
         """
-        try:
-            with open(self.database_path, mode="r", encoding='Utf-8') as fp:
-                return json.load(fp)
-        except (json.JSONDecodeError):
-            print(Color.color("Failed to decode JSON data:",'red'), Color.color("Data set rest insialized new empty Database",'b-red'))
-            return {}
+        statuses = [status] if status is not None else list(self.ids)
+        if sort is None:
+            return heapq.merge(*(self._after(self.ids.get(name, []), after) for name in statuses))
         
-        except (FileNotFoundError):
-            return self._create()
-        
-    def _update(self, data:dict) -> None:
+        index = self.updated if sort == 'updated' else self.created
+        entries = heapq.merge(*(reversed(index.get(name, [])) for name in statuses), reverse=True)
+        return (id_ for _, id_ in entries)
+
+
+class Schedule:
+    """
+    Deadline index of a `Database` for `next`, `overdue`, `due` and `watch`: the open tasks (every
+    status but 'done') that have a `due` time, as one sorted list of `(due, -priority, id)` entries.
+    The tasks due first come first, and of those due at the same time the most important one.
+
+    A query bisects to the start of its time range and reads its k entries, O(log N + k) instead of
+    a scan of every task. Like `TaskIndex` it is built from the loaded tasks on first use and then
+    updated incrementally through `changed`.
+    """
+    def __init__(self, entries=()) -> None:
         """
-        Updates the JSON database file with new data.
+        Builds the index.
 
         Args:
-            data (dict): The data dictionary to write to the JSON file.
-
-        Raises:
-            Database_error:  Raised if there is an error updating the database file due to permission or file issues.
-        
-        Note:
-            1. This Method make sure that no data may lost even catch error while writing json
+            entries (Iterable[tuple]): The `entry` of every scheduled task, in any order. Defaults to none.
         """
-        try:
-            with open(self.database_path, mode="w", encoding="utf-8") as fp:
-                fp.write(json.dumps(data, ensure_ascii=False))
-                
-        except (FileNotFoundError, PermissionError) as e:
-            raise Database_error(f"Error updating database", e)
+        self.entries = sorted(entries)
     
-    def _unique_id(self) -> int:
+    @staticmethod
+    def entry(key, task) -> tuple | None:
+        """The index entry of a task, None if it is deleted, done or has no due time."""
+        if task is None or task['status'] == 'done':
+            return None
+        due = task.get('due')
+        return None if due is None else (due, -task.get('priority', 0), int(key))
+    
+    def changed(self, key, old: dict | None, new: dict | None) -> None:
         """
-        Generates a unique identifier for new entries in the database.
-        the mthod its use to genrate unique_id is by accsessing the last key
-        of dict and + 1 in it resulting always incrementing of ids so no miss match 
-        created on single threads system.
+        Moves a task from its old to its new entry, see `TaskIndex.changed`.
 
-        Returns:
-            int: based on the last key in `self.data`, or 0 if no keys exist.
+        Args:
+            key: The ID of the task.
+            old (dict | None): The task before the change, None if it was added.
+            new (dict | None): The task after the change, None if it was deleted.
         """
-        try:
-            # Get the last key and convert it to an integer, then increment by 1
-            last_key = int(next(reversed(self.data)))
-            unique_id = last_key + 1
-        except (StopIteration, ValueError):
-            # If dictionary is empty or last key isn't numeric, start from 0
-            unique_id = 0
-        
-        return unique_id
+        entries = self.entries
+        entry = self.entry(key, old)
+        if entry is not None:
+            position = bisect.bisect_left(entries, entry)
+            if position < len(entries) and entries[position] == entry:
+                del entries[position]
+        entry = self.entry(key, new)
+        if entry is not None:
+            bisect.insort(entries, entry)
     
-    def _format(self, tasks: list[dict]) -> str:
+    def select(self, since: float | None = None, before: float | None = None, limit: int | None = None):
         """
-        Formats the list of tasks into a readable table-like string.
+        Lazily yields the IDs of the tasks due in a time range, soonest first.
 
         Args:
-            tasks (list[dict]): A list of tasks to format.
+            since (float, optional): Only yield tasks due at this unix time or later. Defaults to no bound.
+            before (float, optional): Only yield tasks due before this unix time. Defaults to no bound.
+            limit (int, optional): Yield at most this many tasks. Defaults to no limit.
 
         Returns:
-            str: A formatted string representation of the tasks in a table format.
+            Iterator[int]: The task IDs.
         """
-        # Header for the table with colors
-        header = f"{Color.color('Task ID', color='b-blue'):<18} | " \
-                f"{Color.color('Description', color='b-green'):<60} | " \
-                f"{Color.color('Status', color='b-yellow'):<22} | " \
-                f"{Color.color('Created At', color='b-cyan'):<25} | " \
-                f"{Color.color('Updated At', color='b-cyan'):<25}"
-        formatted_tasks = [header]
-        formatted_tasks.append("-" * 112)
-        
-        def create_new_raw(key, task, status, created_at, updated_at):
-            task_color = 'green' if status == 'Completed' else 'red'
-            formatted_tasks.append(
-                f"{Color.color(key, color='red'):<18} | " 
-                f"{Color.color(task, color='cyan'):<60} | " 
-                f"{Color.color(status, color=task_color):<22} | " 
-                f"{Color.color(created_at, color='cyan'):<25} | " 
-                f"{Color.color(updated_at, color='cyan'):<25}"
-            )
-        
-        for key, task in tasks:
-            # Convert timestamps to readable date format using time module
-            created_at = time.strftime("%d %b %y", time.localtime(task['createdAt']))
-            updated_at = time.strftime("%d %b %y", time.localtime(task['updatedAt']))
-            length = len(task['description'])
-            description = task['description']
-            
-            create_new_raw(key, description[:50], task['status'], created_at, updated_at)
-            
-            if length > 50:
-                remaining_description = description[50:]
-                while remaining_description:
-                    create_new_raw('', remaining_description[:50], '', '', '')
-                    remaining_description = remaining_description[50:]
-        
-        return '\n'.join(formatted_tasks)
+        entries = self.entries
+        start = 0 if since is None else bisect.bisect_left(entries, (since,))
+        stop = len(entries) if before is None else bisect.bisect_left(entries, (before,))
+        if limit is not None:
+            stop = min(stop, start + limit)
+        return (entries[position][2] for position in range(start, stop))
 
-    def Add(self,description:str) -> bool:
-        """
-        Adds a new task entry to the database.
 
-        Args:
-            description (str): Description of the task to add.
+class TaskRecord(Mapping):
+    """
+    Dict-like view of one task stored in a `TaskTable`, reading and writing its columns.
+    Supports the `task['field']`, `task.get`, `task['field'] = value`, `del task['field']` and
+    `dict(task)` uses of a task dict. The optional `due`, `priority` and `completedAt` fields only exist when they are set.
+    """
+    __slots__ = ('table', 'id', '_row', '_generation')
+    fields = ('description', 'status', 'createdAt', 'updatedAt')
+    
+    def __init__(self, table: 'TaskTable', id_: int, row: int | None = None) -> None:
+        self.table = table
+        self.id = id_
+        self._row = row
+        self._generation = table.generation if row is not None else -1
+    
+    def _position(self) -> int:
+        # the row of the task only moves when tasks are inserted or deleted before it
+        if self._generation != self.table.generation:
+            self._row = self.table.row(self.id)
+            self._generation = self.table.generation
+        return self._row
+    
+    def __getitem__(self, field: str):
+        table = self.table
+        if field in table.optional:
+            return table.optional[field][self.id]
+        row = self._position()
+        if field == 'description':
+            return table.descriptions[row]
+        if field == 'status':
+            return table.statuses[table.codes[row]]
+        if field == 'createdAt':
+            return table.created[row]
+        if field == 'updatedAt':
+            return table.updated[row]
+        raise KeyError(field)
+    
+    def __setitem__(self, field: str, value) -> None:
+        table = self.table
+        if field in table.optional:
+            table.optional[field][self.id] = value
+            return
+        row = self._position()
+        if field == 'description':
+            table.descriptions[row] = value
+        elif field == 'status':
+            table.codes[row] = table.code(value)
+        elif field == 'createdAt':
+            table.created[row] = value
+        elif field == 'updatedAt':
+            table.updated[row] = value
+        else:
+            raise KeyError(field)
+    
+    def __delitem__(self, field: str) -> None:
+        if field not in self.table.optional:
+            raise KeyError(field)
+        del self.table.optional[field][self.id]
+    
+    def __iter__(self):
+        yield from self.fields
+        for field, column in self.table.optional.items():
+            if self.id in column:
+                yield field
+    
+    def __len__(self) -> int:
+        return len(self.fields) + sum(self.id in column for column in self.table.optional.values())
 
-        Returns:
-            bool: True if the task was added successfully, False if an error occurred.
-        
-        Notes:
-            1. This method automatically assigns a 'todo' status to new entries.
+
+class TaskTable(MutableMapping):
+    """
+    Compact columnar store for the tasks, used instead of a dict of task dicts when
+    `TASKCLI_COMPACT=1`. Tasks are kept in parallel columns sorted by ID: an `array('q')` of IDs,
+    an `array('B')` of status codes into a table of interned status strings, two `array('d')`
+    timestamp columns and a list of descriptions. That is about 33 bytes per task plus its
+    description, instead of several hundred for a dict with its own keys and values. The optional
+    `due`, `priority` and `completedAt` fields are kept in `optional`, one dict by ID per field
+    holding only the tasks that have it.
+    
+    It behaves like the `{key: task}` dict loaded from `Database.json`: keys are strings and
+    tasks are `TaskRecord` views.
+    """
+    optional_fields = ('due', 'priority', 'completedAt')
+    
+    def __init__(self) -> None:
+        self.ids = array('q')
+        self.codes = array('B')
+        self.created = array('d')
+        self.updated = array('d')
+        self.descriptions = []
+        self.optional = {field: {} for field in self.optional_fields}
+        self.statuses = []
+        self.status_codes = {}
+        # bumped whenever rows move, so `TaskRecord` knows when its cached row is stale
+        self.generation = 0
+    
+    @classmethod
+    def from_pairs(cls, pairs: list):
         """
-        data = {
-            'description': description,
-            'status': 'todo',
-            'createdAt': time.time(),
-            'updatedAt': time.time()
-        }
-        id = self._unique_id()
-        self.data[id] = data
+        `object_pairs_hook` for `json.load` building the table straight from the parsed file:
+        tasks become plain tuples first, so no dict is ever built per task.
+        """
+        if pairs and not pairs[0][0].isdigit():
+            task = dict(pairs)
+            return (task['description'], task['status'], task['createdAt'], task['updatedAt'],
+                    *(task.get(field) for field in cls.optional_fields))
         
-        self._update(self.data)
-        return Color.color("Task added successfully, ","yellow")+Color.color(f"Task Id: {id}","cyan")
+        table = cls()
+        for key, task in sorted(pairs, key=lambda pair: int(pair[0])):
+            table._append(int(key), *task)
+        return table
     
-    def Delete(self, id_:int) -> dict|None:
+    def code(self, status: str) -> int:
+        """Returns the code of a status, adding it to the status table the first time it is seen."""
+        try:
+            return self.status_codes[status]
+        except KeyError:
+            if len(self.statuses) == 255:
+                raise Database_error("Too many distinct statuses for the compact store")
+            self.statuses.append(sys.intern(status))
+            self.status_codes[status] = len(self.statuses) - 1
+            return self.status_codes[status]
+    
+    def row(self, key) -> int:
         """
-        Deletes a task from the database by ID.
+        Finds the row of a task.
+
+        Raises:
+            KeyError: If there is no task with this ID.
+        """
+        try:
+            id_ = int(key)
+        except (TypeError, ValueError):
+            raise KeyError(key)
+        position = bisect.bisect_left(self.ids, id_)
+        if position == len(self.ids) or self.ids[position] != id_:
+            raise KeyError(key)
+        return position
+    
+    def _append(self, id_: int, description: str, status: str, created: float, updated: float, *optional) -> None:
+        self.ids.append(id_)
+        self.codes.append(self.code(status))
+        self.created.append(created)
+        self.updated.append(updated)
+        self.descriptions.append(description)
+        self._set_optional(id_, optional)
+    
+    def _set_optional(self, id_: int, values) -> None:
+        """Sets or clears the optional fields of a task, `values` in the order of `optional_fields`, None or missing to clear."""
+        for column, value in itertools.zip_longest(self.optional.values(), values):
+            if value is None:
+                column.pop(id_, None)
+            else:
+                column[id_] = value
+    
+    def __getitem__(self, key) -> TaskRecord:
+        row = self.row(key)
+        return TaskRecord(self, self.ids[row], row)
+    
+    def __setitem__(self, key, task) -> None:
+        id_ = int(key)
+        values = (task['description'], task['status'], task['createdAt'], task['updatedAt'])
+        position = bisect.bisect_left(self.ids, id_)
+        if position < len(self.ids) and self.ids[position] == id_:
+            record = TaskRecord(self, id_, position)
+            for field, value in zip(TaskRecord.fields, values):
+                record[field] = value
+        elif position == len(self.ids):
+            self._append(id_, *values)
+        else:
+            self.ids.insert(position, id_)
+            self.codes.insert(position, self.code(values[1]))
+            self.created.insert(position, values[2])
+            self.updated.insert(position, values[3])
+            self.descriptions.insert(position, values[0])
+            self.generation += 1
+        self._set_optional(id_, [task.get(field) for field in self.optional_fields])
+    
+    def __delitem__(self, key) -> None:
+        row = self.row(key)
+        self._set_optional(self.ids[row], ())
+        for column in (self.ids, self.codes, self.created, self.updated, self.descriptions):
+            del column[row]
+        self.generation += 1
+    
+    def pop(self, key, *default) -> dict:
+        """Removes a task and returns it as a plain dict, since a `TaskRecord` would outlive its row."""
+        try:
+            task = dict(self[key])
+        except KeyError:
+            if default:
+                return default[0]
+            raise
+        del self[key]
+        return task
+    
+    def __contains__(self, key) -> bool:
+        try:
+            self.row(key)
+            return True
+        except KeyError:
+            return False
+    
+    def __iter__(self):
+        return map(str, self.ids)
+    
+    def __reversed__(self):
+        return map(str, reversed(self.ids))
+    
+    def __len__(self) -> int:
+        return len(self.ids)
+    
+    def items(self):
+        """Iterates over `(key, task)` pairs in ID order."""
+        for row, id_ in enumerate(self.ids):
+            yield str(id_), TaskRecord(self, id_, row)
+
+
+class SearchIndex:
+    """
+    Inverted index over the task descriptions for `search`: every term maps to the sorted IDs of
+    the tasks containing it, and a small task table holds the status and `updatedAt` of every task
+    for filtering and ranking.
+    
+    The index is persisted as an immutable binary file (`<database>.search`) mapped with `mmap`
+    like `SnapshotTasks`, so opening it costs nothing whatever its size:
+    
+    - header: magic `TASKSRCH`, format, counts and offsets of the sections.
+    - task table: sorted IDs, `updatedAt` and status codes, as native arrays.
+    - term table: boundaries of every term in the term heap and of its postings, terms sorted by their UTF-8 bytes.
+    - postings: the task IDs of every term, back to back.
+    - term heap: the UTF-8 terms.
+    - meta: JSON with the status table and the version of the database the file was built from.
+    
+    Mutations are appended to `<database>.search.log` as one JSON line per flush, holding the new
+    terms, status and `updatedAt` of every changed task and the database version after the write.
+    They are replayed into `changes` on open, and the file is rebuilt once the log passes `log_limit`.
+    The index is stale, and rebuilt from the tasks, when the last recorded version is not the
+    current version of the database, for example after a write by a client without search.
+    """
+    magic = b'TASKSRCH'
+    format = 1
+    header = struct.Struct('<8sIIQQQQQQQQ')
+    log_limit = 4 * 1024 * 1024
+    token = re.compile(r'\w+')
+    
+    def __init__(self, path: str) -> None:
+        """
+        Maps an index file and replays its log.
 
         Args:
-            id_ (int): The unique ID of the task to delete.
+            path (str): Path of the index file.
 
-        Returns:
-            dict|None: The deleted task's data if the task was found, or None if the ID did not exist.
+        Raises:
+            FileNotFoundError: If there is no index at `path`.
+            ValueError: If the file is not a search index.
         """
-        if id_ not in self.data:
-            raise Database_error(f"Task with ID {id_} does not exist.")
+        self.path = path
+        self.log_path = path + '.log'
+        with open(path, mode="rb") as fp:
+            try:
+                self.buffer = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+                fields = self.header.unpack_from(self.buffer)
+            except struct.error:
+                raise ValueError(f"{path} is not a search index")
+        magic, format, _, count, self.term_count, postings, tasks_at, terms_at, postings_at, heap_at, meta_at = fields
+        if magic != self.magic or format != self.format:
+            raise ValueError(f"{path} is not a search index")
         
-        data = self.data.pop(id_)
-        self._update(self.data)
-        return Color.color("Task deleted: ","yellow")+Color.color(f"'{data['description']}'","cyan")
+        view = memoryview(self.buffer)
+        self.ids = view[tasks_at:tasks_at + 8 * count].cast('q')
+        self.updated = view[tasks_at + 8 * count:tasks_at + 16 * count].cast('d')
+        self.codes = view[tasks_at + 16 * count:tasks_at + 17 * count]
+        self.term_offsets = view[terms_at:terms_at + 8 * (self.term_count + 1)].cast('q')
+        self.posting_offsets = view[terms_at + 8 * (self.term_count + 1):postings_at].cast('q')
+        self.postings = view[postings_at:postings_at + 8 * postings].cast('q')
+        self.heap_at = heap_at
+        meta = json.loads(bytes(view[meta_at:]))
+        self.statuses = meta['statuses']
+        self.version = meta['version']
+        # task ID -> (terms, status, updatedAt) of tasks changed since the file was built, None if deleted
+        self.changes = {}
+        self._replay()
+    
+    @classmethod
+    def terms(cls, text: str) -> set:
+        """Splits a description into its distinct lower-case terms."""
+        return set(cls.token.findall(text.lower()))
+    
+    @classmethod
+    def entry(cls, task) -> tuple | None:
+        """The `changes` entry of a task, None for a deleted task."""
+        if task is None:
+            return None
+        return (frozenset(cls.terms(task['description'])), task['status'], task['updatedAt'])
+    
+    def _replay(self) -> None:
+        try:
+            with open(self.log_path, mode="r", encoding="utf-8") as fp:
+                for line in fp:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        break  # torn last line, the version check rebuilds the index
+                    for key, entry in record['tasks'].items():
+                        self.changes[int(key)] = None if entry is None else (frozenset(entry[0]), entry[1], entry[2])
+                    self.version = record['version']
+        except FileNotFoundError:
+            pass
+    
+    @classmethod
+    def build(cls, path: str, tasks, version: str) -> 'SearchIndex':
+        """
+        Writes a new index file for `tasks`, removes the log and maps the file.
 
-    def Update(self, id_: int, description: str | None = None, status: str | None = None) -> str:
-        """Updates the details of an existing task in the database."""
-        if id_ not in self.data:
-            raise Database_error(f"Task with ID {id_} does not exist.")
-        
-        updates = []
-        task = self.data[id_]
-        
-        if description is not None:
-            old_description = task.get('description', 'No description')
-            task['description'] = description
-            updates.append(Color.color("description changed from","cyan")+ Color.color(f" '{old_description}'","yellow")+Color.color(" to ","cyan")+Color.color(f"'{description}'","yellow"))
+        Args:
+            path (str): Path of the index file.
+            tasks (Iterable[tuple]): Every `(key, task)` pair of the database.
+            version (str): The version of the database holding `tasks`.
+        """
+        ids, updated, codes = array('q'), array('d'), bytearray()
+        statuses, postings = {}, {}
+        for key, task in sorted(tasks, key=lambda item: int(item[0])):
+            id_ = int(key)
+            ids.append(id_)
+            updated.append(task['updatedAt'])
+            codes.append(statuses.setdefault(task['status'], len(statuses)))
+            for term in cls.terms(task['description']):
+                postings.setdefault(term, array('q')).append(id_)
+        terms = sorted((term.encode('utf-8'), ids_) for term, ids_ in postings.items())
         
-        if status is not None:
-            old_status = task.get('status', 'done')
-            task['status'] = status
-            updates.append(Color.color("status changed from","cyan")+ Color.color(f" '{old_status}'","yellow")+Color.color(" to ","cyan")+Color.color(f"'{status}'","yellow"))
-            
-        self._update(self.data)
+        term_offsets, posting_offsets = array('q', [0]), array('q', [0])
+        for term, ids_ in terms:
+            term_offsets.append(term_offsets[-1] + len(term))
+            posting_offsets.append(posting_offsets[-1] + len(ids_))
+        codes += bytes(-len(codes) % 8)
         
-        # Formulate the update message
-        updated_fields = ', '.join(updates)
-        return Color.color(f"Task with ID {id_} updated:","yellow")+f"{updated_fields}."
-
-    def Mark(self, id_:int, status:str) -> None:
+        tasks_at = cls.header.size
+        terms_at = tasks_at + 16 * len(ids) + len(codes)
+        postings_at = terms_at + 16 * len(term_offsets)
+        heap_at = postings_at + 8 * posting_offsets[-1]
+        meta_at = heap_at + term_offsets[-1]
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, mode="wb") as fp:
+            fp.write(cls.header.pack(cls.magic, cls.format, 0, len(ids), len(terms), posting_offsets[-1],
+                                     tasks_at, terms_at, postings_at, heap_at, meta_at))
+            for column in (ids, updated, codes, term_offsets, posting_offsets):
+                fp.write(column)
+            for _, ids_ in terms:
+                fp.write(ids_)
+            for term, _ in terms:
+                fp.write(term)
+            fp.write(json.dumps({'statuses': list(statuses), 'version': version}).encode('utf-8'))
+        # the index can always be rebuilt from the tasks, so it is replaced without an fsync
+        os.replace(temporary_path, path)
+        try:
+            os.remove(path + '.log')
+        except FileNotFoundError:
+            pass
+        return cls(path)
+    
+    def record(self, tasks: dict, version: str) -> int:
         """
-        Marks a task with a new status. 
-        This method is a shorthand for calling `Update` with only the status parameter.
+        Applies persisted mutations and appends them to the log.
 
         Args:
-            id_ (int): Unique ID of the task to mark.
-            status (str): New status to apply to the task.
+            tasks (dict): The new value of every changed task by ID, None for deleted tasks.
+            version (str): The version of the database after the write.
+
+        Returns:
+            int: The size of the log in bytes.
         """
-        return self.Update(id_, description=None, status=status)
+        entries = {int(key): self.entry(task) for key, task in tasks.items()}
+        self.changes.update(entries)
+        self.version = version
+        line = json.dumps({
+            'version': version,
+            'tasks': {id_: None if entry is None else [sorted(entry[0]), entry[1], entry[2]] for id_, entry in entries.items()},
+        }, ensure_ascii=False)
+        with open(self.log_path, mode="a", encoding="utf-8") as fp:
+            fp.write(line + '\n')
+            return fp.tell()
+    
+    def _term(self, position: int) -> bytes:
+        return self.buffer[self.heap_at + self.term_offsets[position]:self.heap_at + self.term_offsets[position + 1]]
+    
+    def _lower_bound(self, term: bytes) -> int:
+        low, high = 0, self.term_count
+        while low < high:
+            middle = (low + high) // 2
+            if self._term(middle) < term:
+                low = middle + 1
+            else:
+                high = middle
+        return low
     
-    def List(self, filter = "All") -> list[dict]:
+    def matching(self, term: str, prefix: bool = False) -> set:
         """
-        Retrieves a filtered list of tasks from the database.
-        If a specific status filter is applied, only tasks matching that status are included.
+        Finds the tasks containing a term, or any term starting with it when `prefix`.
+
+        Returns:
+            set: The matching task IDs.
+        """
+        encoded = term.encode('utf-8')
+        position = self._lower_bound(encoded)
+        ids = set()
+        while position < self.term_count:
+            found = self._term(position)
+            if found != encoded and not (prefix and found.startswith(encoded)):
+                break
+            ids.update(self.postings[self.posting_offsets[position]:self.posting_offsets[position + 1]])
+            position += 1
+        
+        if self.changes:
+            ids.difference_update(self.changes)
+            for id_, entry in self.changes.items():
+                if entry is not None and (term in entry[0] or prefix and any(found.startswith(term) for found in entry[0])):
+                    ids.add(id_)
+        return ids
+    
+    def task(self, id_: int) -> tuple:
+        """The `(status, updatedAt)` of an indexed task."""
+        if id_ in self.changes:
+            return self.changes[id_][1:]
+        row = bisect.bisect_left(self.ids, id_)
+        return self.statuses[self.codes[row]], self.updated[row]
+    
+    def search(self, query: str, status: str | None = None, limit: int | None = None) -> list:
+        """
+        Runs a query: words are ANDed, `OR` between words separates alternatives
+        (`a b OR c` is `(a AND b) OR c`) and a word ending in `*` matches every term starting with it.
+        Tasks are ranked by the number of query words they match, then by `updatedAt`, most recent first.
 
         Args:
-            filter (str, optional): A filter string to match the task's status field. When set to "All", all tasks are returned.. Defaults to "All".
+            query (str): The query.
+            status (str, optional): Only return tasks with this status. Defaults to every status.
+            limit (int, optional): Maximum number of IDs to return. Defaults to no limit.
 
         Returns:
-            list[dict]: List of tasks matching the specified filter criteria.
+            list[int]: The IDs of the matching tasks, best first.
         """
-        # If the filter is "All", return all elements
-        if filter.lower() == "all":
-            data =  list(self.data.items())
+        return [id_ for _, _, id_ in self.ranked(query, status, limit)]
+    
+    def ranked(self, query: str, status: str | None = None, limit: int | None = None) -> list:
+        """
+        Runs a query like `search`, returning `(-words matched, -updatedAt, id)` of the matching tasks
+        in ascending order, so the results of several indexes can be merged in rank order.
+        """
+        groups, group = [], []
+        for word in query.split():
+            if word == 'OR':
+                groups.append(group)
+                group = []
+                continue
+            prefix = word.endswith('*')
+            group.extend((term, prefix) for term in self.terms(word.rstrip('*')))
+        groups.append(group)
         
-        else:
-            data = [(key,item) for key, item in self.data.items() if item.get("status") == filter]
+        clauses = {clause: self.matching(*clause) for group in groups for clause in group}
+        found = set()
+        for group in groups:
+            if group:
+                sets = sorted((clauses[clause] for clause in group), key=len)
+                found |= sets[0].intersection(*sets[1:])
         
-        return self._format(data)
+        ranked = []
+        for id_ in found:
+            task_status, updated = self.task(id_)
+            if status is None or task_status == status:
+                ranked.append((-sum(id_ in ids for ids in clauses.values()), -updated, id_))
+        return heapq.nsmallest(limit, ranked) if limit is not None else sorted(ranked)
 
 
-class token:
-    """
-    A class to represent a customizable token with arguments, fallback options, and an associated method.
-    Designed to generate a key dictionary from provided data based on argument keys.
+@functools.lru_cache(maxsize=65536)
+def _day_key(quarter_hour: int) -> str:
+    return time.strftime("%Y-%m-%d", time.localtime(quarter_hour * 900))
+
 
+class TaskStats:
+    """
+    Aggregates over the tasks for `stats`, kept up to date by every change instead of being
+    counted from the tasks, so a query costs O(days) whatever the number of tasks.
+    
+    Every aggregate is a function of the current tasks, so applying the change from the old to
+    the new value of a task keeps them exact, and a rebuild from the tasks gives the same result.
+    Persisted as JSON at `<database>.stats` with the version of the database it was counted at,
+    and rebuilt when that version is not the current one, like `SearchIndex`.
+    
     Attributes:
-        argument (dict): A dictionary representing argument names and values.
-        fallback (dict | None): Optional fallback dictionary to handle default or backup values.
-        optiones (dict | None): Optional dictionary of additional options.
-        method (callable): A function or method to be associated with the token.
-        help_text (str): A help text description providing details about the token's purpose.
+        statuses (dict): Number of tasks per status.
+        created (dict): Number of tasks created per local day, 'YYYY-MM-DD'.
+        completed (dict): Number of done tasks per local day of their `completedAt`, the day they were marked done.
+        done_seconds (float): Sum of the time from `createdAt` to `completedAt` over the done tasks.
+        version (str): The database version the aggregates were counted at.
     """
-    def __init__(self, argument:dict, fallback:dict|None, optiones:dict|None, method, help_text) -> None:
+    def __init__(self, statuses: dict | None = None, created: dict | None = None, completed: dict | None = None,
+                 done_seconds: float = 0.0, version: str | None = None) -> None:
+        self.statuses = statuses or {}
+        self.created = created or {}
+        self.completed = completed or {}
+        self.done_seconds = done_seconds
+        self.version = version
+    
+    @staticmethod
+    def _count(buckets: dict, key, amount: int) -> None:
+        count = buckets.get(key, 0) + amount
+        if count:
+            buckets[key] = count
+        else:
+            buckets.pop(key, None)
+    
+    def add(self, task, amount: int = 1) -> None:
+        """Counts one task in (`amount` 1) or out (-1) of the aggregates."""
+        status = task['status']
+        self._count(self.statuses, status, amount)
+        self._count(self.created, _day_key(int(task['createdAt'] // 900)), amount)
+        if status == 'done':
+            # tasks marked done before `completedAt` was recorded were last updated when they were completed
+            completed = task.get('completedAt', task['updatedAt'])
+            self._count(self.completed, _day_key(int(completed // 900)), amount)
+            self.done_seconds += amount * (completed - task['createdAt'])
+    
+    def changed(self, old, new) -> None:
+        """Applies one change, see `Database._changed`."""
+        if old is not None:
+            self.add(old, -1)
+        if new is not None:
+            self.add(new)
+    
+    def merge(self, other: 'TaskStats') -> None:
+        """Adds the aggregates of `other`, like the pending changes of a `Database`."""
+        for buckets, more in ((self.statuses, other.statuses), (self.created, other.created), (self.completed, other.completed)):
+            for key, amount in more.items():
+                self._count(buckets, key, amount)
+        self.done_seconds += other.done_seconds
+    
+    @classmethod
+    def build(cls, tasks, version: str) -> 'TaskStats':
+        """Counts the aggregates of every `(key, task)` pair of `tasks`."""
+        stats = cls(version=version)
+        for _, task in tasks:
+            stats.add(task)
+        return stats
+    
+    @classmethod
+    def load(cls, path: str) -> 'TaskStats':
         """
-        Initializes the token with arguments, fallback, options, a method, and help text.
+        Reads persisted aggregates.
 
-        Parameters:
-            argument (dict): Required arguments for the token.
-            fallback (dict | None): Fallback values for optional settings.
-            optiones (dict | None): Additional options for customizing token behavior.
-            method (callable): A method associated with the token.
-            help_text (str): Help text explaining the token's usage.
+        Raises:
+            FileNotFoundError: If there are none yet.
+            ValueError: If the file can not be decoded.
         """
-        self.argument = argument
-        self.fallback = fallback
-        self.optiones = optiones
-        self.method = method
-        self.help_text = help_text
+        with open(path, mode="r", encoding="utf-8") as fp:
+            try:
+                return cls(**json.load(fp))
+            except TypeError as e:
+                raise ValueError(f"{path} does not hold task statistics") from e
+    
+    def save(self, path: str) -> None:
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, mode="w", encoding="utf-8") as fp:
+            json.dump(vars(self), fp)
+        # the aggregates can always be recounted from the tasks, so they are replaced without an fsync
+        os.replace(temporary_path, path)
+    
+    def report(self, by: str = 'day', since: float | None = None) -> dict:
+        """
+        The aggregates as a JSON-ready dict, bucketed per day or per ISO week ('YYYY-Www').
+
+        Args:
+            by (str, optional): 'day' or 'week'. Defaults to 'day'.
+            since (float, optional): Only buckets from the day of this unix time on. Defaults to every bucket.
+        """
+        import datetime  # only for the ISO weeks, kept out of the startup of every command
+        first = None if since is None else _day_key(int(since // 900))
+        def buckets(days: dict) -> dict:
+            counts = {}
+            for day, count in sorted(days.items()):
+                if first is not None and day < first:
+                    continue
+                if by == 'week':
+                    year, week, _ = datetime.date.fromisoformat(day).isocalendar()
+                    day = f"{year}-W{week:02d}"
+                counts[day] = counts.get(day, 0) + count
+            return counts
+        
+        done = self.statuses.get('done', 0)
+        return {
+            'tasks': sum(self.statuses.values()),
+            'statuses': dict(sorted(self.statuses.items())),
+            'by': by,
+            'created': buckets(self.created),
+            'completed': buckets(self.completed),
+            'average_seconds_to_done': self.done_seconds / done if done else None,
+        }
+
+
+class Journal:
+    """
+    Journal of every change made to the tasks, kept in a directory next to the database
+    (`Database.json.history/`) for `undo`, `history <id>` and `list --as-of`.
+    
+    Every change is one NDJSON line holding only the fields it changed: the full task for an added
+    or deleted task, the old and new value of the changed fields otherwise. The journal is split into
+    epochs: once an epoch holds `checkpoint_interval` changes, a checkpoint of every task is written
+    and a new journal starts. The state at any point in time is then rebuilt by reverting at most one
+    epoch of changes from the next checkpoint (or from the current tasks), and only the last `keep`
+    epochs are kept.
+    
+    Files:
+    
+    - `journal-<seq>.ndjson`: a header line with the start time of the epoch, then one line per change:
+      `seq`, time `at`, task `id`, `op` (add, update or delete), `old` and `new` fields, and for a change
+      made by `undo` the `seq` of the change it `undoes`.
+    - `checkpoint-<seq>.json`: every task at the start of the epoch beginning with change `seq`.
+    """
+    name = re.compile(r'journal-(\d+)\.ndjson')
+    
+    def __init__(self, path: str, checkpoint_interval: int | None = None, keep: int | None = None) -> None:
+        """
+        Args:
+            path (str): The history directory, created on the first change.
+            checkpoint_interval (int, optional): Changes per epoch, `TASKCLI_HISTORY_CHECKPOINT` or 10000.
+            keep (int, optional): Epochs kept, `TASKCLI_HISTORY_KEEP` or 10.
+        """
+        self.path = path
+        self.checkpoint_interval = checkpoint_interval or int(os.environ.get('TASKCLI_HISTORY_CHECKPOINT', 10_000))
+        self.keep = keep or int(os.environ.get('TASKCLI_HISTORY_KEEP', 10))
+    
+    def journal_path(self, epoch: int) -> str:
+        return os.path.join(self.path, f"journal-{epoch:010d}.ndjson")
+    
+    def checkpoint_path(self, epoch: int) -> str:
+        return os.path.join(self.path, f"checkpoint-{epoch:010d}.json")
+    
+    def epochs(self) -> list:
+        """The first `seq` of every kept epoch, oldest first."""
+        try:
+            names = os.listdir(self.path)
+        except FileNotFoundError:
+            return []
+        return sorted(int(match[1]) for match in map(self.name.fullmatch, names) if match)
+    
+    @staticmethod
+    def delta(key, old, new) -> dict:
+        """The journal entry of one change, see `Database._changed`, holding only the changed fields."""
+        if old is None:
+            return {'id': str(key), 'op': 'add', 'old': None, 'new': dict(new)}
+        if new is None:
+            return {'id': str(key), 'op': 'delete', 'old': dict(old), 'new': None}
+        # a field that was cleared, like `due`, is gone from the new task and recorded as None
+        fields = [field for field in itertools.chain(new, (field for field in old if field not in new))
+                  if old.get(field) != new.get(field)]
+        return {'id': str(key), 'op': 'update', 'old': {field: old.get(field) for field in fields},
+                'new': {field: new.get(field) for field in fields}}
+    
+    def _read(self, epoch: int):
+        """Yields the header and then the entries of one journal. A torn last line is ignored."""
+        try:
+            with open(self.journal_path(epoch), mode="r", encoding="utf-8") as fp:
+                for line in fp:
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        break
+        except FileNotFoundError:
+            return
+    
+    def _next_seq(self, epoch: int) -> int:
+        """The `seq` of the next change, read from the last line of the journal of the current `epoch`."""
+        with open(self.journal_path(epoch), mode="rb") as fp:
+            size = fp.seek(0, os.SEEK_END)
+            fp.seek(max(0, size - 65536))
+            for line in reversed(fp.read().splitlines()):
+                try:
+                    return json.loads(line).get('seq', epoch - 1) + 1
+                except json.JSONDecodeError:
+                    continue  # torn last line
+        return epoch
+    
+    def _start(self, epoch: int, sync) -> None:
+        with open(self.journal_path(epoch), mode="a", encoding="utf-8") as fp:
+            fp.write(json.dumps({'epoch': epoch, 'at': time.time()}) + '\n')
+            sync(fp, self.journal_path(epoch))
+    
+    def append(self, deltas: list, tasks, sync) -> None:
+        """
+        Writes journal entries, starting a new epoch with a checkpoint once the current one is full.
+        Must be called while the database is locked, after the changes have been persisted.
+
+        Args:
+            deltas (list): Entries built by `delta`, in the order the changes were made.
+            tasks (callable): Returns every task as they are after the changes, read only for a checkpoint.
+            sync (callable): `Database._sync`, flushing and fsyncing an open file.
+
+        Raises:
+            Database_error: If the journal can not be written.
+        """
+        try:
+            epochs = self.epochs()
+            if not epochs:
+                os.makedirs(self.path, exist_ok=True)
+                self._start(0, sync)
+                epochs = [0]
+            epoch = epochs[-1]
+            seq = self._next_seq(epoch)
+            now = time.time()
+            with open(self.journal_path(epoch), mode="a", encoding="utf-8") as fp:
+                for delta in deltas:
+                    fp.write(json.dumps({'seq': seq, 'at': now, **delta}, ensure_ascii=False) + '\n')
+                    seq += 1
+                sync(fp, self.journal_path(epoch))
+            if seq - epoch >= self.checkpoint_interval:
+                self._rotate(seq, tasks(), sync)
+                for old in (epochs + [seq])[:-self.keep]:
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(self.journal_path(old))
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(self.checkpoint_path(old))
+        except (FileNotFoundError, PermissionError) as e:
+            raise Database_error("Error writing the history journal", e)
+    
+    def _rotate(self, epoch: int, tasks, sync) -> None:
+        """Writes the checkpoint of every task and starts the journal of the epoch beginning with change `epoch`."""
+        path = self.checkpoint_path(epoch)
+        with open(path + '.tmp', mode="wb") as fp:
+            fp.write(Database._encode(tasks).encode('utf-8'))
+            sync(fp, path)
+        os.replace(path + '.tmp', path)
+        self._start(epoch, sync)
+    
+    def entries(self, reverse: bool = False):
+        """Yields every kept journal entry in order, newest first when `reverse`."""
+        epochs = self.epochs()
+        for epoch in reversed(epochs) if reverse else epochs:
+            entries = list(self._read(epoch))[1:]
+            yield from reversed(entries) if reverse else entries
+    
+    def undoable(self, count: int) -> list:
+        """The last `count` changes that are not undos and were not undone yet, newest first."""
+        undone, found = set(), []
+        for entry in self.entries(reverse=True):
+            if 'undoes' in entry:
+                undone.add(entry['undoes'])
+            elif entry['seq'] not in undone:
+                found.append(entry)
+                if len(found) == count:
+                    break
+        return found
+    
+    def state_at(self, when: float, tasks) -> dict:
+        """
+        Rebuilds every task as it was at time `when`, by reverting the changes made after it.
+
+        Args:
+            when (float): The point in time, as a unix timestamp.
+            tasks (Mapping): The current tasks, the base when `when` falls in the current epoch.
+
+        Returns:
+            dict: The tasks at that time by ID, in ID order.
+
+        Raises:
+            Database_error: If `when` is older than the kept history.
+        """
+        epochs = self.epochs()
+        position = len(epochs) - 1
+        while position >= 0:
+            header = next(self._read(epochs[position]), None)
+            if header is not None and header['at'] <= when:
+                break
+            position -= 1
+        if position < 0:
+            if epochs and epochs[0] != 0:
+                header = next(self._read(epochs[0]))
+                raise Database_error(f"The history only goes back to {time.strftime('%d %b %y %H:%M:%S', time.localtime(header['at']))}")
+            position = 0  # before the first change, the tasks as the history found them
+        
+        if position + 1 < len(epochs):
+            try:
+                with open(self.checkpoint_path(epochs[position + 1]), mode="r", encoding="utf-8") as fp:
+                    state = json.load(fp)
+            except (OSError, json.JSONDecodeError) as e:
+                raise Database_error("The history checkpoint can not be read", e)
+        else:
+            state = {key: task for key, task in tasks.items()}
+        
+        entries = list(self._read(epochs[position]))[1:] if epochs else []
+        for entry in reversed(entries):
+            if entry['at'] <= when:
+                break
+            key = entry['id']
+            if entry['op'] == 'add':
+                state.pop(key, None)
+            elif entry['op'] == 'delete':
+                state[key] = entry['old']
+            elif key in state:
+                # copied, the tasks of the current state are the live ones; None marks a field the task did not have
+                state[key] = {field: value for field, value in {**state[key], **entry['old']}.items() if value is not None}
+        return dict(sorted(state.items(), key=lambda item: int(item[0])))
+
+
+def insert_in_order(data, key: str, task) -> None:
+    """
+    Stores a task under `key` keeping the tasks in ID order. Plain dicts iterate in insertion order and
+    listings, `--after` cursors and the ID fallback of `_unique_id` rely on that order, so a task stored
+    under an ID lower than the last one (a deleted task restored by `undo`) moves the tasks after it
+    behind it. The other task stores keep their own order.
+
+    Args:
+        data (dict | Mapping): The loaded tasks by ID.
+        key (str): The ID of the task.
+        task (dict): The task to store.
+    """
+    if not isinstance(data, dict) or key in data:
+        data[key] = task
+        return
+    later = list(itertools.takewhile(lambda other: int(other) > int(key), reversed(data)))
+    moved = [(other, data.pop(other)) for other in reversed(later)]
+    data[key] = task
+    data.update(moved)
+
+
+class Database:
+    """
+    Database class for managing a JSON-based database of tasks with unique IDs, descriptions, statuses, 
+    and timestamps.
+    """
+    # file extension of the storage, replacing the one of the JSON database path, None to use that path
+    extension = None
+    
+    def __init__(self, database_path: str | None = None) -> None:
+        """
+        Initializes the Database object.
+        
+        Args:
+            database_path (str, optional): Path of the database file. Defaults to `database_location()`.
+        
+        Attributes:
+            database_name(str): The name of the database file.
+            database_path(str): The full path to the database file.
+            data(dict): Loaded data from the database file, structured as a dictionary.
+                        The file is only read the first time `data` is used.
+            deferred(bool): When True mutations are only collected in `dirty` until `flush` is called.
+            dirty(set): IDs of the tasks changed since the last flush.
+            index(TaskIndex): Secondary indexes over `data`, built on first use.
+            schedule(Schedule): The deadline index over `data`, built on first use by `next`, `overdue`, `due` or `watch`.
+            fsync_window(float): Seconds within which writes share one fsync, `TASKCLI_FSYNC_WINDOW` or 0
+                                 for an fsync on every write. Writes still waiting for their fsync are
+                                 synced by the next write after the window, or by `close`.
+            lock_path(str): `<database>.lock`, locked around every read-modify-write and holding the ID counter.
+            columnar(bool): Keep the tasks in a columnar `TaskTable` instead of a dict of dicts,
+                           `TASKCLI_COMPACT=1`. Costs a little CPU per access for a lot less memory.
+            search_path(str): `<database>.search`, the persisted `SearchIndex`. Mutations are only
+                              recorded in it once it exists, that is after the first `search`.
+            journal(Journal): The history of every change in `<database>.history/`, written after each
+                              flush when turned on with `TASKCLI_HISTORY=1`, None otherwise. It costs
+                              an append and an fsync per write, only `undo`, `history` and `--as-of` need it.
+            stats_path(str): `<database>.stats`, the persisted `TaskStats`. Like the search index they
+                             are only maintained once they exist, that is after the first `stats`.
+            structured(bool): Commands return plain data (dicts, and streams of task dicts for listings)
+                              instead of colored text, for the `--format json|ndjson|tsv` outputs.
+            blocks(IdBlocks): The global ID allocator when this database is the shard of one `project`
+                              of a `ShardedDatabase`, None otherwise.
+            project(str): The name of the project this database is the shard of, None if it is not a shard.
+            bytes_read(int): Bytes of the storage files parsed by `_load` and `_refresh` so far, for `--trace`.
+                             Storage that is mapped or queried in place (binary, sqlite) reads none up front.
+            bytes_written(int): Bytes of the storage files written by `_update` and `_persist` so far, for `--trace`.
+        
+        Notes:
+            The `_load` method, loading existing data or creating a new file if none exists,
+            runs on first access of `data`, so commands that fail validation never read the file.
+        """
+        self.database_path = database_path or database_location()
+        self.database_name = os.path.basename(self.database_path)
+        self.deferred = False
+        self.dirty = set()
+        self._index = None
+        self._schedule = None
+        self.fsync_window = float(os.environ.get('TASKCLI_FSYNC_WINDOW', 0))
+        self._last_sync = 0.0
+        self._unsynced = set()
+        self.lock_path = self.database_path + '.lock'
+        self._lock_file = None
+        self._lock_depth = 0
+        self._version_seen = None
+        self.columnar = os.environ.get('TASKCLI_COMPACT') == '1'
+        self.search_path = self.database_path + '.search'
+        self._search = None
+        self.journal = Journal(self.database_path + '.history') if os.environ.get('TASKCLI_HISTORY') == '1' else None
+        self._deltas = []
+        self.stats_path = self.database_path + '.stats'
+        self._stats_delta = None
+        self._stats_checked = False
+        self.structured = False
+        self.blocks = None
+        self.project = None
+        self._data = None
+        self.load_seconds = 0.0
+        self.bytes_read = 0
+        self.bytes_written = 0
+    
+    @property
+    def data(self) -> dict:
+        """The tasks keyed by ID, loaded by `_load` on first access."""
+        if self._data is None:
+            start = time.perf_counter()
+            # taken before loading, a change made while loading is then seen as stale and merged later
+            self._version_seen = self._version()
+            self._data = self._load()
+            self.load_seconds += time.perf_counter() - start
+        return self._data
+    
+    @data.setter
+    def data(self, data: dict) -> None:
+        self._data = data
+    
+    def _create(self) -> dict:
+        """
+        Creates an empty JSON database file.
+
+        Returns:
+            dict:  An empty dictionary representing the initial database state.
+        """
+        self._update({})
+        return TaskTable() if self.columnar else {}
+    
+    def _load(self):
+        """
+        Loads data from the JSON database file.
+
+        Returns:
+            dict: Data loaded from the JSON file.
+        
+        Note:
+            1. if Catch JSONDecodeError the previous generation (`<database>.bak`) is loaded instead,
+               and if that is unreadable too the broken file is moved aside before starting empty
+            2. if Catch FileNotFoundError triger `_create()` method
+        """
+        try:
+            with open(self.database_path, mode="r", encoding='Utf-8') as fp:
+                return self._decode(fp)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return self._recover()
+        
+        except (FileNotFoundError):
+            return self._create()
+    
+    def _recover(self) -> dict:
+        """
+        Recovers from an unreadable database file by loading the previous generation kept by `_update`.
+
+        Returns:
+            dict: The previous generation, or an empty dictionary if there is none.
+        """
+        backup_path = self.database_path + '.bak'
+        try:
+            with open(backup_path, mode="r", encoding='Utf-8') as fp:
+                data = self._decode(fp)
+            print(Color.color("Failed to decode JSON data:",'red'), Color.color("Loaded the previous generation from " + backup_path,'b-red'))
+            return data
+        except (OSError, json.JSONDecodeError, UnicodeDecodeError):
+            pass
+        
+        corrupt_path = f"{self.database_path}.corrupt-{int(time.time())}"
+        os.replace(self.database_path, corrupt_path)
+        print(Color.color("Failed to decode JSON data:",'red'), Color.color(f"Moved it to {corrupt_path} and initialized a new empty Database",'b-red'))
+        return TaskTable() if self.columnar else {}
+    
+    def _decode(self, fp) -> dict:
+        """Parses an open `Database.json` into a dict, or straight into a `TaskTable` when `columnar`."""
+        self.bytes_read += os.fstat(fp.fileno()).st_size
+        if self.columnar:
+            return json.load(fp, object_pairs_hook=TaskTable.from_pairs)
+        return json.load(fp)
+    
+    @staticmethod
+    def _encode(data) -> str:
+        """Serializes the tasks to the `Database.json` format, whether they are a dict or a `TaskTable`."""
+        if isinstance(data, dict):
+            return json.dumps(data, ensure_ascii=False)
+        return '{' + ', '.join(
+            f"{json.dumps(key)}: {json.dumps(dict(task), ensure_ascii=False)}" for key, task in data.items()
+        ) + '}'
+        
+    def _update(self, data:dict) -> None:
+        """
+        Updates the JSON database file with new data.
+
+        Args:
+            data (dict): The data dictionary to write to the JSON file.
+
+        Raises:
+            Database_error:  Raised if there is an error updating the database file due to permission or file issues.
+        
+        Note:
+            1. This Method make sure that no data may lost even catch error while writing json:
+               the data is written to a temporary file that atomically replaces the database,
+               so a crash leaves either the old or the new file, never a truncated one.
+            2. The replaced file is kept as `<database>.bak`, the generation `_load` falls back to.
+        """
+        temporary_path = f"{self.database_path}.{os.getpid()}.tmp"
+        try:
+            with open(temporary_path, mode="wb") as fp:
+                self._dump(data, fp)
+                self.bytes_written += fp.tell()
+                self._sync(fp, self.database_path)
+            
+            if os.path.exists(self.database_path):
+                self._keep_backup()
+            os.replace(temporary_path, self.database_path)
+            self._sync_directory()
+                
+        except (FileNotFoundError, PermissionError) as e:
+            raise Database_error(f"Error updating database", e)
+    
+    def _dump(self, data, fp) -> None:
+        """Writes the tasks to the open temporary file `_update` replaces the database with."""
+        fp.write(self._encode(data).encode('utf-8'))
+    
+    def _keep_backup(self) -> None:
+        """Keeps the current database file as `<database>.bak` by hard linking it, where the file system allows it."""
+        backup_path = self.database_path + '.bak'
+        try:
+            os.link(self.database_path, backup_path + '.tmp')
+            os.replace(backup_path + '.tmp', backup_path)
+        except OSError:
+            pass
+    
+    def _sync(self, fp, path: str) -> None:
+        """
+        Flushes an open file to disk, sharing one fsync between all writes of a `fsync_window`.
+        Files written within the window are remembered and synced with the next fsync.
+
+        Args:
+            fp: The open file that was written.
+            path (str): Where the file ends up, the path to sync later if the fsync is deferred.
+        """
+        fp.flush()
+        now = time.monotonic()
+        if self.fsync_window > 0 and now - self._last_sync < self.fsync_window:
+            self._unsynced.add(path)
+            return
+        
+        os.fsync(fp.fileno())
+        self._unsynced.discard(path)
+        self._last_sync = now
+        self.sync()
+    
+    def _sync_directory(self) -> None:
+        """Makes a rename in the database directory durable, on platforms that can fsync directories."""
+        if os.name == 'nt' or (self.fsync_window > 0 and self._unsynced):
+            return
+        fd = os.open(os.path.dirname(os.path.abspath(self.database_path)), os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    
+    def sync(self) -> None:
+        """Fsyncs every file written since the last fsync, ending the current group commit."""
+        pending, self._unsynced = self._unsynced, set()
+        for path in pending:
+            try:
+                with open(path, mode="ab") as fp:
+                    os.fsync(fp.fileno())
+            except FileNotFoundError:
+                continue  # a log that has been compacted since
+        if pending:
+            self._last_sync = time.monotonic()
+            self._sync_directory()
+    
+    def close(self) -> None:
+        """Writes pending mutations and makes every write durable, to be called before exiting."""
+        self.flush()
+        self.sync()
+    
+    @property
+    def index(self) -> TaskIndex:
+        """The secondary indexes over `data`, built from the loaded tasks the first time they are needed."""
+        if self._index is None:
+            self._index = TaskIndex(self.data.items())
+        return self._index
+    
+    @property
+    def schedule(self) -> Schedule:
+        """The deadline index over `data`, built from the loaded tasks the first time it is needed."""
+        if self._schedule is None:
+            self._schedule = Schedule(self._deadlines())
+        return self._schedule
+    
+    def _deadlines(self):
+        """Yields the `Schedule.entry` of every scheduled task, the tasks `schedule` is built from."""
+        for key, task in self.data.items():
+            entry = Schedule.entry(key, task)
+            if entry is not None:
+                yield entry
+    
+    @property
+    def search_index(self) -> SearchIndex:
+        """
+        The `SearchIndex`, mapped from `search_path` the first time it is needed, or built from
+        the tasks when it does not exist yet or is stale. Mutations not flushed yet are applied in memory.
+        """
+        if self._search is None:
+            with self.locked():
+                version = json.dumps(self._version())
+                try:
+                    self._search = SearchIndex(self.search_path)
+                except (FileNotFoundError, ValueError):
+                    pass
+                if self._search is None or self._search.version != version:
+                    self._search = SearchIndex.build(self.search_path, self.data.items(), version)
+        if self.dirty:
+            self._search.changes.update({int(key): SearchIndex.entry(self.data.get(key)) for key in self.dirty})
+        return self._search
+    
+    def _changed(self, key, old: dict | None, new: dict | None) -> None:
+        """
+        Keeps the secondary indexes up to date with a mutation, once they are built, and collects
+        its journal entry and its change of the `TaskStats` until they are written after the flush.
+
+        Args:
+            key: The ID of the task.
+            old (dict | None): The task before the change, None if it was added.
+            new (dict | None): The task after the change, None if it was deleted.
+        """
+        if self._index is not None:
+            self._index.changed(key, old, new)
+        if self._schedule is not None:
+            self._schedule.changed(key, old, new)
+        if self.journal is not None:
+            self._deltas.append(Journal.delta(key, old, new))
+        if not self._stats_checked:
+            self._stats_checked = True
+            if os.path.exists(self.stats_path):
+                self._stats_delta = TaskStats()
+        if self._stats_delta is not None:
+            self._stats_delta.changed(old, new)
+    
+    def _commit(self, key) -> None:
+        """
+        Records a mutation of the task stored under `key` and persists it right away,
+        unless the database is `deferred`.
+
+        Args:
+            key: The ID of the task that was added, changed or deleted.
+        """
+        self.dirty.add(key)
+        if not self.deferred:
+            self.flush()
+    
+    def _persist(self, keys: set) -> None:
+        """
+        Writes the tasks stored under `keys` to the storage.
+        The plain JSON storage has no cheaper way than rewriting the whole file,
+        storage backends override this to write only the changes.
+
+        Args:
+            keys (set): IDs of the tasks that were added, changed or deleted.
+        """
+        self._update(self.data)
+    
+    def flush(self) -> None:
+        """Persists every mutation collected since the last flush in one write."""
+        if self.dirty:
+            with self.locked():
+                keys, self.dirty = self.dirty, set()
+                before = self._version_seen
+                self._persist(keys)
+                self._record_history()
+                self._version_seen = self._version()
+                self._record_stats(before)
+                if self._searchable():
+                    self._written({key: self.data.get(key) for key in keys}, before)
+    
+    def _record_history(self) -> None:
+        """Writes the journal entries of the changes persisted since the last call."""
+        if self._deltas:
+            deltas, self._deltas = self._deltas, []
+            self.journal.append(deltas, lambda: self.data, self._sync)
+    
+    def _record_stats(self, before: tuple) -> None:
+        """
+        Adds the changes counted since the last call to the persisted `TaskStats`. They are recounted
+        from the tasks instead when they missed writes and were not at the version `before` the changes.
+        """
+        if self._stats_delta is None:
+            return
+        delta, self._stats_delta = self._stats_delta, TaskStats()
+        version = json.dumps(self._version())
+        try:
+            stats = TaskStats.load(self.stats_path)
+        except (FileNotFoundError, ValueError):
+            stats = None
+        if stats is None or stats.version != json.dumps(before):
+            stats = TaskStats.build(self.data.items(), version)
+        else:
+            stats.merge(delta)
+            stats.version = version
+        stats.save(self.stats_path)
+    
+    def Stats(self, by: str = 'day', since: float | None = None) -> str:
+        """
+        Reports the task counts per status, the tasks created and completed per day or week and the
+        average time from creation to done, as JSON. Answered from the persisted `TaskStats`, which
+        are counted from the tasks only the first time, or when another client changed the tasks
+        without updating them.
+
+        Args:
+            by (str, optional): 'day' or 'week' buckets. Defaults to 'day'.
+            since (float, optional): Only report buckets from this unix time on. Defaults to every bucket.
+
+        Returns:
+            str: The aggregates as one line of JSON.
+        """
+        report = self._stats(by, since)
+        return report if self.structured else json.dumps(report)
+    
+    def _stats(self, by: str = 'day', since: float | None = None) -> dict:
+        """The aggregates reported by `Stats` as a dict, see `TaskStats.report`."""
+        if by not in ('day', 'week'):
+            raise Database_error(f"Can not group by '{by}', expected 'day' or 'week'")
+        with self.locked():
+            version = json.dumps(self._version())
+            try:
+                stats = TaskStats.load(self.stats_path)
+            except (FileNotFoundError, ValueError):
+                stats = None
+            if stats is None or stats.version != version:
+                # counted from the tasks in memory, changes not flushed yet included
+                stats = TaskStats.build(self.data.items(), version)
+                stats.save(self.stats_path)
+                self._stats_delta = TaskStats()
+            elif self._stats_delta is not None:
+                stats.merge(self._stats_delta)
+            else:
+                self._stats_delta = TaskStats()
+            self._stats_checked = True
+        return stats.report(by, since)
+    
+    def _searchable(self) -> bool:
+        return self._search is not None or os.path.exists(self.search_path)
+    
+    def _written(self, tasks: dict, before: tuple) -> None:
+        """
+        Records persisted mutations in the search index. The index is rebuilt instead when its log
+        is too long, or when it missed writes and was not at the version `before` the mutations.
+
+        Args:
+            tasks (dict): The new value of every written task by ID, None for deleted tasks.
+            before (tuple): The `_version` of the database before the mutations were written.
+        """
+        try:
+            self._search = self._search or SearchIndex(self.search_path)
+        except (FileNotFoundError, ValueError):
+            self._search = None
+        version = json.dumps(self._version())
+        if self._search is None or self._search.version != json.dumps(before) \
+                or self._search.record(tasks, version) >= SearchIndex.log_limit:
+            self._search = SearchIndex.build(self.search_path, self.data.items(), version)
+    
+    def compact(self) -> None:
+        """Rewrites the whole storage from `data`."""
+        self._update(self.data)
+    
+    def migrate(self, tasks) -> int:
+        """
+        Copies tasks in the `Database.json` format into this storage and rewrites it in one go.
+        Tasks with an ID that is already stored are replaced.
+
+        Args:
+            tasks (Mapping): Tasks keyed by ID, as loaded from another storage.
+
+        Returns:
+            int: Number of tasks copied.
+        """
+        count = 0
+        with self.locked():
+            data = self.data
+            for key, task in tasks.items():
+                data[str(key)] = dict(task)
+                count += 1
+            self._index = self._schedule = None
+            self.compact()
+            self._unique_id()  # moves the ID counter past the copied IDs
+        return count
+    
+    def _watched_paths(self) -> tuple:
+        """The files other processes change when they write to this database."""
+        return (self.database_path,)
+    
+    def _version(self) -> tuple:
+        """
+        Identifies the on-disk state of the database by the inode, size and modification time
+        of its files. Every write either replaces a file (new inode) or appends to it.
+        """
+        version = []
+        for path in self._watched_paths():
+            try:
+                stat = os.stat(path)
+                version.append((stat.st_ino, stat.st_size, stat.st_mtime_ns))
+            except FileNotFoundError:
+                version.append(None)
+        return tuple(version)
+    
+    @contextlib.contextmanager
+    def locked(self):
+        """
+        Context manager serializing read-modify-write cycles between processes with an exclusive
+        `fcntl` lock on `lock_path`. It can be nested, only the outermost level takes the lock.
+        
+        When the files changed since this process last read or wrote them, the data is reloaded
+        first and the mutations not flushed yet are merged over it task by task, so no process
+        overwrites updates it has not seen.
+        """
+        if self._lock_depth == 0:
+            if self._lock_file is None:
+                self._lock_file = open(self.lock_path, mode="a+", encoding="utf-8")
+            if fcntl is not None:
+                fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+            if self._data is not None and self._version() != self._version_seen:
+                self._refresh()
+        
+        self._lock_depth += 1
+        try:
+            yield
+        finally:
+            self._lock_depth -= 1
+            if self._lock_depth == 0 and fcntl is not None:
+                fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+    
+    def adding(self):
+        """The lock to hold while adding several tasks, `locked` here, the shard new tasks go to for a `ShardedDatabase`."""
+        return self.locked()
+    
+    def _refresh(self) -> None:
+        """Reloads the data written by other processes and merges the mutations not flushed yet over it."""
+        self._version_seen = self._version()
+        data = self._load()
+        for key in self.dirty:
+            if key in self.data:
+                insert_in_order(data, key, self.data[key])
+            else:
+                data.pop(key, None)
+        self.data = data
+        self._index = self._schedule = None
+        self._search = None  # other processes recorded their writes in the search log
+    
+    def _unique_id(self) -> int:
+        """
+        Generates a unique identifier for new entries in the database.
+        IDs come from a counter persisted in `lock_path`, so allocating one is O(1) and an ID is
+        never handed out twice, not even after the task holding it was deleted. Without a
+        counter the last key of the dict + 1 is used. Must be called while holding `locked`
+        for the counter to be safe between processes.
+
+        Returns:
+            int: The next value of the counter, at least one more than the last key in `self.data`
+                 if the data is loaded, or 0 if no keys exist.
+        """
+        return self._allocate_ids(1).start
+    
+    def _allocate_ids(self, count: int) -> range:
+        """
+        Allocates a block of `count` consecutive IDs with a single update of the counter, see `_unique_id`.
+        The shard of a project only hands out IDs of the blocks its project got from `blocks`.
+
+        Returns:
+            range: The allocated IDs. For a shard it ends early at the end of a block, it then holds at least one ID.
+        """
+        with self.locked():
+            fp = self._lock_file
+            fp.seek(0)
+            counter = fp.read().strip()
+            
+            unique_id = 0
+            if self._data is not None or not counter.isdigit():
+                try:
+                    # Get the last key and convert it to an integer, then increment by 1
+                    last_key = int(next(reversed(self.data)))
+                    unique_id = last_key + 1
+                except (StopIteration, ValueError):
+                    # If dictionary is empty or last key isn't numeric, start from 0
+                    unique_id = 0
+            
+            unique_id = max(unique_id, int(counter) if counter.isdigit() else 0)
+            if self.blocks is not None:
+                if self.blocks.project_of(unique_id) != self.project:
+                    # the block of the project is used up, or it has none yet
+                    unique_id = self.blocks.claim(self.project).start
+                count = min(count, self.blocks.size - unique_id % self.blocks.size)
+            self._write_counter(unique_id + count)
+        
+        return range(unique_id, unique_id + count)
+    
+    def _return_ids(self, ids: range) -> None:
+        """Gives the unused tail `ids` of the last allocated block back, unless other IDs were allocated since."""
+        with self.locked():
+            self._lock_file.seek(0)
+            if self._lock_file.read().strip() == str(ids.stop):
+                self._write_counter(ids.start)
+    
+    def _write_counter(self, value: int) -> None:
+        fp = self._lock_file
+        fp.seek(0)
+        fp.truncate()
+        fp.write(str(value))
+        fp.flush()
+    
+    @staticmethod
+    def _records(tasks):
+        """Yields every `(key, task)` pair as one flat dict with the integer `id` first, the rows of the structured outputs."""
+        for key, task in tasks:
+            yield {'id': int(key), **task}
+    
+    def _format_table(self, tasks, workers: int = 1):
+        """
+        Formats a listing as table rows, in this process with `_format` or on a process pool with
+        `_format_parallel` when `workers` is not 1 and more than one core is available. The one
+        formatting stage `--trace` times.
+        """
+        if workers != 1 and parallel_workers(workers) > 1:
+            return self._format_parallel(tasks, workers)
+        return self._format(tasks)
+    
+    def _format(self, tasks):
+        """
+        Formats the tasks into the rows of a readable table, yielding each row as soon as it is built.
+
+        Args:
+            tasks (Iterable[tuple]): `(key, task)` pairs to format.
+
+        Yields:
+            str: The header, the separator and then the row(s) of every task, without newlines.
+        """
+        header, _ = self._templates(Color.enabled)
+        yield header
+        yield "-" * 112
+        yield from self._rows(tasks)
+    
+    @classmethod
+    def _rows(cls, tasks):
+        """Yields the table row(s) of every `(key, task)` pair, see `_format`."""
+        _, templates = cls._templates(Color.enabled)
+        date = format_date
+        for key, task in tasks:
+            # Convert timestamps to readable date format, memoized per quarter hour
+            created_at = date(task['createdAt'])
+            updated_at = date(task['updatedAt'])
+            description = task['description']
+            status = task['status']
+            
+            yield templates[status == 'Completed'].format(key, description[:50], status, created_at, updated_at)
+            
+            if len(description) > 50:
+                remaining_description = description[50:]
+                while remaining_description:
+                    yield templates[False].format('', remaining_description[:50], '', '', '')
+                    remaining_description = remaining_description[50:]
+    
+    def _format_parallel(self, tasks, workers: int):
+        """
+        Formats the tasks like `_format`, splitting them into chunks of `PARALLEL_CHUNK` tasks that are
+        formatted by a pool of `workers` processes (every core for 0), and yields the formatted chunks in order.
+        
+        At most two chunks per worker are in flight, so memory stays bounded however many tasks are listed.
+        Selections of fewer than `PARALLEL_MIN_TASKS` tasks are formatted in this process, where they
+        finish before the workers would have started.
+
+        Args:
+            tasks (Iterable[tuple]): `(key, task)` pairs to format.
+            workers (int): Number of worker processes, 0 for one per core. Capped at `parallel_workers`,
+                           with a single core the tasks are formatted in this process.
+
+        Yields:
+            str: The header, the separator and then blocks of newline-joined rows.
+        """
+        workers = parallel_workers(workers)
+        if workers <= 1:
+            yield from self._format(tasks)
+            return
+        tasks = iter(tasks)
+        head = list(itertools.islice(tasks, PARALLEL_MIN_TASKS))
+        if len(head) < PARALLEL_MIN_TASKS:
+            yield from self._format(itertools.chain(head, tasks))
+            return
+        
+        header, _ = self._templates(Color.enabled)
+        yield header
+        yield "-" * 112
+        
+        import multiprocessing, concurrent.futures  # only large listings on several cores start a pool
+        # forked workers start with this module and its color settings already loaded
+        context = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else None)
+        # flat tuples pickle faster than dicts, and rows of the columnar store are views into the whole table
+        plain = lambda chunk: [(key, task['description'], task['status'], task['createdAt'], task['updatedAt']) for key, task in chunk]
+        chunks = itertools.chain(
+            (head[start:start + PARALLEL_CHUNK] for start in range(0, len(head), PARALLEL_CHUNK)),
+            iter(lambda: list(itertools.islice(tasks, PARALLEL_CHUNK)), []),
+        )
+        with concurrent.futures.ProcessPoolExecutor(workers, mp_context=context) as pool:
+            pending = collections.deque()
+            try:
+                for chunk in chunks:
+                    pending.append(pool.submit(_render_chunk, plain(chunk)))
+                    if len(pending) >= 2 * workers:
+                        yield pending.popleft().result()
+                while pending:
+                    yield pending.popleft().result()
+            finally:
+                # output closed early, like `list all | head`
+                for future in pending:
+                    future.cancel()
+    
+    @staticmethod
+    @functools.cache
+    def _templates(colored: bool = True) -> tuple[str, dict]:
+        """
+        Compiles the table header and the row templates used by `_format` once, with or without colors.
+        
+        The color codes are already in place around every padded column, so each row is built by
+        a single `str.format` call. The padding sits inside the color codes, which looks the same
+        on a terminal since spaces have no foreground. Without colors the columns keep the same width.
+
+        Args:
+            colored (bool, optional): Whether the columns are wrapped in color codes, `Color.enabled`. Defaults to True.
+
+        Returns:
+            tuple[str, dict]: The header row, and the row template for "completed" (True) and other (False) tasks.
+        """
+        column = functools.partial(Database._column, colored)
+        header = ' | '.join((
+            column('b-blue', 18, '0'), column('b-green', 60, '1'), column('b-yellow', 22, '2'),
+            column('b-cyan', 25, '3'), column('b-cyan', 25, '4'),
+        )).format('Task ID', 'Description', 'Status', 'Created At', 'Updated At')
+        
+        templates = {
+            completed: ' | '.join((
+                column('red', 18, '0'), column('cyan', 60, '1'), column('green' if completed else 'red', 22, '2'),
+                column('cyan', 25, '3'), column('cyan', 25, '4'),
+            ))
+            for completed in (True, False)
+        }
+        return header, templates
+    
+    @staticmethod
+    @functools.cache
+    def _schedule_templates(colored: bool = True) -> tuple[str, dict]:
+        """
+        Compiles the header and the row templates of `_format_schedule` once, like `_templates`.
+
+        Returns:
+            tuple[str, dict]: The header row, and the row template for overdue (True) and other (False) tasks.
+        """
+        column = functools.partial(Database._column, colored)
+        header = ' | '.join((
+            column('b-blue', 18, '0'), column('b-green', 60, '1'), column('b-yellow', 22, '2'),
+            column('b-cyan', 25, '3'), column('b-cyan', 25, '4'),
+        )).format('Task ID', 'Description', 'Status', 'Due', 'Priority')
+        
+        templates = {
+            overdue: ' | '.join((
+                column('red', 18, '0'), column('cyan', 60, '1'), column('yellow', 22, '2'),
+                column('red' if overdue else 'green', 25, '3'), column('cyan', 25, '4'),
+            ))
+            for overdue in (True, False)
+        }
+        return header, templates
+    
+    @staticmethod
+    def _column(colored: bool, color: str, width: int, field: str) -> str:
+        """One padded `str.format` field of a row template, wrapped in the codes of `color` when `colored`."""
+        codes = Color.codes(color)
+        prefix, suffix = codes if colored else ('', '')
+        return f"{prefix}{{{field}:<{width - len(codes[0]) - len(codes[1])}}}{suffix}"
+    
+    def Add(self,description:str, due: float | None = None, priority: int | None = None) -> bool:
+        """
+        Adds a new task entry to the database.
+
+        Args:
+            description (str): Description of the task to add.
+            due (float, optional): Unix time the task is due. Defaults to no due time.
+            priority (int, optional): Importance among tasks due at the same time, higher first. Defaults to none.
+
+        Returns:
+            bool: True if the task was added successfully, False if an error occurred.
+        
+        Notes:
+            1. This method automatically assigns a 'todo' status to new entries.
+        """
+        id, data = self._add(description, due, priority)
+        if self.structured:
+            return {'id': id, 'task': dict(data)}  # not changed by later commands of a batch
+        message = Color.color("Task added successfully, ","yellow")+Color.color(f"Task Id: {id}","cyan")
+        if 'due' in data:
+            message += Color.color(", due ","yellow")+Color.color(format_deadline(data['due']),"cyan")
+        return message
+    
+    def _add(self, description: str, due: float | None = None, priority: int | None = None) -> tuple[int, dict]:
+        """Stores a new 'todo' task under a fresh ID and returns the ID and the task, see `Add`."""
+        data = {
+            'description': description,
+            'status': 'todo',
+            'createdAt': time.time(),
+            'updatedAt': time.time()
+        }
+        # the optional fields are only stored when set, 0 means unset like for `Update`
+        if due:
+            data['due'] = due
+        if priority:
+            data['priority'] = priority
+        with self.locked():
+            id = self._unique_id()
+            # keys are stored as strings, the same way they come back from `json.load`
+            self._insert(str(id), data)
+        return id, data
+    
+    def _insert(self, key: str, task: dict) -> None:
+        """
+        Stores a new task under a freshly allocated ID.
+
+        Args:
+            key (str): The ID of the new task.
+            task (dict): The task to store.
+        """
+        self.data[key] = task
+        self._changed(key, None, task)
+        self._commit(key)
+    
+    def Delete(self, id_:int) -> dict|None:
+        """
+        Deletes a task from the database by ID.
+
+        Args:
+            id_ (int): The unique ID of the task to delete.
+
+        Returns:
+            dict|None: The deleted task's data if the task was found, or None if the ID did not exist.
+        """
+        data = self._delete(id_)
+        if self.structured:
+            return {'id': int(id_), 'deleted': dict(data)}
+        return Color.color("Task deleted: ","yellow")+Color.color(f"'{data['description']}'","cyan")
+    
+    def _get(self, id_: int) -> dict:
+        """Returns one task, reloading what other processes wrote since it was last read."""
+        with self.locked():
+            task = self.data.get(str(id_))
+        if task is None:
+            raise Database_error(f"Task with ID {id_} does not exist.")
+        return task
+    
+    def _delete(self, id_: int) -> dict:
+        """Removes a task and returns it, see `Delete`."""
+        key = str(id_)  # keys are stored as strings
+        with self.locked():
+            if key not in self.data:
+                raise Database_error(f"Task with ID {id_} does not exist.")
+            
+            data = self.data.pop(key)
+            self._changed(key, data, None)
+            self._commit(key)
+        return data
+
+    def Update(self, id_: int, description: str | None = None, status: str | None = None,
+               due: float | None = None, priority: int | None = None) -> str:
+        """
+        Updates the details of an existing task in the database.
+        `due` and `priority` are cleared with 0 (`--due none` on the command line).
+        """
+        with self.locked():
+            _, changes = self._update_task(id_, description, status, due, priority)
+        if self.structured:
+            return {'id': int(id_), 'changes': {field: {'old': before, 'new': after} for field, (before, after) in changes.items()}}
+        
+        # Formulate the update message
+        updated_fields = ', '.join(
+            Color.color(f"{field} changed from","cyan")+ Color.color(f" '{format_field(field, before)}'","yellow")+Color.color(" to ","cyan")+Color.color(f"'{format_field(field, after)}'","yellow")
+            for field, (before, after) in changes.items()
+        )
+        return Color.color(f"Task with ID {id_} updated:","yellow")+f"{updated_fields}."
+    
+    def _update_task(self, id_: int, description: str | None, status: str | None,
+                     due: float | None = None, priority: int | None = None) -> tuple[dict, dict]:
+        """
+        Changes the description, the status, the due time and/or the priority of a task, see `Update`.
+        Must be called while holding `locked`.
+
+        Returns:
+            tuple[dict, dict]: The task after the change, and the `(old, new)` value of every given field by name.
+
+        Raises:
+            Database_error: If there is no such task, or no field to change was given.
+        """
+        key = str(id_)  # keys are stored as strings
+        if description is None and status is None and due is None and priority is None:
+            raise Database_error("Nothing to update, give a description, --due or --priority")
+        if key not in self.data:
+            raise Database_error(f"Task with ID {id_} does not exist.")
+        
+        changes = {}
+        task = self.data[key]
+        old = dict(task)
+        
+        if description is not None:
+            changes['description'] = (task.get('description', 'No description'), description)
+            task['description'] = description
+        
+        now = time.time()
+        if status is not None:
+            changes['status'] = (task.get('status', 'done'), status)
+            task['status'] = status
+            # when the task was completed, kept by later edits of a done task for its `TaskStats`
+            if status != 'done':
+                self._set_field(task, 'completedAt', None)
+            elif old.get('status') != 'done':
+                task['completedAt'] = now
+        
+        for field, value in (('due', due), ('priority', priority)):
+            if value is not None:
+                changes[field] = (task.get(field), value or None)
+                self._set_field(task, field, value or None)
+        
+        task['updatedAt'] = now
+        self._changed(key, old, task)
+        self._commit(key)
+        return task, changes
+
+    def Mark(self, id_:int, status:str) -> None:
+        """
+        Marks a task with a new status. 
+        This method is a shorthand for calling `Update` with only the status parameter.
+
+        Args:
+            id_ (int): Unique ID of the task to mark.
+            status (str): New status to apply to the task.
+        """
+        return self.Update(id_, description=None, status=status)
+    
+    def List(self, filter = "All", limit: int | None = None, offset: int = 0, after: int | None = None, sort: str | None = None, workers: int = 1, as_of: float | None = None):
+        """
+        Retrieves a filtered page of tasks from the database as a stream of table rows.
+        If a specific status filter is applied, only tasks matching that status are included.
+
+        Args:
+            filter (str, optional): A filter string to match the task's status field. When set to "All", all tasks are returned.. Defaults to "All".
+            limit (int, optional): Maximum number of tasks to list. Defaults to no limit.
+            offset (int, optional): Number of matching tasks to skip. Defaults to 0.
+            after (int, optional): Only list tasks with an ID greater than this cursor. Defaults to None.
+            sort (str, optional): 'updated' or 'created' to list the most recent tasks first. Defaults to ID order.
+            workers (int, optional): Processes formatting large listings in parallel, 0 for every core. Defaults to 1.
+            as_of (float, optional): List the tasks as they were at this unix time, rebuilt from the `journal`. Defaults to now.
+
+        Returns:
+            Iterator[str]: The table rows, produced lazily as they are consumed, or the task dicts when `structured`.
+        
+        Raises:
+            Database_error: If `sort` is unknown or `after` is combined with `sort`, cursors only work in ID order,
+                            or if `limit` or `offset` is negative.
+        """
+        tasks = self._query(filter, limit, offset, after, sort, as_of)
+        if self.structured:
+            return self._records(tasks)
+        return self._format_table(tasks, workers)
+    
+    @staticmethod
+    def _check_order(after: int | None, sort: str | None) -> None:
+        if sort not in (None, 'updated', 'created'):
+            raise Database_error(f"Can not sort by '{sort}', expected 'updated' or 'created'")
+        if after is not None and sort is not None:
+            raise Database_error("--after can only be used when listing in ID order")
+    
+    @staticmethod
+    def _check_page(limit: int | None, offset: int = 0) -> None:
+        if limit is not None and limit < 0:
+            raise Database_error("Can not list a negative number of tasks")
+        if offset < 0:
+            raise Database_error("Can not skip a negative number of tasks")
+    
+    def _query(self, filter: str = "all", limit: int | None = None, offset: int = 0, after: int | None = None,
+               sort: str | None = None, as_of: float | None = None):
+        """Selects the page of `(key, task)` pairs a listing shows, see `List` for the arguments."""
+        self._check_order(after, sort)
+        self._check_page(limit, offset)
+        tasks = self._select(filter, after, sort) if as_of is None else self._select_as_of(as_of, filter, after, sort)
+        if offset or limit is not None:
+            tasks = itertools.islice(tasks, offset, None if limit is None else offset + limit)
+        return tasks
+    
+    def Search(self, query: str, filter: str = "all", limit: int | None = None):
+        """
+        Finds tasks by the words of their description through the `search_index`, best matches first.
+
+        Args:
+            query (str): Words that must all match, `OR` between alternatives, `word*` for a prefix.
+            filter (str, optional): Only list tasks with this status. Defaults to "all".
+            limit (int, optional): Maximum number of tasks to list. Defaults to no limit.
+
+        Returns:
+            Iterator[str]: The table rows of the matching tasks.
+        """
+        tasks = self._search_tasks(query, filter, limit)
+        return self._records(tasks) if self.structured else self._format_table(tasks)
+    
+    def _search_tasks(self, query: str, filter: str = "all", limit: int | None = None):
+        """Selects the `(key, task)` pairs matching a search query, best matches first, see `Search`."""
+        self._check_page(limit)
+        status = None if filter.lower() == "all" else filter
+        ids = self.search_index.search(query, status, limit)
+        return ((str(id_), self.data[str(id_)]) for id_ in ids)
+    
+    def _select_as_of(self, when: float, filter: str, after: int | None = None, sort: str | None = None):
+        """Selects the `(key, task)` pairs matching the status filter from the tasks as they were at time `when`."""
+        if self.journal is None:
+            raise Database_error("The history is off, turn it on with TASKCLI_HISTORY=1")
+        status = None if filter.lower() == "all" else filter
+        tasks = ((key, task) for key, task in self.journal.state_at(when, self.data).items()
+                 if (status is None or task['status'] == status) and (after is None or int(key) > after))
+        if sort is not None:
+            return sorted(tasks, key=lambda item: (item[1][sort + 'At'], int(item[0])), reverse=True)
+        return tasks
+    
+    def Undo(self, count: int = 1) -> str:
+        """
+        Reverts the last `count` changes of the `journal` that were not undone yet, newest first.
+        The reverts are changes themselves and are journaled with the change they undo, so undoing
+        again goes further back instead of redoing.
+
+        Args:
+            count (int, optional): Number of changes to revert. Defaults to 1.
+
+        Returns:
+            str: One line per reverted change.
+
+        Raises:
+            Database_error: If the history is disabled, there is nothing to undo, or a task changed
+                            since in a way the journal does not know about.
+        """
+        reverted = self._undo(count)
+        if self.structured:
+            return [{'undone': entry['seq'], 'id': int(entry['id']), 'op': entry['op']} for entry, _ in reverted]
+        return '\n'.join(Color.color(f"Undid change #{entry['seq']}: ", "yellow") + Color.color(message, "cyan")
+                         for entry, message in reverted)
+    
+    def _undo(self, count: int) -> list:
+        """
+        Reverts the last `count` changes, see `Undo`.
+
+        Returns:
+            list: `(entry, message)` of every reverted change, newest first: its journal entry and what was reverted.
+        """
+        if self.journal is None:
+            raise Database_error("The history is off, turn it on with TASKCLI_HISTORY=1")
+        if count < 1:
+            raise Database_error("Can not undo less than one change")
+        
+        messages = []
+        with self.locked():
+            self.flush()  # changes a daemon still holds are journaled first
+            entries = self.journal.undoable(count)
+            if not entries:
+                raise Database_error("Nothing to undo")
+            deferred, self.deferred = self.deferred, True
+            try:
+                for entry in entries:
+                    messages.append(self._revert(entry))
+                    self._deltas[-1]['undoes'] = entry['seq']
+            finally:
+                self.deferred = deferred
+                if not deferred:
+                    self.flush()
+        return list(zip(entries, messages))
+    
+    def _revert(self, entry: dict) -> str:
+        """Applies the inverse of one journal entry to the tasks and describes what it reverted, see `Undo`."""
+        key = entry['id']
+        if entry['op'] == 'add':
+            if key not in self.data:
+                raise Database_error(f"Task with ID {key} does not exist.")
+            task = self.data.pop(key)
+            self._changed(key, task, None)
+            message = f"removed task {key} '{task['description']}'"
+        elif entry['op'] == 'delete':
+            if key in self.data:
+                raise Database_error(f"Task with ID {key} exists again, can not restore it.")
+            task = dict(entry['old'])
+            insert_in_order(self.data, key, task)
+            self._changed(key, None, task)
+            message = f"restored task {key} '{task['description']}'"
+        else:
+            if key not in self.data:
+                raise Database_error(f"Task with ID {key} does not exist.")
+            task = self.data[key]
+            old = dict(task)
+            for field, value in entry['old'].items():
+                self._set_field(task, field, value)
+            self._changed(key, old, task)
+            message = f"task {key} " + ', '.join(
+                f"{field} back to '{format_field(field, value)}'" for field, value in entry['old'].items() if field != 'updatedAt')
+        self._commit(key)
+        return message
+    
+    @staticmethod
+    def _set_field(task, field: str, value) -> None:
+        """Sets a field of a task, or removes it for None: `due` and `priority` only exist when they are set."""
+        if value is not None:
+            task[field] = value
+        elif field in task:
+            del task[field]
+    
+    def History(self, id_: int):
+        """
+        Lists every journaled change of one task, oldest first.
+
+        Args:
+            id_ (int): The ID of the task.
+
+        Returns:
+            Iterator[str]: One row per change.
+        """
+        entries = self._history(id_)
+        if self.structured:
+            return entries
+        return (self._history_row(entry) for entry in entries)
+    
+    def _history(self, id_: int) -> list:
+        """The journal entries of one task, oldest first, see `History`."""
+        if self.journal is None:
+            raise Database_error("The history is off, turn it on with TASKCLI_HISTORY=1")
+        key = str(id_)
+        entries = [entry for entry in self.journal.entries() if entry['id'] == key]
+        if not entries:
+            raise Database_error(f"Task with ID {id_} has no history.")
+        return entries
+    
+    @staticmethod
+    def _history_row(entry: dict) -> str:
+        when = time.strftime('%d %b %y %H:%M:%S', time.localtime(entry['at']))
+        if entry['op'] == 'update':
+            fields = [field for field in entry['new'] if field != 'updatedAt']
+            change = ', '.join(f"{field} '{format_field(field, entry['old'].get(field))}' -> '{format_field(field, entry['new'][field])}'"
+                               for field in fields)
+        else:
+            task = entry['new'] if entry['op'] == 'add' else entry['old']
+            change = f"'{task['description']}' ({task['status']})"
+        undo = Color.color(f" undoing #{entry['undoes']}", 'b-red') if 'undoes' in entry else ''
+        return (Color.color(when, 'b-cyan') + '  ' + Color.color(f"#{entry['seq']:<6}", 'b-blue') + ' '
+                + Color.color(f"{entry['op']:<7}", 'yellow') + ' ' + change + undo)
+    
+    def Next(self, count: int = 10):
+        """
+        Lists the open tasks that are due soonest, overdue tasks first, from the `schedule`.
+
+        Args:
+            count (int, optional): Number of tasks to list. Defaults to 10.
+
+        Returns:
+            Iterator[str]: The table rows, with the due time and priority of every task.
+        """
+        return self._show_scheduled(self._scheduled(limit=count))
+    
+    def Overdue(self, limit: int | None = None):
+        """
+        Lists the open tasks whose due time has passed, the longest overdue first.
+
+        Args:
+            limit (int, optional): Maximum number of tasks to list. Defaults to no limit.
+
+        Returns:
+            Iterator[str]: The table rows, with the due time and priority of every task.
+        """
+        return self._show_scheduled(self._scheduled(before=time.time(), limit=limit))
+    
+    def Due(self, before: float | None = None, limit: int | None = None):
+        """
+        Lists the open tasks due before a point in time, soonest first.
+
+        Args:
+            before (float, optional): Unix time the tasks are due before. Defaults to every task with a due time.
+            limit (int, optional): Maximum number of tasks to list. Defaults to no limit.
+
+        Returns:
+            Iterator[str]: The table rows, with the due time and priority of every task.
+        """
+        return self._show_scheduled(self._scheduled(before=before, limit=limit))
+    
+    def Watch(self, recheck: float = 60.0):
+        """
+        Prints the open tasks as they fall due, starting with the overdue ones, until interrupted.
+        Instead of polling, it sleeps until the next due time of the `schedule`, waking up at least
+        every `recheck` seconds to pick up due times other processes added or moved meanwhile.
+
+        Args:
+            recheck (float, optional): Longest sleep in seconds. Defaults to 60.
+
+        Returns:
+            Iterator[str]: The table rows of every task, produced when it falls due.
+        """
+        return self._show_scheduled(self._watch(recheck, idle=sys.stdout.flush))
+    
+    def _show_scheduled(self, tasks):
+        return self._records(tasks) if self.structured else self._format_schedule(tasks)
+    
+    def _scheduled(self, since: float | None = None, before: float | None = None, limit: int | None = None) -> list:
+        """
+        Selects the `(key, task)` pairs of the open tasks due in a time range, soonest first,
+        see `Schedule.select` for the arguments.
+
+        Raises:
+            Database_error: If `limit` is negative.
+        """
+        self._check_page(limit)
+        return self._select_scheduled(since, before, limit)
+    
+    def _select_scheduled(self, since: float | None, before: float | None, limit: int | None) -> list:
+        """Answers `_scheduled` from the `schedule`, after reloading what other processes wrote."""
+        with self.locked():
+            return [(str(id_), self.data[str(id_)]) for id_ in self.schedule.select(since, before, limit)]
+    
+    def _watch(self, recheck: float = 60.0, idle=None):
+        """
+        Yields the `(key, task)` pair of every open task once its due time passed, see `Watch`.
+
+        Args:
+            recheck (float, optional): Longest sleep in seconds. Defaults to 60.
+            idle (callable, optional): Called before every sleep. Defaults to None.
+
+        Raises:
+            Database_error: If `recheck` is not positive.
+        """
+        if recheck <= 0:
+            raise Database_error("--recheck must be more than 0 seconds")
+        since = None
+        try:
+            while True:
+                now = time.time()
+                yield from self._scheduled(since, now)
+                since = now
+                upcoming = self._scheduled(since=now, limit=1)
+                wake = min(upcoming[0][1]['due'], now + recheck) if upcoming else now + recheck
+                if idle is not None:
+                    idle()
+                time.sleep(max(0.0, wake - time.time()))
+        except KeyboardInterrupt:
+            return
+    
+    def _format_schedule(self, tasks):
+        """
+        Formats scheduled tasks like `_format`, with the due time and priority of every task instead
+        of its creation and update dates. The due time of overdue tasks is shown in red.
+        """
+        header, templates = self._schedule_templates(Color.enabled)
+        yield header
+        yield "-" * 112
+        for key, task in tasks:
+            description, due = task['description'], task['due']
+            yield templates[due < time.time()].format(key, description[:50], task['status'], format_deadline(due), task.get('priority', ''))
+            for start in range(50, len(description), 50):
+                yield templates[False].format('', description[start:start + 50], '', '', '')
+    
+    def _select(self, filter: str, after: int | None = None, sort: str | None = None):
+        """
+        Lazily selects the `(key, task)` pairs matching the status filter.
+        Filtered, paged and sorted selections are answered from the secondary `index`,
+        a plain listing of every task just walks `data`.
+
+        Args:
+            filter (str): Status to match, or "All" for every task.
+            after (int, optional): Only select tasks with an ID greater than this cursor. Defaults to None.
+            sort (str, optional): 'updated' or 'created' for the most recent tasks first. Defaults to ID order.
+
+        Returns:
+            Iterator[tuple]: The matching `(key, task)` pairs.
+        """
+        status = None if filter.lower() == "all" else filter
+        if status is not None or sort is not None or after is not None:
+            keys = map(str, self.index.select(status, sort, after))
+            return ((key, self.data[key]) for key in keys)
+        
+        items = iter(self.data.items())
+        if after is not None:
+            # IDs only ever grow, so everything after the cursor is at the end of the dict
+            items = itertools.dropwhile(lambda item: int(item[0]) <= after, items)
+        
+        # If the filter is "All", return all elements
+        if filter.lower() == "all":
+            return items
+        
+        return ((key,item) for key, item in items if item.get("status") == filter)
+
+
+# listings formatted by `Database._format_parallel` are split into chunks of this many tasks,
+# selections smaller than the threshold are formatted in-process
+PARALLEL_CHUNK = 20_000
+PARALLEL_MIN_TASKS = 50_000
+
+
+def parallel_workers(workers: int) -> int:
+    """
+    The worker processes `Database._format_parallel` starts for `list --workers`: `workers`, or one per
+    core for 0, but never more than the cores this process may run on. With `sched_getaffinity` that is
+    the cores of its CPU affinity, which in a container or under `taskset` can be fewer than `os.cpu_count()`.
+    More processes than cores only add scheduling and pickling overhead.
+    """
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+    return min(workers or cores, cores)
+
+
+def _render_chunk(rows: list) -> str:
+    """
+    Formats one chunk of `(key, description, status, createdAt, updatedAt)` tuples in a worker process,
+    returning its table rows joined by newlines.
+    """
+    tasks = ((key, {'description': description, 'status': status, 'createdAt': created, 'updatedAt': updated})
+             for key, description, status, created, updated in rows)
+    return '\n'.join(Database._rows(tasks))
+
+
+class WalDatabase(Database):
+    """
+    Database storage backend that appends one JSON line per mutation to a write-ahead log
+    (`Database.wal`) next to the snapshot file instead of rewriting the whole snapshot.
+    
+    Every log record holds the ID and the full new value of one task (`null` for a deleted task),
+    so replaying the log over the snapshot is idempotent. Once the log grows past `wal_limit`
+    bytes it is folded back into the snapshot by `compact`.
+    """
+    def __init__(self, database_path: str | None = None, wal_limit: int | None = None) -> None:
+        """
+        Initializes the WalDatabase object.
+
+        Args:
+            database_path (str, optional): Path of the snapshot file. Defaults to `database_location()`.
+            wal_limit (int, optional): Log size in bytes that triggers compaction.
+                                       Defaults to `TASKCLI_WAL_LIMIT` or 4 MiB.
+        """
+        database_path = database_path or database_location()
+        self.wal_path = os.path.splitext(database_path)[0] + '.wal'
+        self.wal_limit = wal_limit or int(os.environ.get('TASKCLI_WAL_LIMIT', 4 * 1024 * 1024))
+        super().__init__(database_path)
+    
+    def _load(self) -> dict:
+        """
+        Loads the snapshot and replays the write-ahead log over it.
+
+        Returns:
+            dict: The snapshot data with every logged mutation applied.
+        
+        Note:
+            1. A torn last line (crash in the middle of an append) is ignored.
+        """
+        return self._replay(super()._load())
+    
+    def _replay(self, data):
+        """Applies the records of the write-ahead log to the loaded snapshot, in order."""
+        try:
+            with open(self.wal_path, mode="r", encoding="utf-8") as fp:
+                self.bytes_read += os.fstat(fp.fileno()).st_size
+                for line in fp:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        break
+                    key, task = str(record['id']), record['task']
+                    if task is None:
+                        data.pop(key, None)
+                    else:
+                        # a task restored by `undo` is logged after tasks with higher IDs
+                        insert_in_order(data, key, task)
+        except FileNotFoundError:
+            pass
+        return data
+    
+    def _persist(self, keys: set) -> None:
+        """
+        Appends the new values of the tasks stored under `keys` to the write-ahead log
+        and compacts the log once it passes `wal_limit`.
+
+        Args:
+            keys (set): IDs of the tasks that were added, changed or deleted.
+
+        Raises:
+            Database_error: Raised if the log can not be written.
+        """
+        # in ID order, so replaying the log inserts new tasks in the order of the snapshot
+        self._append({key: self.data.get(key) for key in sorted(keys, key=int)})
+    
+    def _insert(self, key: str, task: dict) -> None:
+        """
+        Stores a new task. When the data has not been loaded yet, the task is appended to the
+        log without reading the database at all.
+        """
+        if self._data is not None or self.deferred:
+            return super()._insert(key, task)
+        before = self._version()
+        self._changed(key, None, task)
+        self._append({key: task})
+        self._record_history()
+        self._record_stats(before)
+        if self._searchable():
+            self._written({key: task}, before)
+    
+    def _append(self, tasks: dict) -> None:
+        """
+        Appends one log record per task and compacts the log once it passes `wal_limit`.
+
+        Args:
+            tasks (dict): New task values by ID, None for deleted tasks.
+
+        Raises:
+            Database_error: Raised if the log can not be written.
+        """
+        records = ''.join(
+            json.dumps({'id': str(key), 'task': None if task is None else dict(task)}, ensure_ascii=False) + '\n'
+            for key, task in tasks.items()
+        ).encode('utf-8')
+        try:
+            with open(self.wal_path, mode="ab") as fp:
+                self.bytes_written += fp.write(records)
+                size = fp.tell()
+                self._sync(fp, self.wal_path)
+        except (FileNotFoundError, PermissionError) as e:
+            raise Database_error("Error writing the write-ahead log", e)
+        
+        if size >= self.wal_limit:
+            self.compact()
+    
+    def _watched_paths(self) -> tuple:
+        return (self.database_path, self.wal_path)
+    
+    def compact(self) -> None:
+        """
+        Folds the write-ahead log into the snapshot and truncates the log.
+        
+        Note:
+            1. The snapshot is written before the log is removed, so a crash in between only
+               leaves records behind that replay to the same state.
+        """
+        self._update(self.data)
+        try:
+            os.remove(self.wal_path)
+        except FileNotFoundError:
+            pass
+
+
+class SqliteTasks(MutableMapping):
+    """
+    Dict-like view over the `tasks` table of a SQLite database, so the `Database` methods can
+    work on it the same way they work on the loaded JSON dict.
+    
+    Keys are handed out as strings like the JSON storage does. Tasks returned by `__getitem__`
+    are kept in `pending` and handed out again on the next lookup, so changes made to them in
+    place can be written back by `write`. Tasks that were only read are dropped from it by `forget`
+    once another process changed the file, see `SqliteDatabase._refresh`.
+    """
+    def __init__(self, connection) -> None:
+        """
+        Initializes the view.
+
+        Args:
+            connection (sqlite3.Connection): Open connection holding the `tasks` table.
+        """
+        self.connection = connection
+        self.pending = {}
+    
+    columns = "description, status, createdAt, updatedAt, due, priority, completedAt"
+    
+    @staticmethod
+    def _task(row: tuple) -> dict:
+        task = {'description': row[0], 'status': row[1], 'createdAt': row[2], 'updatedAt': row[3]}
+        if row[4] is not None:
+            task['due'] = row[4]
+        if row[5] is not None:
+            task['priority'] = row[5]
+        if row[6] is not None:
+            task['completedAt'] = row[6]
+        return task
+    
+    @staticmethod
+    def _row(key, task) -> tuple:
+        return (int(key), task['description'], task['status'], task['createdAt'], task['updatedAt'],
+                task.get('due'), task.get('priority'), task.get('completedAt'))
+    
+    def __getitem__(self, key) -> dict:
+        try:
+            id_ = int(key)
+        except ValueError:
+            raise KeyError(key)
+        if id_ in self.pending:
+            return self.pending[id_]
+        row = self.connection.execute(
+            f"SELECT {self.columns} FROM tasks WHERE id = ?", (id_,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(key)
+        task = self.pending[id_] = self._task(row)
+        return task
+    
+    def __setitem__(self, key, task: dict) -> None:
+        self.pending[int(key)] = task
+        self.write(key)
+    
+    def __delitem__(self, key) -> None:
+        self.pending.pop(int(key), None)
+        if self.connection.execute("DELETE FROM tasks WHERE id = ?", (int(key),)).rowcount == 0:
+            raise KeyError(key)
+    
+    def __contains__(self, key) -> bool:
+        try:
+            id_ = int(key)
+        except (TypeError, ValueError):
+            return False
+        return self.connection.execute("SELECT 1 FROM tasks WHERE id = ?", (id_,)).fetchone() is not None
+    
+    def __iter__(self):
+        for (id_,) in self.connection.execute("SELECT id FROM tasks ORDER BY id"):
+            yield str(id_)
+    
+    def __reversed__(self):
+        for (id_,) in self.connection.execute("SELECT id FROM tasks ORDER BY id DESC"):
+            yield str(id_)
+    
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+    
+    def items(self, status: str | None = None, after: int | None = None, sort: str | None = None):
+        """
+        Iterates over `(key, task)` pairs without going through `pending`.
+
+        Args:
+            status (str, optional): Only yield tasks with this status, answered from the status index.
+            after (int, optional): Only yield tasks with an ID greater than this cursor.
+            sort (str, optional): 'updated' or 'created' for the most recent tasks first, answered
+                                  from the timestamp indexes. Defaults to ID order.
+        """
+        query = f"SELECT id, {self.columns} FROM tasks WHERE id > ?"
+        parameters = [-1 if after is None else after]
+        if status:
+            query += " AND status = ?"
+            parameters.append(status)
+        query += {'updated': " ORDER BY updatedAt DESC", 'created': " ORDER BY createdAt DESC"}.get(sort, " ORDER BY id")
+        rows = self.connection.execute(query, parameters)
+        for row in rows:
+            yield str(row[0]), self._task(row[1:])
+    
+    def scheduled(self, since: float | None = None, before: float | None = None, limit: int | None = None):
+        """
+        Iterates over the `(key, task)` pairs of the open tasks due in a time range, soonest first,
+        answered from the partial `tasks_due` index, see `Schedule.select` for the arguments.
+        """
+        rows = self.connection.execute(
+            f"SELECT id, {self.columns} FROM tasks WHERE due IS NOT NULL AND status != 'done' AND due >= ? AND due < ?"
+            " ORDER BY due, priority DESC, id LIMIT ?",
+            (-math.inf if since is None else since, math.inf if before is None else before, -1 if limit is None else limit)
+        )
+        for row in rows:
+            yield str(row[0]), self._task(row[1:])
+    
+    def forget(self, keep: set) -> None:
+        """
+        Drops the pending tasks that are not about to be written, so they are read from the file again.
+
+        Args:
+            keep (set): IDs of the tasks changed in place and not written yet.
+        """
+        self.pending = {id_: task for id_, task in self.pending.items() if str(id_) in keep}
+    
+    def write(self, key) -> None:
+        """
+        Writes the pending value of the task stored under `key` to the table.
+
+        Args:
+            key: The ID of the task to write. Nothing is written if the task is not pending.
+        """
+        task = self.pending.pop(int(key), None)
+        if task is not None:
+            self.connection.execute(
+                f"INSERT OR REPLACE INTO tasks (id, {self.columns}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", self._row(key, task)
+            )
+
+
+class SqliteDatabase(Database):
+    """
+    Database storage backend keeping the tasks in a SQLite file (`Database.sqlite3`) with indexes on
+    `status`, `createdAt` and `updatedAt`, so nothing has to be parsed at startup and filtered lists
+    are answered from an index instead of a scan. The deadlines are kept in a partial index over the
+    open tasks with a `due` time, which stands in for the `schedule` of the other backends.
+    """
+    schema = (
+        "CREATE TABLE IF NOT EXISTS tasks ("
+        " id INTEGER PRIMARY KEY, description TEXT NOT NULL, status TEXT NOT NULL,"
+        " createdAt REAL NOT NULL, updatedAt REAL NOT NULL, due REAL, priority INTEGER, completedAt REAL)",
+        "CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status)",
+        "CREATE INDEX IF NOT EXISTS tasks_createdAt ON tasks (createdAt)",
+        "CREATE INDEX IF NOT EXISTS tasks_updatedAt ON tasks (updatedAt)",
+        "CREATE INDEX IF NOT EXISTS tasks_due ON tasks (due, priority DESC) WHERE due IS NOT NULL AND status != 'done'",
+    )
+    # columns added after the first version of the table, added to older files when they are opened
+    added_columns = (('due', 'REAL'), ('priority', 'INTEGER'), ('completedAt', 'REAL'))
+    extension = '.sqlite3'
+    
+    def __init__(self, database_path: str | None = None) -> None:
+        """
+        Initializes the SqliteDatabase object.
+
+        Args:
+            database_path (str, optional): Path of the SQLite file. Defaults to `Database.sqlite3` next to `database_location()`.
+
+        Raises:
+            Database_error: Raised if python was built without the `sqlite3` module.
+        """
+        if sqlite3 is None:
+            raise Database_error("The sqlite storage backend needs the sqlite3 module")
+        super().__init__(database_path or os.path.splitext(database_location())[0] + '.sqlite3')
+    
+    def _load(self) -> SqliteTasks:
+        """
+        Opens the SQLite file, creating the table and indexes if needed.
+
+        Returns:
+            SqliteTasks: Dict-like view over the `tasks` table.
+
+        Raises:
+            Database_error: Raised if the file can not be opened.
+        """
+        try:
+            # `AsyncTaskStore` uses the database from its executor's thread, one call at a time
+            self.connection = sqlite3.connect(self.database_path, check_same_thread=False)
+            self.connection.execute(self.schema[0])
+            existing = {row[1] for row in self.connection.execute("PRAGMA table_info(tasks)")}
+            for name, type_ in self.added_columns:
+                if name not in existing:
+                    self.connection.execute(f"ALTER TABLE tasks ADD COLUMN {name} {type_}")
+            for statement in self.schema[1:]:
+                self.connection.execute(statement)
+            self.connection.commit()
+        except sqlite3.Error as e:
+            raise Database_error("Error opening the sqlite database", e)
+        return SqliteTasks(self.connection)
+    
+    def _version(self) -> tuple:
+        """
+        Identifies the on-disk state of the SQLite file by its inode, size and modification time, plus the
+        file change counter of its header, which every commit increments even when the size and the
+        modification time stay the same.
+        """
+        try:
+            with open(self.database_path, mode="rb") as fp:
+                stat = os.fstat(fp.fileno())
+                header = fp.read(28)
+        except FileNotFoundError:
+            return (None,)
+        return ((stat.st_ino, stat.st_size, stat.st_mtime_ns, int.from_bytes(header[24:28], 'big')),)
+    
+    def _refresh(self) -> None:
+        """
+        Rows are read from the file on every lookup, so only the tasks kept in `pending` by earlier
+        lookups can be stale: the ones that were only read are dropped and read again, and the
+        indexes built from the old rows are dropped.
+        """
+        self._version_seen = self._version()
+        self.data.forget(self.dirty)
+        self._index = self._schedule = None
+        self._search = None  # other processes recorded their writes in the search log
+    
+    def _persist(self, keys: set) -> None:
+        """
+        Writes the tasks stored under `keys` and commits the transaction.
+
+        Args:
+            keys (set): IDs of the tasks that were added, changed or deleted.
+        """
+        try:
+            for key in keys:
+                self.data.write(key)
+            self.connection.commit()
+        except sqlite3.Error as e:
+            raise Database_error("Error updating database", e)
+    
+    def _write_changed(self) -> None:
+        """
+        Writes the tasks changed in place into the open transaction, uncommitted until the next flush,
+        so the queries of a deferred batch see the changes made before them.
+        """
+        try:
+            for key in self.dirty:
+                self.data.write(key)
+        except sqlite3.Error as e:
+            raise Database_error("Error updating database", e)
+    
+    def _select(self, filter: str, after: int | None = None, sort: str | None = None):
+        self._write_changed()
+        return self.data.items(None if filter.lower() == "all" else filter, after, sort)
+    
+    def _select_scheduled(self, since: float | None, before: float | None, limit: int | None) -> list:
+        self._write_changed()
+        return list(self.data.scheduled(since, before, limit))
+    
+    def migrate(self, tasks: dict) -> int:
+        """
+        Copies tasks in the `Database.json` format into the table in a single transaction.
+        Tasks with an ID that is already stored are replaced.
+
+        Args:
+            tasks (dict): Tasks keyed by ID, as loaded from `Database.json`.
+
+        Returns:
+            int: Number of tasks copied.
+        """
+        rows = (SqliteTasks._row(key, task) for key, task in tasks.items())
+        with self.locked():
+            connection = self.data.connection  # connects on first access of `data`
+            try:
+                with connection:
+                    count = connection.executemany(
+                        f"INSERT OR REPLACE INTO tasks (id, {SqliteTasks.columns}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows
+                    ).rowcount
+            except sqlite3.Error as e:
+                raise Database_error("Error migrating database", e)
+            self.data.forget(self.dirty)
+            self._index = self._schedule = None
+            self._unique_id()  # moves the ID counter past the copied IDs
+        return count
+
+
+class SnapshotTasks(MutableMapping):
+    """
+    Dict-like view over a binary task snapshot mapped into memory with `mmap`, so opening it
+    costs the same for ten tasks as for ten million and a lookup only decodes the task it finds.
+    
+    File layout, little-endian:
+    
+    - header: magic `TASKSNAP`, version, status count, record count, offset of the record table
+      and offset of the status table.
+    - description heap: the UTF-8 descriptions back to back.
+    - record table: one fixed-width record per task sorted by ID: id, createdAt, updatedAt,
+      offset and length of the description in the heap, status code, priority (0 for none), due
+      time and completion time (NaN for none). Version 1 snapshots have no priority and due columns,
+      version 2 snapshots no completion time, both are still read.
+    - status table: every distinct status once, as a length byte and the UTF-8 string.
+    
+    The columns of the record table are read through strided memoryviews, so an ID is found by
+    bisecting the mapped `ids` and a status filter compares one byte per task. Tasks that are
+    added, changed or deleted are kept in `changes` (None for a deleted task) and win over the
+    snapshot. Tasks that were only read are kept in `decoded`, which holds the last `cache_size`
+    of them, so reading every task does not keep every task in memory.
+    """
+    magic = b'TASKSNAP'
+    version = 3
+    header = struct.Struct('<8sIIQQQ')
+    # the record of every version, `dump` writes the current one
+    records = {1: struct.Struct('<qddQIB3x'), 2: struct.Struct('<qddQIBxHd'), 3: struct.Struct('<qddQIBxHdd')}
+    record = records[version]
+    # decoded tasks kept by `__getitem__` for the next lookup of the same ID
+    cache_size = 1024
+    
+    def __init__(self, path: str) -> None:
+        """
+        Maps a snapshot file.
+
+        Args:
+            path (str): Path of the snapshot.
+
+        Raises:
+            FileNotFoundError: If there is no snapshot at `path`.
+            Database_error: If the file is not a task snapshot.
+        """
+        if sys.byteorder != 'little':
+            raise Database_error("The binary storage backend needs a little-endian machine")
+        with open(path, mode="rb") as fp:
+            try:
+                self.buffer = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+                magic, version, status_count, self.count, records_offset, statuses_offset = self.header.unpack_from(self.buffer)
+            except (ValueError, struct.error):  # an empty or truncated file
+                magic = version = None
+        if magic != self.magic or version not in self.records:
+            raise Database_error(f"{path} is not a task snapshot")
+        
+        self.statuses = []
+        position = statuses_offset
+        for _ in range(status_count):
+            length = self.buffer[position]
+            self.statuses.append(self.buffer[position + 1:position + 1 + length].decode('utf-8'))
+            position += 1 + length
+        self.status_codes = {status: code for code, status in enumerate(self.statuses)}
+        
+        record = self.records[version]
+        table = memoryview(self.buffer)[records_offset:records_offset + self.count * record.size]
+        words = record.size // 8
+        self.ids = table.cast('q')[0::words]
+        self.created = table.cast('d')[1::words]
+        self.updated = table.cast('d')[2::words]
+        self.offsets = table.cast('Q')[3::words]
+        self.lengths = table.cast('I')[8::words * 2]
+        self.codes = table[36::record.size]
+        self.priorities = table.cast('H')[19::words * 4] if version >= 2 else None
+        self.due = table.cast('d')[5::words] if version >= 2 else None
+        self.completed = table.cast('d')[6::words] if version >= 3 else None
+        self.changes = {}
+        self.decoded = {}
+    
+    def _row(self, id_: int) -> int | None:
+        row = bisect.bisect_left(self.ids, id_)
+        return row if row < self.count and self.ids[row] == id_ else None
+    
+    def _task(self, row: int) -> dict:
+        offset = self.offsets[row]
+        task = {
+            'description': self.buffer[offset:offset + self.lengths[row]].decode('utf-8'),
+            'status': self.statuses[self.codes[row]],
+            'createdAt': self.created[row],
+            'updatedAt': self.updated[row],
+        }
+        if self.due is not None:
+            due, priority = self.due[row], self.priorities[row]
+            if due == due:  # NaN when the task has no due time
+                task['due'] = due
+            if priority:
+                task['priority'] = priority
+        if self.completed is not None:
+            completed = self.completed[row]
+            if completed == completed:
+                task['completedAt'] = completed
+        return task
+    
+    def __getitem__(self, key) -> dict:
+        try:
+            id_ = int(key)
+        except (TypeError, ValueError):
+            raise KeyError(key)
+        if id_ in self.changes:
+            task = self.changes[id_]
+        elif id_ in self.decoded:
+            task = self.decoded[id_]
+        else:
+            row = self._row(id_)
+            task = None if row is None else self._task(row)
+            if task is not None:
+                if len(self.decoded) >= self.cache_size:
+                    del self.decoded[next(iter(self.decoded))]  # the oldest one
+                self.decoded[id_] = task
+        if task is None:
+            raise KeyError(key)
+        return task
+    
+    def __setitem__(self, key, task: dict) -> None:
+        self.decoded.pop(int(key), None)
+        self.changes[int(key)] = task
+    
+    def __delitem__(self, key) -> None:
+        if key not in self:
+            raise KeyError(key)
+        self.decoded.pop(int(key), None)
+        self.changes[int(key)] = None
+    
+    def __contains__(self, key) -> bool:
+        try:
+            id_ = int(key)
+        except (TypeError, ValueError):
+            return False
+        if id_ in self.changes:
+            return self.changes[id_] is not None
+        return self._row(id_) is not None
+    
+    def _ids(self, start: int = 0, reverse: bool = False):
+        """Merges the snapshot IDs from row `start` on with the changed IDs, without deleted tasks."""
+        rows = range(self.count - 1, start - 1, -1) if reverse else range(start, self.count)
+        snapshot = (self.ids[row] for row in rows)
+        changed = sorted(self.changes, reverse=reverse)
+        last = None
+        for id_ in heapq.merge(snapshot, changed, reverse=reverse):
+            if id_ == last:
+                continue
+            last = id_
+            if self.changes.get(id_, True) is not None:
+                yield id_
+    
+    def __iter__(self):
+        return map(str, self._ids())
+    
+    def __reversed__(self):
+        return map(str, self._ids(reverse=True))
+    
+    def __len__(self) -> int:
+        count = self.count
+        for id_, task in self.changes.items():
+            stored = self._row(id_) is not None
+            count += (task is not None and not stored) - (task is None and stored)
+        return count
+    
+    def items(self, status: str | None = None, after: int | None = None):
+        """
+        Streams `(key, task)` pairs in ID order straight off the mapped buffer, without going
+        through `changes` for unchanged tasks.
+
+        Args:
+            status (str, optional): Only yield tasks with this status, compared by status code.
+            after (int, optional): Only yield tasks with an ID greater than this cursor.
+        """
+        start = 0 if after is None else bisect.bisect_right(self.ids, after)
+        code = self.status_codes.get(status, -1)
+        changed = iter(sorted(id_ for id_ in self.changes if after is None or id_ > after))
+        pending = next(changed, None)
+        for row in range(start, self.count):
+            id_ = self.ids[row]
+            while pending is not None and pending <= id_:
+                task = self.changes[pending]
+                if task is not None and (status is None or task['status'] == status):
+                    yield str(pending), task
+                pending = next(changed, None)
+            if id_ in self.changes or (status is not None and self.codes[row] != code):
+                continue
+            yield str(id_), self._task(row)
+        while pending is not None:
+            task = self.changes[pending]
+            if task is not None and (status is None or task['status'] == status):
+                yield str(pending), task
+            pending = next(changed, None)
+    
+    def deadlines(self):
+        """
+        Yields the `Schedule.entry` of every scheduled task, reading the due, status and priority
+        columns of the snapshot instead of decoding every task.
+        """
+        if self.due is not None:
+            done, changes = self.status_codes.get('done', -1), self.changes
+            due, codes, priorities, ids = self.due, self.codes, self.priorities, self.ids
+            for row in range(self.count):
+                when = due[row]
+                if when == when and codes[row] != done and ids[row] not in changes:
+                    yield (when, -priorities[row], ids[row])
+        for id_, task in self.changes.items():
+            entry = Schedule.entry(id_, task)
+            if entry is not None:
+                yield entry
+    
+    @classmethod
+    def dump(cls, tasks, fp) -> None:
+        """
+        Writes tasks to an open binary file in the snapshot format. Descriptions are streamed to
+        the file as they come, only the fixed-width records are buffered until the end.
+
+        Args:
+            tasks (Iterable[tuple]): `(key, task)` pairs in ascending ID order.
+            fp: File opened for writing in binary mode, at position 0.
+        """
+        fp.write(bytes(cls.header.size))
+        position = cls.header.size
+        records = bytearray()
+        statuses = {}
+        for key, task in tasks:
+            description = task['description'].encode('utf-8')
+            code = statuses.setdefault(task['status'], len(statuses))
+            if code > 255:
+                raise Database_error("Too many distinct statuses for the binary snapshot")
+            due, completed = task.get('due'), task.get('completedAt')
+            records += cls.record.pack(int(key), task['createdAt'], task['updatedAt'], position, len(description), code,
+                                       task.get('priority', 0), math.nan if due is None else due,
+                                       math.nan if completed is None else completed)
+            fp.write(description)
+            position += len(description)
+        
+        padding = -position % 8  # keeps the record table aligned for the memoryview casts
+        fp.write(bytes(padding))
+        records_offset = position + padding
+        fp.write(records)
+        for status in statuses:
+            encoded = status.encode('utf-8')
+            fp.write(bytes((len(encoded),)) + encoded)
+        fp.seek(0)
+        fp.write(cls.header.pack(cls.magic, cls.version, len(statuses), len(records) // cls.record.size,
+                                 records_offset, records_offset + len(records)))
+        fp.seek(0, os.SEEK_END)
+
+
+class BinaryDatabase(WalDatabase):
+    """
+    Database storage backend keeping the tasks in a binary snapshot (`Database.tasks`) that is
+    mapped into memory instead of parsed, see `SnapshotTasks`. Opening the database only reads
+    the snapshot header and replays the write-ahead log (`Database.tasks.wal`), so point operations
+    and paged listings cost the same whatever the size of the database.
+    
+    Mutations are appended to the log like `WalDatabase` does, and `compact` writes a new snapshot.
+    """
+    extension = '.tasks'
+    
+    def __init__(self, database_path: str | None = None, wal_limit: int | None = None) -> None:
+        """
+        Initializes the BinaryDatabase object.
+
+        Args:
+            database_path (str, optional): Path of the snapshot. Defaults to `Database.tasks` next to `database_location()`.
+            wal_limit (int, optional): Log size in bytes that triggers compaction.
+                                       Defaults to `TASKCLI_WAL_LIMIT` or 4 MiB.
+        """
+        database_path = database_path or os.path.splitext(database_location())[0] + '.tasks'
+        super().__init__(database_path, wal_limit)
+        self.wal_path = database_path + '.wal'  # `Database.wal` belongs to the wal backend
+    
+    def _load(self) -> SnapshotTasks:
+        """
+        Maps the snapshot, creating an empty one if needed, and replays the write-ahead log over it.
+        If the snapshot is unreadable the previous generation (`<snapshot>.bak`) is mapped instead.
+
+        Returns:
+            SnapshotTasks: Dict-like view over the snapshot with every logged mutation applied.
+
+        Raises:
+            Database_error: If neither the snapshot nor its previous generation can be read.
+        """
+        try:
+            tasks = SnapshotTasks(self.database_path)
+        except FileNotFoundError:
+            self._update({})
+            tasks = SnapshotTasks(self.database_path)
+        except Database_error:
+            try:
+                tasks = SnapshotTasks(self.database_path + '.bak')
+            except FileNotFoundError:
+                raise Database_error(f"{self.database_path} is not a task snapshot and has no previous generation")
+            print(Color.color("Failed to decode the snapshot:",'red'), Color.color("Loaded the previous generation from " + self.database_path + '.bak','b-red'))
+        return self._replay(tasks)
+    
+    def _dump(self, data, fp) -> None:
+        items = data.items()
+        if not isinstance(data, SnapshotTasks):
+            items = sorted(items, key=lambda item: int(item[0]))
+        SnapshotTasks.dump(items, fp)
+    
+    def compact(self) -> None:
+        """Writes a new snapshot holding the logged mutations and truncates the log."""
+        super().compact()
+        # the changes are in the new snapshot now, map it on next use instead of keeping them
+        self._data = None
+    
+    def _select(self, filter: str, after: int | None = None, sort: str | None = None):
+        if sort is not None:
+            return super()._select(filter, after, sort)
+        return self.data.items(None if filter.lower() == "all" else filter, after)
+    
+    def _deadlines(self):
+        return self.data.deadlines()
+    
+    def _changed(self, key, old: dict | None, new: dict | None) -> None:
+        if old is not None and new is not None:
+            # changed in place by `_update_task` or `_revert`, a task `data` only had decoded
+            self.data[key] = new
+        super()._changed(key, old, new)
+
+
+class SegmentedTasks(MutableMapping):
+    """
+    Dict-like view over a directory of JSON segment files, each holding the tasks of one range of
+    `size` IDs: `00000012.json` holds the IDs from `12 * size` to `13 * size - 1`. A segment is only
+    read the first time one of its tasks is used, so a point operation reads one small file whatever
+    the size of the database, and a full iteration reads the segments one by one in ID order.
+    
+    Attributes:
+        path (str): The segment directory.
+        size (int): Number of IDs per segment.
+        numbers (list): Sorted numbers of the existing segments, including new ones not written yet.
+        segments (dict): The tasks of every segment read so far, by segment number.
+    """
+    def __init__(self, path: str, size: int) -> None:
+        self.path = path
+        self.size = size
+        self.numbers = sorted(int(name[:-5]) for name in os.listdir(path) if name.endswith('.json') and name[:-5].isdigit())
+        self.segments = {}
+    
+    def file(self, number: int) -> str:
+        return os.path.join(self.path, f"{number:08d}.json")
+    
+    def segment(self, number: int, create: bool = False) -> dict | None:
+        """
+        Returns the tasks of segment `number`, reading the segment file on first use.
+
+        Args:
+            number (int): The segment number, the ID divided by `size`.
+            create (bool, optional): Start an empty segment if there is none. Defaults to False.
+
+        Returns:
+            dict | None: The tasks of the segment by ID, None if it does not exist and `create` is False.
+
+        Raises:
+            Database_error: If the segment file can not be decoded.
+        """
+        tasks = self.segments.get(number)
+        if tasks is not None:
+            return tasks
+        position = bisect.bisect_left(self.numbers, number)
+        if position < len(self.numbers) and self.numbers[position] == number:
+            try:
+                with open(self.file(number), mode="r", encoding="utf-8") as fp:
+                    tasks = json.load(fp)
+            except FileNotFoundError:
+                tasks = {}  # removed by another process since the directory was listed
+            except (json.JSONDecodeError, UnicodeDecodeError) as e:
+                raise Database_error(f"Segment {self.file(number)} can not be decoded", e)
+        elif create:
+            tasks = {}
+            self.numbers.insert(position, number)
+        else:
+            return None
+        self.segments[number] = tasks
+        return tasks
+    
+    def __getitem__(self, key) -> dict:
+        tasks = self.segment(int(key) // self.size)
+        if tasks is None or str(key) not in tasks:
+            raise KeyError(key)
+        return tasks[str(key)]
+    
+    def __setitem__(self, key, task: dict) -> None:
+        insert_in_order(self.segment(int(key) // self.size, create=True), str(key), task)
+    
+    def __delitem__(self, key) -> None:
+        tasks = self.segment(int(key) // self.size)
+        if tasks is None:
+            raise KeyError(key)
+        del tasks[str(key)]
+    
+    def __contains__(self, key) -> bool:
+        try:
+            tasks = self.segment(int(key) // self.size)
+        except ValueError:
+            return False
+        return tasks is not None and str(key) in tasks
+    
+    def __iter__(self):
+        for number in list(self.numbers):
+            yield from self.segment(number)
+    
+    def __reversed__(self):
+        for number in reversed(self.numbers):
+            yield from reversed(self.segment(number))
+    
+    def __len__(self) -> int:
+        return sum(len(self.segment(number)) for number in self.numbers)
+    
+    def items(self, after: int | None = None):
+        """
+        Streams `(key, task)` pairs in ID order, starting at the segment holding the cursor `after`
+        instead of reading the segments before it.
+        """
+        start = 0 if after is None else bisect.bisect_left(self.numbers, (after + 1) // self.size)
+        for number in self.numbers[start:]:
+            for key, task in self.segment(number).items():
+                if after is None or int(key) > after:
+                    yield key, task
+
+
+class SegmentedDatabase(Database):
+    """
+    Database storage backend sharding the tasks by ID range into small JSON segment files in a
+    directory (`Database.segments/`), see `SegmentedTasks`. Loading only lists the directory and
+    a mutation rewrites the one segment holding the changed task, so a `mark-done` writes a few
+    hundred kilobytes at most instead of the whole database.
+    
+    The segments are plain dicts, `TASKCLI_COMPACT` does not apply to them.
+    """
+    extension = '.segments'
+    
+    def __init__(self, database_path: str | None = None, segment_size: int | None = None) -> None:
+        """
+        Initializes the SegmentedDatabase object.
+
+        Args:
+            database_path (str, optional): Path of the segment directory. Defaults to `Database.segments` next to `database_location()`.
+            segment_size (int, optional): IDs per segment, `TASKCLI_SEGMENT_SIZE` or 1024 by default.
+                                          Only used when the directory is created, existing directories keep theirs.
+        """
+        super().__init__(database_path or os.path.splitext(database_location())[0] + '.segments')
+        self.segment_size = segment_size or int(os.environ.get('TASKCLI_SEGMENT_SIZE', 1024))
+    
+    def _load(self) -> SegmentedTasks:
+        """
+        Lists the segment directory, creating it if needed. Segments are read when they are used.
+
+        Returns:
+            SegmentedTasks: Dict-like view over the segments.
+        """
+        size_path = os.path.join(self.database_path, 'segment-size')
+        try:
+            with open(size_path, mode="r", encoding="utf-8") as fp:
+                self.segment_size = int(fp.read())
+        except FileNotFoundError:
+            os.makedirs(self.database_path, exist_ok=True)
+            with open(size_path, mode="w", encoding="utf-8") as fp:
+                fp.write(str(self.segment_size))
+        except ValueError as e:
+            raise Database_error(f"{size_path} does not hold a segment size", e)
+        return SegmentedTasks(self.database_path, self.segment_size)
+    
+    def _persist(self, keys: set) -> None:
+        """
+        Rewrites the segments holding the tasks stored under `keys`, and only those.
+
+        Args:
+            keys (set): IDs of the tasks that were added, changed or deleted.
+        """
+        for number in sorted({int(key) // self.segment_size for key in keys}):
+            self._write_segment(number)
+        self._sync_directory()
+    
+    def _write_segment(self, number: int) -> None:
+        """
+        Atomically replaces the file of segment `number` with its tasks in ID order,
+        or removes it when the segment became empty.
+
+        Raises:
+            Database_error: Raised if the segment can not be written.
+        """
+        tasks = self.data.segment(number) or {}
+        path = self.data.file(number)
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            if not tasks:
+                self.data.numbers.remove(number)
+                self.data.segments.pop(number, None)
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(path)
+                return
+            ordered = dict(sorted(tasks.items(), key=lambda item: int(item[0])))
+            with open(temporary_path, mode="wb") as fp:
+                self.bytes_written += fp.write(json.dumps(ordered, ensure_ascii=False).encode('utf-8'))
+                self._sync(fp, path)
+            os.replace(temporary_path, path)
+        except (FileNotFoundError, PermissionError) as e:
+            raise Database_error("Error updating database segment", e)
+    
+    def _sync_directory(self) -> None:
+        # segments are renamed inside the segment directory, not next to it
+        if os.name == 'nt' or (self.fsync_window > 0 and self._unsynced):
+            return
+        fd = os.open(self.database_path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    
+    def _update(self, data: SegmentedTasks) -> None:
+        """Rewrites every segment of `data`, the full write `compact` and `migrate` do."""
+        for number in list(data.numbers):
+            self._write_segment(number)
+        self._sync_directory()
+    
+    def _select(self, filter: str, after: int | None = None, sort: str | None = None):
+        if filter.lower() == "all" and sort is None:
+            return self.data.items(after)
+        return super()._select(filter, after, sort)
+
+
+# storage backends selectable with the `TASKCLI_STORAGE` environment variable
+STORAGE_BACKENDS = {
+    'json': Database,
+    'wal': WalDatabase,
+    'sqlite': SqliteDatabase,
+    'binary': BinaryDatabase,
+    'segments': SegmentedDatabase,
+}
+
+
+def open_database(database_path: str | None = None) -> Database:
+    """
+    Opens the database with the storage backend named by the `TASKCLI_STORAGE` environment variable,
+    or the `ShardedDatabase` under `TASKCLI_SHARDS` when that is set and no path is given.
+
+    Args:
+        database_path (str, optional): Path of the JSON database, the files of the other backends are
+                                       named after it (`Database.sqlite3` for `Database.json`).
+                                       Defaults to `database_location()`.
+
+    Returns:
+        Database: An instance of the selected storage backend.
+
+    Raises:
+        Database_error: Raised if `TASKCLI_STORAGE` names an unknown backend.
+    """
+    if database_path is None and os.environ.get('TASKCLI_SHARDS'):
+        return ShardedDatabase(os.environ['TASKCLI_SHARDS'])
+    name = os.environ.get('TASKCLI_STORAGE', 'json').lower()
+    if name not in STORAGE_BACKENDS:
+        raise Database_error(f"Unknown storage backend '{name}', expected one of {tuple(STORAGE_BACKENDS)}")
+    backend = STORAGE_BACKENDS[name]
+    if database_path is not None and backend.extension is not None:
+        database_path = os.path.splitext(database_path)[0] + backend.extension
+    return backend(database_path)
+
+
+def migrate(target: str, source: str = 'json') -> str:
+    """
+    Copies every task from the storage of one backend into the storage of another,
+    by default from `Database.json`. `migrate json --source binary` exports a binary snapshot back to JSON.
+
+    Args:
+        target (str): Name of the backend to migrate to.
+        source (str, optional): Name of the backend to migrate from. Defaults to 'json'.
+
+    Returns:
+        str: A message with the number of migrated tasks.
+
+    Raises:
+        Database_error: If `source` is unknown or the same as `target`.
+    """
+    if source not in STORAGE_BACKENDS:
+        raise Database_error(f"Unknown storage backend '{source}', expected one of {tuple(STORAGE_BACKENDS)}")
+    if source == target:
+        raise Database_error(f"Can not migrate '{source}' into itself")
+    count = STORAGE_BACKENDS[target]().migrate(STORAGE_BACKENDS[source]().data)
+    return Color.color(f"Migrated {count} tasks to ","yellow")+Color.color(target,"cyan")
+
+
+class IdBlocks:
+    """
+    The global ID allocator of a `ShardedDatabase`. IDs are handed to the projects in blocks of
+    `size` consecutive IDs, and `<root>/blocks` holds the owner of every block handed out, one
+    project name per line: line n owns the IDs from n * size to (n + 1) * size - 1. The file is
+    only ever appended to, under an exclusive lock, so an ID is never given to two projects, and
+    the project holding a task is found from its ID without opening any shard.
+    """
+    def __init__(self, root: str, size: int | None = None) -> None:
+        """
+        Args:
+            root (str): The root directory of the sharded database.
+            size (int, optional): IDs per block, `TASKCLI_SHARD_BLOCK` or 1024 by default.
+                                  Only used when the first block is handed out, later ones keep its size.
+        """
+        self.path = os.path.join(root, 'blocks')
+        self.size_path = os.path.join(root, 'block-size')
+        try:
+            with open(self.size_path, mode="r", encoding="utf-8") as fp:
+                self.size = int(fp.read())
+        except FileNotFoundError:
+            self.size = size or int(os.environ.get('TASKCLI_SHARD_BLOCK', 1024))
+        except ValueError as e:
+            raise Database_error(f"{self.size_path} does not hold a block size", e)
+        self._owners = []
+        self._read = 0
+    
+    def owners(self) -> list:
+        """The project of every block handed out so far, reading only the lines appended since the last call."""
+        try:
+            with open(self.path, mode="rb") as fp:
+                fp.seek(self._read)
+                appended = fp.read()
+        except FileNotFoundError:
+            return self._owners
+        end = appended.rfind(b'\n') + 1  # a line still being written is read next time
+        self._owners.extend(appended[:end].decode('utf-8').splitlines())
+        self._read += end
+        return self._owners
+    
+    def project_of(self, id_: int) -> str | None:
+        """The project owning the block of an ID, None if the block was not handed out."""
+        block = int(id_) // self.size
+        owners = self._owners if block < len(self._owners) else self.owners()
+        return owners[block] if 0 <= block < len(owners) else None
+    
+    def claim(self, project: str) -> range:
+        """
+        Hands the next block out to `project`.
+
+        Returns:
+            range: The IDs of the block.
+
+        Raises:
+            Database_error: If the block file can not be written.
+        """
+        try:
+            with open(self.path, mode="ab") as fp:
+                if fcntl is not None:
+                    fcntl.flock(fp.fileno(), fcntl.LOCK_EX)
+                try:
+                    with open(self.size_path, mode="r", encoding="utf-8") as size_fp:
+                        self.size = int(size_fp.read())  # written by the first process to claim a block
+                except FileNotFoundError:
+                    with open(self.size_path, mode="w", encoding="utf-8") as size_fp:
+                        size_fp.write(str(self.size))
+                block = len(self.owners())
+                fp.write(project.encode('utf-8') + b'\n')
+                fp.flush()
+                os.fsync(fp.fileno())  # unlocked when the file is closed
+        except (OSError, ValueError) as e:
+            raise Database_error(f"Can not write the ID blocks '{self.path}'", e)
+        return range(block * self.size, (block + 1) * self.size)
+
+
+class ShardedDatabase(Database):
+    """
+    A database split into one shard per project under a root directory (`TASKCLI_SHARDS`), each
+    shard a database of the `TASKCLI_STORAGE` backend in `<root>/<project>/`. IDs are unique over
+    every project, handed out in blocks by `IdBlocks`, which also tells which shard holds an ID:
+    adding a task, or changing, deleting or looking up one by ID, only opens one shard.
+    
+    `project`, set by `--project` or `TASKCLI_PROJECT`, names the project tasks are added to and
+    limits every other command to it. Without a project, `list`, `search`, `stats`, `export` and
+    the deadline commands read every shard on a thread pool and merge their results in order.
+    
+    The commands of `Database` work unchanged on top of it, this class routes the core operations
+    they are built on (`_add`, `_update_task`, `_query`, ...) to the shards.
+    """
+    name = re.compile(r'[A-Za-z0-9_][A-Za-z0-9_-]*')
+    
+    def __init__(self, root: str, project: str | None = None, threads: int | None = None) -> None:
+        """
+        Args:
+            root (str): The root directory, created with the first shard.
+            project (str, optional): The selected project. Defaults to `TASKCLI_PROJECT`, or every project.
+            threads (int, optional): Threads reading shards in parallel, `TASKCLI_SHARD_THREADS` by default,
+                                     or the default of `ThreadPoolExecutor`.
+        """
+        # read by the `deferred` and `load_seconds` properties, which `Database.__init__` sets
+        self._shards = {}
+        self._deferred = False
+        self._load_seconds = 0.0
+        self._pool = None
+        super().__init__(root)
+        self.root = root
+        self.blocks = IdBlocks(root)
+        self.project = project or os.environ.get('TASKCLI_PROJECT') or None
+        self.threads = threads or int(os.environ.get('TASKCLI_SHARD_THREADS', 0)) or None
+        self.journal = None  # every shard keeps its own history
+    
+    @property
+    def project(self) -> str | None:
+        return self._project
+    
+    @project.setter
+    def project(self, project: str | None) -> None:
+        if project is not None and (not self.name.fullmatch(project) or project in ('blocks', 'block-size')):
+            raise Database_error(f"Invalid project name '{project}', use letters, digits, '_' and '-'")
+        self._project = project
+    
+    @property
+    def deferred(self) -> bool:
+        return self._deferred
+    
+    @deferred.setter
+    def deferred(self, deferred: bool) -> None:
+        self._deferred = deferred
+        for shard in self._shards.values():
+            shard.deferred = deferred
+    
+    @property
+    def data(self):
+        raise Database_error("A sharded database has no single task table, select a project with --project")
+    
+    @property
+    def load_seconds(self) -> float:
+        return self._load_seconds + sum(shard.load_seconds for shard in self._shards.values())
+    
+    @load_seconds.setter
+    def load_seconds(self, seconds: float) -> None:
+        self._load_seconds = seconds
+    
+    def projects(self) -> list:
+        """The names of every project that has a shard, sorted."""
+        try:
+            names = os.listdir(self.root)
+        except FileNotFoundError:
+            return []
+        return sorted(name for name in names if self.name.fullmatch(name) and os.path.isdir(os.path.join(self.root, name)))
+    
+    def shard(self, project: str, create: bool = False) -> Database:
+        """
+        Returns the database of one project, opened the first time it is used.
+
+        Raises:
+            Database_error: If the project has no shard and `create` is False.
+        """
+        shard = self._shards.get(project)
+        if shard is None:
+            directory = os.path.join(self.root, project)
+            if create:
+                os.makedirs(directory, exist_ok=True)
+            elif not os.path.isdir(directory):
+                raise Database_error(f"Project '{project}' does not exist.")
+            shard = open_database(os.path.join(directory, 'Database.json'))
+            shard.blocks, shard.project, shard.deferred = self.blocks, project, self._deferred
+            self._shards[project] = shard
+        return shard
+    
+    def _target(self) -> Database:
+        """The shard new tasks go to, the one of the selected project."""
+        if self.project is None:
+            raise Database_error("Select the project to add tasks to with --project <name> or TASKCLI_PROJECT")
+        return self.shard(self.project, create=True)
+    
+    def _owner(self, id_: int) -> Database:
+        """The shard holding a task, found from its ID by `IdBlocks`."""
+        project = self.blocks.project_of(id_) if int(id_) >= 0 else None
+        if project is None or self.project not in (None, project) or not os.path.isdir(os.path.join(self.root, project)):
+            raise Database_error(f"Task with ID {id_} does not exist.")
+        return self.shard(project)
+    
+    def _fan_out(self, function) -> list:
+        """Calls `function` with every shard of the selection, on the thread pool when there are several."""
+        shards = [self.shard(self.project)] if self.project is not None else [self.shard(name) for name in self.projects()]
+        if len(shards) < 2:
+            return [function(shard) for shard in shards]
+        if self._pool is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self._pool = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='shard')
+        return list(self._pool.map(function, shards))
+    
+    @contextlib.contextmanager
+    def locked(self):
+        """
+        Locks the shard of the selected project if it exists, without creating it: commands routed
+        by ID lock the shard that owns the ID themselves, and only `adding` creates a shard.
+        """
+        if self.project is None or (self.project not in self._shards and not os.path.isdir(os.path.join(self.root, self.project))):
+            yield
+        else:
+            with self.shard(self.project).locked():
+                yield
+    
+    def adding(self):
+        return self._target().locked()
+    
+    def _allocate_ids(self, count: int) -> range:
+        return self._target()._allocate_ids(count)
+    
+    def _return_ids(self, ids: range) -> None:
+        self._target()._return_ids(ids)
+    
+    def _insert(self, key: str, task: dict) -> None:
+        self._target()._insert(key, task)
+    
+    def _add(self, description: str, due: float | None = None, priority: int | None = None) -> tuple[int, dict]:
+        return self._target()._add(description, due, priority)
+    
+    def _get(self, id_: int) -> dict:
+        return self._owner(id_)._get(id_)
+    
+    def _delete(self, id_: int) -> dict:
+        return self._owner(id_)._delete(id_)
+    
+    def _update_task(self, id_: int, description: str | None, status: str | None,
+                     due: float | None = None, priority: int | None = None) -> tuple[dict, dict]:
+        shard = self._owner(id_)
+        with shard.locked():
+            return shard._update_task(id_, description, status, due, priority)
+    
+    def _history(self, id_: int) -> list:
+        return self._owner(id_)._history(id_)
+    
+    def _undo(self, count: int) -> list:
+        if self.project is None:
+            raise Database_error("Select the project to undo changes of with --project <name> or TASKCLI_PROJECT")
+        return self.shard(self.project)._undo(count)
+    
+    def _query(self, filter: str = "all", limit: int | None = None, offset: int = 0, after: int | None = None,
+               sort: str | None = None, as_of: float | None = None):
+        """
+        Selects a page of tasks from every shard of the selection and merges them in order, lazily:
+        the shards load their tasks on the thread pool, then `heapq.merge` takes tasks from the
+        sorted selection of every shard until the page is full.
+        """
+        self._check_order(after, sort)
+        self._check_page(limit, offset)
+        first = None if limit is None else offset + limit
+        selections = self._fan_out(lambda shard: shard._query(filter, first, 0, after, sort, as_of))
+        if sort is None:
+            tasks = heapq.merge(*selections, key=lambda item: int(item[0]))
+        else:
+            field = sort + 'At'
+            tasks = heapq.merge(*selections, key=lambda item: (item[1][field], int(item[0])), reverse=True)
+        return itertools.islice(tasks, offset, first)
+    
+    def _select(self, filter: str, after: int | None = None, sort: str | None = None):
+        return self._query(filter, after=after, sort=sort)
+    
+    def _search_tasks(self, query: str, filter: str = "all", limit: int | None = None):
+        """Searches the index of every shard of the selection and merges the matches in rank order."""
+        self._check_page(limit)
+        status = None if filter.lower() == "all" else filter
+        def search(shard):
+            return [(rank, (str(rank[2]), shard.data[str(rank[2])])) for rank in shard.search_index.ranked(query, status, limit)]
+        matches = heapq.merge(*self._fan_out(search), key=lambda match: match[0])
+        return (task for _, task in itertools.islice(matches, limit))
+    
+    def _select_scheduled(self, since: float | None, before: float | None, limit: int | None) -> list:
+        """Selects the tasks due in a time range from every shard of the selection and merges them soonest first."""
+        selections = self._fan_out(lambda shard: shard._scheduled(since, before, limit))
+        tasks = heapq.merge(*selections, key=lambda item: Schedule.entry(*item))
+        return list(itertools.islice(tasks, limit))
+    
+    def _stats(self, by: str = 'day', since: float | None = None) -> dict:
+        """Adds up the `TaskStats` reports of every shard of the selection."""
+        if by not in ('day', 'week'):
+            raise Database_error(f"Can not group by '{by}', expected 'day' or 'week'")
+        merged = {'tasks': 0, 'statuses': {}, 'by': by, 'created': {}, 'completed': {}}
+        done_seconds = 0.0
+        for report in self._fan_out(lambda shard: shard._stats(by, since)):
+            merged['tasks'] += report['tasks']
+            for name in ('statuses', 'created', 'completed'):
+                for key, count in report[name].items():
+                    merged[name][key] = merged[name].get(key, 0) + count
+            if report['average_seconds_to_done'] is not None:
+                done_seconds += report['average_seconds_to_done'] * report['statuses']['done']
+        for name in ('statuses', 'created', 'completed'):
+            merged[name] = dict(sorted(merged[name].items()))
+        done = merged['statuses'].get('done', 0)
+        merged['average_seconds_to_done'] = done_seconds / done if done else None
+        return merged
+    
+    def flush(self) -> None:
+        for shard in self._shards.values():
+            shard.flush()
+    
+    def sync(self) -> None:
+        for shard in self._shards.values():
+            shard.sync()
+    
+    def close(self) -> None:
+        for shard in self._shards.values():
+            shard.close()
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+
+class Task(NamedTuple):
+    """
+    One task as returned by `TaskStore`: a snapshot, later changes of the task do not show in it.
+    
+    Attributes:
+        id (int): The ID of the task.
+        description (str): What the task is about.
+        status (str): One of `TASK_STATUSES`.
+        created_at (float): Unix time the task was added.
+        updated_at (float): Unix time the task was last changed.
+        due (float | None): Unix time the task is due, None if it has no due time.
+        priority (int): Importance among tasks due at the same time, higher first, 0 if it has none.
+        completed_at (float | None): Unix time the task was marked done, None if it is not done.
+    """
+    id: int
+    description: str
+    status: str
+    created_at: float
+    updated_at: float
+    due: float | None = None
+    priority: int = 0
+    completed_at: float | None = None
+    
+    @classmethod
+    def from_item(cls, key, task) -> 'Task':
+        """Builds the `Task` of a `(key, task)` pair of `Database.data`."""
+        return cls(int(key), task['description'], task['status'], task['createdAt'], task['updatedAt'],
+                   task.get('due'), task.get('priority', 0), task.get('completedAt'))
+
+
+class Change(NamedTuple):
+    """
+    One recorded change of a task, an entry of the `Journal` as returned by `TaskStore`.
+    
+    Attributes:
+        seq (int): Number of the change, counting every change of the database.
+        at (float): Unix time the change was written.
+        id (int): The ID of the changed task.
+        op (str): 'add', 'update' or 'delete'.
+        old (dict | None): The changed fields before the change, the whole task for a delete, None for an add.
+        new (dict | None): The changed fields after the change, the whole task for an add, None for a delete.
+        undoes (int | None): The `seq` of the change this one reverted, if it was made by an undo.
+    """
+    seq: int
+    at: float
+    id: int
+    op: str
+    old: dict | None
+    new: dict | None
+    undoes: int | None = None
+    
+    @classmethod
+    def from_entry(cls, entry: dict) -> 'Change':
+        return cls(entry['seq'], entry['at'], int(entry['id']), entry['op'], entry['old'], entry['new'], entry.get('undoes'))
+
+
+class TaskStore:
+    """
+    The tasks as a Python API, for programs managing them in-process instead of running the CLI.
+    Methods take and return plain values and `Task`/`Change` tuples instead of the colored text of
+    the `Database` commands, and errors are raised as `Database_error`. Every mutation is written
+    right away, or at the end of a `batch` block.
+    
+    A store is not thread safe. Share one between threads or coroutines through `AsyncTaskStore`.
+
+    Example:
+        with TaskStore('/srv/tasks/Database.json') as store:
+            task = store.add("Write the report")
+            store.mark(task.id, 'done')
+            todo = store.list('todo', limit=20)
+    """
+    def __init__(self, database: Database | str | None = None) -> None:
+        """
+        Args:
+            database (Database | str, optional): An open database, or the path of one to open with the
+                                                 backend named by `TASKCLI_STORAGE`. Defaults to `database_location()`.
+        """
+        self.database = database if isinstance(database, Database) else open_database(database)
+    
+    def __enter__(self) -> 'TaskStore':
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+    
+    @staticmethod
+    def _check_status(status: str) -> None:
+        if status not in TASK_STATUSES:
+            raise Database_error(f"Status '{status}' should be one of {TASK_STATUSES}")
+    
+    @staticmethod
+    def _check_schedule(due: float | None, priority: int | None) -> None:
+        if due is not None and (isinstance(due, bool) or not isinstance(due, (int, float)) or due != due):
+            raise Database_error(f"Due time {due!r} should be a unix time, or 0 for none")
+        if priority is not None and (isinstance(priority, bool) or not isinstance(priority, int) or not 0 <= priority <= PRIORITY_MAX):
+            raise Database_error(f"Priority {priority!r} should be a whole number from 0 (none) to {PRIORITY_MAX}")
+    
+    def add(self, description: str, due: float | None = None, priority: int | None = None) -> Task:
+        """Adds a 'todo' task, optionally with a due time (unix time) and a priority, and returns it."""
+        self._check_schedule(due, priority)
+        return Task.from_item(*self.database._add(description, due, priority))
+    
+    def get(self, id_: int) -> Task:
+        """
+        Returns one task.
+
+        Raises:
+            Database_error: If there is no task with this ID.
+        """
+        return Task.from_item(id_, self.database._get(id_))
+    
+    def update(self, id_: int, description: str | None = None, status: str | None = None,
+               due: float | None = None, priority: int | None = None) -> Task:
+        """
+        Changes the description, the status, the due time and/or the priority of a task and returns
+        the task after the change. A `due` or `priority` of 0 clears it.
+        """
+        if status is not None:
+            self._check_status(status)
+        self._check_schedule(due, priority)
+        with self.database.locked():
+            task, _ = self.database._update_task(id_, description, status, due, priority)
+            return Task.from_item(id_, task)
+    
+    def mark(self, id_: int, status: str) -> Task:
+        """Sets the status of a task, one of `TASK_STATUSES`, and returns the task after the change."""
+        return self.update(id_, status=status)
+    
+    def delete(self, id_: int) -> Task:
+        """Deletes a task and returns it as it was."""
+        return Task.from_item(id_, self.database._delete(id_))
+    
+    def search(self, query: str, status: str = 'all', limit: int | None = None) -> list:
+        """Returns the `Task`s matching a query of `Database.Search`, best matches first."""
+        with self.database.locked():
+            return [Task.from_item(key, task) for key, task in self.database._search_tasks(query, status, limit)]
+    
+    def undo(self, count: int = 1) -> list:
+        """Reverts the last `count` changes not undone yet and returns the reverted `Change`s, newest first."""
+        return [Change.from_entry(entry) for entry, _ in self.database._undo(count)]
+    
+    def history(self, id_: int) -> list:
+        """Returns every recorded `Change` of a task, oldest first."""
+        return [Change.from_entry(entry) for entry in self.database._history(id_)]
+    
+    def stats(self, by: str = 'day', since: float | None = None) -> dict:
+        """Returns the aggregates of `Database.Stats`: counts per status and per day or week, and the average time to done."""
+        return self.database._stats(by, since)
+    
+    def next(self, count: int = 10) -> list:
+        """Returns the `count` open `Task`s that are due soonest, overdue tasks first."""
+        return [Task.from_item(key, task) for key, task in self.database._scheduled(limit=count)]
+    
+    def overdue(self, limit: int | None = None) -> list:
+        """Returns the open `Task`s whose due time has passed, the longest overdue first."""
+        return [Task.from_item(key, task) for key, task in self.database._scheduled(before=time.time(), limit=limit)]
+    
+    def due(self, before: float | None = None, limit: int | None = None) -> list:
+        """Returns the open `Task`s due before a unix time, or every open task with a due time, soonest first."""
+        return [Task.from_item(key, task) for key, task in self.database._scheduled(before=before, limit=limit)]
+    
+    def watch(self, recheck: float = 60.0):
+        """
+        Yields every open `Task` once its due time passed, the overdue ones first, sleeping until the
+        next due time in between, see `Database.Watch`. It never ends, stop iterating when done.
+        """
+        return itertools.starmap(Task.from_item, self.database._watch(recheck))
+    
+    def list(self, status: str = 'all', limit: int | None = None, offset: int = 0, after: int | None = None,
+             sort: str | None = None, as_of: float | None = None):
+        """
+        Lists tasks with the filters and paging of `Database.List`.
+
+        Args:
+            status (str, optional): Only list tasks with this status. Defaults to 'all'.
+            limit (int, optional): Maximum number of tasks. Defaults to no limit.
+            offset (int, optional): Number of matching tasks to skip. Defaults to 0.
+            after (int, optional): Only list tasks with an ID greater than this cursor. Defaults to None.
+            sort (str, optional): 'updated' or 'created' for the most recent tasks first. Defaults to ID order.
+            as_of (float, optional): List the tasks as they were at this unix time. Defaults to now.
+
+        Returns:
+            list[Task]: The tasks, read while the database is locked.
+        """
+        with self.database.locked():
+            return list(itertools.starmap(Task.from_item, self.database._query(status, limit, offset, after, sort, as_of)))
+    
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Collects the mutations made inside the block and writes them with one flush when it ends,
+        instead of one write per mutation. Nested blocks are written by the outermost one.
+        """
+        database = self.database
+        if database.deferred:
+            yield
+            return
+        database.deferred = True
+        try:
+            yield
+        finally:
+            database.deferred = False
+            database.flush()
+    
+    def flush(self) -> None:
+        """Writes the mutations of an unfinished `batch`."""
+        self.database.flush()
+    
+    def close(self) -> None:
+        """Writes pending mutations and makes every write durable."""
+        self.database.close()
+
+
+class AsyncTaskStore:
+    """
+    A `TaskStore` for asyncio programs. Every call runs on a thread of `executor`, so loading and
+    writing the database never block the event loop, and only one call uses the store at a time.
+    
+    Mutations are queued instead of written one by one. A single writer applies everything that was
+    queued while the previous batch was being written, and writes it with one flush: a thousand
+    concurrent `add` calls cost a handful of writes instead of a thousand. Each call returns once
+    the batch holding its mutation was written, and a mutation that fails, like a delete of an
+    unknown ID, raises its error in its own caller without affecting the rest of the batch. After an
+    unexpected error the mutations queued behind the failed one go into the next batch, and those
+    before it are still written and returned.
+
+    Example:
+        async with AsyncTaskStore('/srv/tasks/Database.json') as store:
+            tasks = await asyncio.gather(*(store.add(f"task {n}") for n in range(1000)))
+    """
+    def __init__(self, store: TaskStore | Database | str | None = None, executor=None, max_batch: int = 4096) -> None:
+        """
+        Args:
+            store (TaskStore | Database | str, optional): The store, or the database or path to open one on.
+                                                          Defaults to `database_location()`.
+            executor (concurrent.futures.Executor, optional): Where the store is used. Defaults to a
+                                                              thread pool of one thread, shut down by `aclose`.
+            max_batch (int, optional): Most mutations written by one flush. Defaults to 4096.
+        """
+        import threading  # like asyncio, only imported by programs using the async API
+        self.store = store if isinstance(store, TaskStore) else TaskStore(store)
+        self.max_batch = max_batch
+        self._owns_executor = executor is None
+        if executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='task-store')
+        self.executor = executor
+        self._lock = threading.Lock()  # the store is not thread safe, executors may have several threads
+        self._queue = []
+        self._writer = None
+    
+    async def __aenter__(self) -> 'AsyncTaskStore':
+        return self
+    
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+    
+    def _locked(self, function, *args, **kwargs):
+        with self._lock:
+            return function(*args, **kwargs)
+    
+    async def _read(self, function, *args, **kwargs):
+        """Runs `function` on the executor and returns its result."""
+        import asyncio
+        call = functools.partial(self._locked, function, *args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(self.executor, call)
+    
+    def _write(self, function, *args, **kwargs):
+        """Queues a mutation and returns the future of its result, starting the writer if it is idle."""
+        import asyncio
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.append((functools.partial(function, *args, **kwargs), future))
+        if self._writer is None or self._writer.done():
+            self._writer = loop.create_task(self._drain())
+        return future
+    
+    async def _drain(self) -> None:
+        """Writes the queued mutations batch by batch until the queue is empty."""
+        import asyncio
+        loop = asyncio.get_running_loop()
+        await asyncio.sleep(0)  # callers scheduled in the same iteration of the loop join the first batch
+        while self._queue:
+            batch, self._queue = self._queue[:self.max_batch], self._queue[self.max_batch:]
+            try:
+                results = await loop.run_in_executor(self.executor, self._locked, self._apply, batch)
+            except Exception as e:  # the flush failed, none of the batch is known to be written
+                results = [(False, e)] * len(batch)
+            # `_apply` stopped at an unexpected error, the mutations after it were not applied
+            self._queue[:0] = batch[len(results):]
+            for (_, future), (ok, value) in zip(batch, results):
+                if not future.done():  # the caller may have been cancelled
+                    if ok:
+                        future.set_result(value)
+                    else:
+                        future.set_exception(value)
+    
+    def _apply(self, batch: list) -> list:
+        """
+        Applies a batch of mutations with one flush, returning `(ok, result or error)` for each.
+        An error other than `Database_error` or `ValueError` ends the batch: the mutations applied
+        before it are flushed and it is returned as the last result, the rest is left unapplied.
+        """
+        results = []
+        with self.store.batch():
+            for function, _ in batch:
+                try:
+                    results.append((True, function()))
+                except (Database_error, ValueError) as e:
+                    results.append((False, e))
+                except Exception as e:
+                    results.append((False, e))
+                    break
+        return results
+    
+    async def add(self, description: str, due: float | None = None, priority: int | None = None) -> Task:
+        return await self._write(self.store.add, description, due, priority)
+    
+    async def update(self, id_: int, description: str | None = None, status: str | None = None,
+                     due: float | None = None, priority: int | None = None) -> Task:
+        return await self._write(self.store.update, id_, description, status, due, priority)
+    
+    async def mark(self, id_: int, status: str) -> Task:
+        return await self._write(self.store.mark, id_, status)
+    
+    async def delete(self, id_: int) -> Task:
+        return await self._write(self.store.delete, id_)
+    
+    async def undo(self, count: int = 1) -> list:
+        return await self._write(self.store.undo, count)
+    
+    async def get(self, id_: int) -> Task:
+        return await self._read(self.store.get, id_)
+    
+    async def search(self, query: str, status: str = 'all', limit: int | None = None) -> list:
+        return await self._read(self.store.search, query, status, limit)
+    
+    async def history(self, id_: int) -> list:
+        return await self._read(self.store.history, id_)
+    
+    async def stats(self, by: str = 'day', since: float | None = None) -> dict:
+        return await self._read(self.store.stats, by, since)
+    
+    async def next(self, count: int = 10) -> list:
+        return await self._read(self.store.next, count)
+    
+    async def overdue(self, limit: int | None = None) -> list:
+        return await self._read(self.store.overdue, limit)
+    
+    async def due(self, before: float | None = None, limit: int | None = None) -> list:
+        return await self._read(self.store.due, before, limit)
+    
+    async def list(self, status: str = 'all', limit: int | None = None, offset: int = 0, after: int | None = None,
+                   sort: str | None = None, as_of: float | None = None) -> list:
+        """Returns the tasks of `TaskStore.list`, read on the executor."""
+        return await self._read(self.store.list, status, limit, offset, after, sort, as_of)
+    
+    async def flush(self) -> None:
+        """Waits until every queued mutation is written."""
+        while self._writer is not None and not self._writer.done():
+            await self._writer
+    
+    async def aclose(self) -> None:
+        """Writes the queued mutations, closes the store and shuts down the executor if it was created here."""
+        await self.flush()
+        await self._read(self.store.close)
+        if self._owns_executor:
+            self.executor.shutdown()
+
+
+class token:
+    """
+    A class to represent a customizable token with arguments, fallback options, and an associated method.
+    Designed to generate a key dictionary from provided data based on argument keys.
+
+    Attributes:
+        argument (dict): A dictionary representing argument names and values.
+        fallback (dict | None): Optional fallback dictionary to handle default or backup values.
+        optiones (dict | None): Optional dictionary of additional options.
+        method (callable): A function or method to be associated with the token.
+        help_text (str): A help text description providing details about the token's purpose.
+        flags (dict | None): Optional `--name value` arguments mapped to their types.
+    """
+    def __init__(self, argument:dict, fallback:dict|None, optiones:dict|None, method, help_text, flags:dict|None = None) -> None:
+        """
+        Initializes the token with arguments, fallback, options, a method, and help text.
+
+        Parameters:
+            argument (dict): Required arguments for the token.
+            fallback (dict | None): Fallback values for optional settings.
+            optiones (dict | None): Additional options for customizing token behavior.
+            method (callable): A method associated with the token.
+            help_text (str): Help text explaining the token's usage.
+            flags (dict | None, optional): `--name value` arguments and their types, passed to `method`
+                                           as keyword arguments only when given. Defaults to None.
+        """
+        self.argument = argument
+        self.fallback = fallback
+        self.optiones = optiones
+        self.method = method
+        self.help_text = help_text
+        self.flags = flags
     
     def generate_key(self, data_list: list) -> dict:
         """
@@ -474,6 +4268,51 @@ class token:
         return {name: data for name, data in zip(self.argument.keys(), data_list)}
 
 
+# fallback of an argument that has none
+_MISSING = object()
+
+
+class CommandSpec(NamedTuple):
+    """
+    A `token` compiled once for `Parser.check_syntax`: argument names with their casters, fallbacks
+    (already cast) and option sets by position, so validating a command does no dict rebuilding.
+    
+    Attributes:
+        names (tuple): Argument names in positional order.
+        casters (tuple): The type every argument is cast to.
+        fallbacks (tuple): The cast fallback of every argument (a None fallback stays None), `_MISSING` if it is required.
+        options (tuple): The frozenset of allowed values of every argument, None if any value is allowed.
+        choices (tuple): The allowed values of every argument in their declared order, for error messages.
+        arity (int): Number of arguments.
+        required (int): Number of arguments that must be given, those before the last one without a fallback.
+        flags (dict): `--name value` flags mapped to their types.
+        method (callable): The method the cast arguments are passed to.
+    """
+    names: tuple
+    casters: tuple
+    fallbacks: tuple
+    options: tuple
+    choices: tuple
+    arity: int
+    required: int
+    flags: dict
+    method: callable
+    
+    @classmethod
+    def compile(cls, tok: 'token') -> 'CommandSpec':
+        names = tuple(tok.argument)
+        casters = tuple(tok.argument.values())
+        fallbacks = tuple(
+            _MISSING if not tok.fallback or name not in tok.fallback
+            else None if tok.fallback[name] is None else caster(tok.fallback[name])
+            for name, caster in zip(names, casters)
+        )
+        choices = tuple(tok.optiones.get(name) if tok.optiones else None for name in names)
+        options = tuple(None if values is None else frozenset(values) for values in choices)
+        required = max((num + 1 for num, fallback in enumerate(fallbacks) if fallback is _MISSING), default=0)
+        return cls(names, casters, fallbacks, options, choices, len(names), required, tok.flags or {}, tok.method)
+
+
 class Parser:
     """
     A class that parses and validates command-line tokens based on valid keywords.
@@ -491,6 +4330,24 @@ class Parser:
             valid_keywords (dict): Dictionary with keywords as keys and token information as values.
         """
         self.valid_keywords = valid_keywords
+        self._specs = {}
+    
+    def spec(self, keyword: str) -> CommandSpec | None:
+        """
+        Returns the compiled `CommandSpec` of a keyword, compiling its token the first time it is used.
+        Tokens can be added to `valid_keywords` after the parser was created, like `batch` is.
+
+        Parameters:
+            keyword (str): The command name, in any case.
+
+        Returns:
+            CommandSpec | None: The spec, or None if the keyword is not a command.
+        """
+        keyword = keyword.lower()
+        spec = self._specs.get(keyword)
+        if spec is None and keyword in self.valid_keywords:
+            spec = self._specs[keyword] = CommandSpec.compile(self.valid_keywords[keyword])
+        return spec
         
     def check_syntax(self, token: list | tuple) -> callable:
         """
@@ -503,7 +4360,7 @@ class Parser:
                                   and the rest as arguments.
 
         Returns:
-            callable: A lambda function to execute the validated command with arguments.
+            callable: The command's method bound to the cast arguments, to be called without arguments.
 
         Raises:
             SyntaxError: If the command operator is invalid, if there are too many or too few arguments, 
@@ -511,52 +4368,88 @@ class Parser:
         """
         
         #check if token[0] the operator is valid or not
-        if not token[0].lower() in self.valid_keywords.keys():
+        spec = self._specs.get(token[0]) or self.spec(token[0])
+        if spec is None:
             raise SyntaxError(text="Invalid command", data_list=token, index=0)
         
-        #gathering important info
-        args_provided = token[1:]
-        validate = self.valid_keywords[token[0]]
-        expected_args = list(validate.argument.keys())
-        options = validate.optiones if validate.optiones is not None else {}
-        fallbacks = validate.fallback if validate.fallback is not None else {}
-        
-        if len(args_provided) < len(expected_args):
-            for missing_arg in expected_args[len(args_provided):]:
-                if missing_arg in fallbacks:
-                    args_provided.append(fallbacks[missing_arg])
-                else:
-                    raise SyntaxError(text=f"Missing required argument: {expected_args[len(args_provided)]}",data_list=token+['_______'],index=len(args_provided)+1)
-        
-        elif len(args_provided) > len(expected_args):
+        args_provided, positions, flags = self.split_flags(token, spec.flags)
+        if len(args_provided) > spec.arity:
             raise SyntaxError(text="Too many arguments provided", data_list=token, index=len(token) - 1)
+        if len(args_provided) < spec.required:
+            missing = next(name for name, fallback in zip(spec.names[len(args_provided):], spec.fallbacks[len(args_provided):]) if fallback is _MISSING)
+            raise SyntaxError(text=f"Missing required argument: {missing}", data_list=token+['_______'], index=len(token))
         
-        
-        for num, (arg, (arg_name, expected_type)) in enumerate(zip(args_provided, validate.argument.items())):
-            
-            #check if provided have sam eoption or not
+        for num, (arg, caster, options) in enumerate(zip(args_provided, spec.casters, spec.options)):
             try:
-                arg_cast = expected_type(arg)
+                arg_cast = caster(arg)
             except ValueError:
-                raise SyntaxError(text=f"Argument '{arg}' should be of type {expected_type.__name__}", data_list=token, index=num + 1)
+                raise SyntaxError(text=f"Argument '{arg}' should be of type {caster.__name__}", data_list=token, index=positions[num])
             
             #check if options remain or not
-            if arg_name in options:
-                if not arg in options[arg_name]:
-                    raise SyntaxError(text=f"Argument '{arg}' should be one of {options[arg_name]}", data_list=token, index=num + 1)
+            if options is not None and arg_cast not in options:
+                raise SyntaxError(text=f"Argument '{arg}' should be one of {spec.choices[num]}", data_list=token, index=positions[num])
+            flags[spec.names[num]] = arg_cast
+        
+        for num in range(len(args_provided), spec.arity):
+            flags[spec.names[num]] = spec.fallbacks[num]
+        
+        return functools.partial(spec.method, **flags)
+    
+    @staticmethod
+    def split_flags(token: list | tuple, expected_flags: dict) -> tuple[list, list, dict]:
+        """
+        Separates `--name value` flags from the positional arguments of a command token.
+        Every token after a `--` is positional, so an argument can start with `--` too: `add -- "--draft"`.
+
+        Parameters:
+            token (list | tuple): The command token, with the first element as the operator.
+            expected_flags (dict): Flag names (with '_' for '-') mapped to the type their value is cast to.
+
+        Returns:
+            tuple[list, list, dict]: The positional arguments, their indexes in `token`
+                                     and the cast flag values by name.
+
+        Raises:
+            SyntaxError: If a flag is unknown, has no value or its value has the wrong type.
+        """
+        args_provided, positions, flags = [], [], {}
+        arguments = enumerate(token)
+        next(arguments)
+        for index, arg in arguments:
+            if arg == '--':
+                for index, arg in arguments:
+                    args_provided.append(arg)
+                    positions.append(index)
+                break
+            if arg[:2] != '--':
+                args_provided.append(arg)
+                positions.append(index)
+                continue
             
+            name = arg[2:].replace('-', '_')
+            if name not in expected_flags:
+                raise SyntaxError(text=f"Unknown option '{arg}'", data_list=token, index=index)
+            if index + 1 >= len(token):
+                raise SyntaxError(text=f"Missing value for option '{arg}'", data_list=token+['_______'], index=len(token))
+            try:
+                flags[name] = expected_flags[name](next(arguments)[1])
+            except ValueError:
+                raise SyntaxError(text=f"Option '{arg}' should be of type {expected_flags[name].__name__}", data_list=token, index=index + 1)
         
-        return lambda: validate.method(**validate.generate_key(args_provided))
+        return args_provided, positions, flags
     
-    def get(self) -> callable:
+    def get(self, token: list | None = None) -> callable:
         """
         Retrieves command-line arguments, processes them, and checks for syntax errors.
         If the 'help' command is provided, it returns the help method instead.
 
+        Parameters:
+            token (list, optional): The command tokens. Defaults to `sys.argv[1:]`.
+
         Returns:
             callable | None: A callable function to execute the command, or None if no command is provided.
         """
-        token = sys.argv[1:]
+        token = sys.argv[1:] if token is None else token
         if token == [] or None:
             raise SyntaxError("There is no command to execute")
         
@@ -596,27 +4489,601 @@ class Parser:
                     f"Fallback: {fallback_display}, Options: {options_display})\n"
                 )
             
+            for flag_name, flag_type in (tok.flags or {}).items():
+                flag_display = Color.color('--' + flag_name.replace('_', '-'), 'yellow')
+                help_text += f"  - {flag_display} (Type: {Color.color(flag_type.__name__, 'blue')}, Optional)\n"
+            
             help_texts.append(help_text)
         
         return "\n".join(help_texts)
 
 
-def main():
-    database = Database()
+def run_batch(parser: Parser, database: Database, path: str = '-', chunk: int = 0) -> str:
+    """
+    Runs newline-delimited commands from a file (or stdin for '-') in this process, applying them
+    to the loaded data and writing the database once at the end, or once every `chunk` commands.
+    Blank lines and lines starting with '#' are skipped.
+
+    Args:
+        parser (Parser): Parser holding the command table used to validate every line.
+        database (Database): The database the commands are bound to.
+        path (str, optional): File to read the commands from, '-' for stdin. Defaults to '-'.
+        chunk (int, optional): Number of commands per write, 0 to write once at the end. Defaults to 0.
+
+    Returns:
+        str: A report with the result or the error of every line and a summary,
+             or one dict per line when the database is `structured`.
+    """
+    chunk = int(chunk)
+    report, done, failed = [], 0, 0
+    try:
+        fp = sys.stdin if path == '-' else open(path, mode="r", encoding="utf-8")
+    except OSError as e:
+        raise Database_error(f"Can not read batch file '{path}'", e)
+    
+    database.deferred = True
+    try:
+        with fp:
+            for number, line in enumerate(fp, start=1):
+                if not line.strip() or line.lstrip().startswith('#'):
+                    continue
+                prefix = Color.color(f"{number}:", 'b-blue')
+                try:
+                    command = shlex.split(line)
+                    if command[0].lower() == 'batch':
+                        raise SyntaxError(text="batch can not be nested", data_list=command, index=0)
+                    if command[0].lower() == 'watch':
+                        raise SyntaxError(text="watch never ends, it can not run in a batch", data_list=command, index=0)
+                    result = parser.check_syntax(command)()
+                    if not database.structured:
+                        result = join_output(result)
+                    elif not isinstance(result, (str, dict)):
+                        result = list(result)
+                except (SyntaxError, Database_error, ValueError) as e:
+                    failed += 1
+                    report.append({'line': number, 'error': str(e)} if database.structured else f"{prefix} {e}")
+                    continue
+                done += 1
+                report.append({'line': number, 'result': result} if database.structured else f"{prefix} {result}")
+                if chunk and done % chunk == 0:
+                    database.flush()
+    finally:
+        database.deferred = False
+        database.flush()
+    
+    if database.structured:
+        return report
+    report.append(Color.color(f"{done} commands executed, ","yellow")+Color.color(f"{failed} failed","red" if failed else "cyan"))
+    return '\n'.join(report)
+
+
+# statuses a task can have, as set by `Database.Add` and the mark-* commands
+TASK_STATUSES = ('todo', 'in-progress', 'done')
+TASK_FIELDS = ('description', 'status', 'createdAt', 'updatedAt')
+# optional fields of a task, only stored when they are set
+SCHEDULE_FIELDS = ('due', 'priority')
+OPTIONAL_FIELDS = SCHEDULE_FIELDS + ('completedAt',)
+PRIORITY_MAX = 65535
+# IDs reserved from the counter at a time while importing
+IMPORT_ID_BLOCK = 4096
+
+
+def _data_format(path: str, format: str | None) -> str:
+    """Picks the `import`/`export` format from `--format` or the file extension, NDJSON by default."""
+    format = (format or ('csv' if path.lower().endswith('.csv') else 'ndjson')).lower()
+    if format not in ('ndjson', 'csv'):
+        raise Database_error(f"Unknown format '{format}', expected 'ndjson' or 'csv'")
+    return format
+
+
+def read_records(fp, format: str):
+    """
+    Lazily parses an NDJSON or CSV stream.
+
+    Args:
+        fp: The open text stream.
+        format (str): 'ndjson' for one JSON object per line, 'csv' for a header row naming the fields.
+
+    Returns:
+        Iterator[tuple]: `(line number, record)` pairs, where the record is a dict or the
+                         `ValueError` raised while parsing its line.
+    """
+    if format == 'csv':
+        import csv
+        reader = csv.DictReader(fp)
+        for record in reader:
+            if None in record:
+                yield reader.line_num, ValueError("more values than header fields")
+            else:
+                yield reader.line_num, record
+        return
+    
+    for number, line in enumerate(fp, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except json.JSONDecodeError as e:
+            yield number, ValueError(f"invalid JSON: {e.msg}")
+
+
+def validate_task(record, now: float) -> dict:
+    """
+    Checks an imported record against the task schema `Database.Add` produces and normalizes it.
+    `status` defaults to 'todo', `createdAt` to `now` and `updatedAt` to `createdAt`; `due` and
+    `priority` are optional, and left out when empty or 0. `completedAt` is optional too and only
+    kept for done tasks. An `id` field is accepted (as written by `export`) but ignored, imported
+    tasks get new IDs.
+
+    Args:
+        record: The parsed record.
+        now (float): Timestamp for records without one.
+
+    Returns:
+        dict: The task, with the `TASK_FIELDS` and the `OPTIONAL_FIELDS` that are set.
+
+    Raises:
+        ValueError: If the record does not describe a valid task.
+    """
+    if isinstance(record, ValueError):
+        raise record
+    if not isinstance(record, dict):
+        raise ValueError("expected an object")
+    unknown = set(record) - set(TASK_FIELDS) - set(OPTIONAL_FIELDS) - {'id'}
+    if unknown:
+        raise ValueError(f"unknown fields {sorted(unknown)}")
+    
+    description = record.get('description')
+    if not isinstance(description, str) or not description.strip():
+        raise ValueError("'description' must be a non-empty string")
+    status = record.get('status') or 'todo'
+    if status not in TASK_STATUSES:
+        raise ValueError(f"'status' must be one of {TASK_STATUSES}, not {status!r}")
+    
+    created = record.get('createdAt')
+    created = now if created is None or created == '' else _timestamp(created, 'createdAt')
+    updated = record.get('updatedAt')
+    updated = created if updated is None or updated == '' else _timestamp(updated, 'updatedAt')
+    task = {'description': description, 'status': status, 'createdAt': created, 'updatedAt': updated}
+    
+    due = record.get('due')
+    due = None if due is None or due == '' else _timestamp(due, 'due')
+    if due:
+        task['due'] = due
+    level = record.get('priority')
+    if level is not None and level != '':
+        try:
+            if isinstance(level, bool) or not isinstance(level, (int, str)):
+                raise ValueError
+            level = priority(str(level))
+        except ValueError:
+            raise ValueError(f"'priority' must be a whole number from 0 to {PRIORITY_MAX}, not {level!r}")
+        if level:
+            task['priority'] = level
+    completed = record.get('completedAt')
+    if status == 'done' and completed is not None and completed != '':
+        task['completedAt'] = _timestamp(completed, 'completedAt')
+    return task
+
+
+# units of the offsets from now `timestamp` accepts, like `+2d`
+TIME_UNITS = {'m': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+
+def timestamp(text: str) -> float:
+    """
+    Parses a point in time given as a unix timestamp, a local ISO 8601 date and time, like `2024-11-01T14:30`,
+    or an offset from now in minutes, hours, days or weeks, like `+2d` or `-90m`.
+    """
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    if text[:1] in ('+', '-') and text[-1:] in TIME_UNITS:
+        return time.time() + float(text[:-1]) * TIME_UNITS[text[-1]]
+    import datetime
+    return datetime.datetime.fromisoformat(text).timestamp()
+
+
+def deadline(text: str) -> float:
+    """Parses `--due`: a point in time read by `timestamp`, or 'none' for 0, which clears the due time."""
+    return 0.0 if text.lower() == 'none' else timestamp(text)
+
+
+def priority(text: str) -> int:
+    """Parses `--priority`: a whole number from 1 to `PRIORITY_MAX`, higher first, or 0 to clear it."""
+    level = int(text)
+    if not 0 <= level <= PRIORITY_MAX:
+        raise ValueError(f"priority must be from 0 to {PRIORITY_MAX}")
+    return level
+
+
+def _timestamp(value, field: str) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise ValueError(f"'{field}' must be a unix timestamp")
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f"'{field}' must be a unix timestamp, not {value!r}")
+
+
+def import_tasks(database: Database, path: str = '-', format: str | None = None) -> str:
+    """
+    Imports tasks from an NDJSON or CSV file (or stdin for '-'), streaming it record by record.
+    IDs are reserved in blocks of `IMPORT_ID_BLOCK` and every task is written in a single commit
+    at the end, so importing N tasks costs one write instead of N rewrites of the database.
+    Invalid records are reported with their line number instead of aborting the import.
+
+    Args:
+        database (Database): The database to import into.
+        path (str, optional): File to read, '-' for stdin. Defaults to '-'.
+        format (str, optional): 'ndjson' or 'csv'. Defaults to the file extension, or 'ndjson'.
+
+    Returns:
+        str: A summary with the first invalid records.
+    """
+    format = _data_format(path, format)
+    try:
+        fp = sys.stdin if path == '-' else open(path, mode="r", encoding="utf-8", newline='')
+    except OSError as e:
+        raise Database_error(f"Can not read import file '{path}'", e)
+    
+    imported, errors = 0, []
+    progress = sys.stderr.isatty()
+    now = time.time()
+    ids = range(0)
+    # the lock is held until the single write at the end, so the import is atomic for other writers
+    with fp, database.adding():
+        database.deferred = True
+        try:
+            for number, record in read_records(fp, format):
+                try:
+                    task = validate_task(record, now)
+                except ValueError as e:
+                    errors.append(f"{Color.color(f'{number}:', 'b-blue')} {e}")
+                    continue
+                if not ids:
+                    ids = database._allocate_ids(IMPORT_ID_BLOCK)
+                database._insert(str(ids[0]), task)
+                ids = ids[1:]
+                imported += 1
+                if progress and imported % 10_000 == 0:
+                    print(f"\r{imported} tasks imported", end='', file=sys.stderr, flush=True)
+            database._return_ids(ids)
+        finally:
+            database.deferred = False
+            database.flush()
+            if progress and imported >= 10_000:
+                print(file=sys.stderr)
+    
+    report = errors[:20]
+    if len(errors) > 20:
+        report.append(f"... and {len(errors) - 20} more")
+    report.append(Color.color(f"{imported} tasks imported, ","yellow")+Color.color(f"{len(errors)} invalid","red" if errors else "cyan"))
+    return '\n'.join(report)
+
+
+class _Echo:
+    """File-like object handing every written string back, so `csv.writer` can produce single lines."""
+    def write(self, text: str) -> str:
+        return text
+
+
+def export_tasks(database: Database, path: str = '-', format: str | None = None, filter: str = 'all'):
+    """
+    Exports tasks as NDJSON or CSV in ID order, streaming them row by row, with their `id` so
+    the file can be read back by `import` or other tools.
+
+    Args:
+        database (Database): The database to export.
+        path (str, optional): File to write, '-' for stdout. Defaults to '-'.
+        format (str, optional): 'ndjson' or 'csv'. Defaults to the file extension, or 'ndjson'.
+        filter (str, optional): Only export tasks with this status. Defaults to 'all'.
+
+    Returns:
+        Iterator[str] | str: The lines when exporting to stdout, a summary otherwise.
+    """
+    format = _data_format(path, format)
+    if format == 'csv':
+        import csv
+        # with a line terminator csv quotes descriptions holding line breaks, it is cut off again below
+        writer = csv.writer(_Echo(), lineterminator='\r\n')
+        lines = itertools.chain(
+            [writer.writerow(('id',) + TASK_FIELDS + OPTIONAL_FIELDS)[:-2]],
+            (writer.writerow((key, *(task[field] for field in TASK_FIELDS), *(task.get(field, '') for field in OPTIONAL_FIELDS)))[:-2]
+             for key, task in database._select(filter))
+        )
+    else:
+        lines = (json.dumps({'id': int(key), **task}, ensure_ascii=False) for key, task in database._select(filter))
+    if path == '-':
+        return lines
+    
+    count = -1 if format == 'csv' else 0
+    try:
+        with open(path, mode="w", encoding="utf-8", newline='') as fp:
+            for line in lines:
+                fp.write(line + '\n')
+                count += 1
+    except OSError as e:
+        raise Database_error(f"Can not write export file '{path}'", e)
+    return Color.color(f"Exported {count} tasks to ","yellow")+Color.color(path,"cyan")
+
+
+# `--format` of the command output, every format but the table needs `Database.structured` results
+OUTPUT_FORMATS = ('table', 'json', 'ndjson', 'tsv')
+
+
+def _tsv_field(value) -> str:
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        return value.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+_TASK_RECORD = ('id',) + TASK_FIELDS
+_encode_json = json.JSONEncoder(ensure_ascii=False, check_circular=False).encode
+
+
+def _json_record(record: dict, encode_string=json.encoder.encode_basestring) -> str:
+    """
+    Returns one record as compact JSON on one line, like `json.dumps(record, ensure_ascii=False)`.
+    Task records are written with one f-string, about three times faster than the encoder
+    which every other record goes through.
+    """
+    if len(record) == 5 and tuple(record) == _TASK_RECORD:
+        description, status, created, updated = record['description'], record['status'], record['createdAt'], record['updatedAt']
+        if description.__class__ is str and status.__class__ is str and created.__class__ is float and updated.__class__ is float:
+            return (f'{{"id": {record["id"]}, "description": {encode_string(description)}, "status": {encode_string(status)}, '
+                    f'"createdAt": {created!r}, "updatedAt": {updated!r}}}')
+    return _encode_json(record)
+
+
+def render_output(result, format: str = 'table'):
+    """
+    Yields the lines of a command result in one of the `OUTPUT_FORMATS`, streaming results that are
+    produced lazily like `List` one by one instead of building the whole output first.
+
+    Args:
+        result: A message, a dict, or an iterable of table rows (`table`) or of dicts (other formats).
+        format (str, optional): One of `OUTPUT_FORMATS`. Defaults to 'table'.
+
+    Yields:
+        str: The lines of the output, without newlines. `json` puts a list on one line per element,
+             `ndjson` writes one object per line and `tsv` a header row with the keys of the first record.
+    """
+    if format == 'table':
+        if isinstance(result, str):
+            yield result
+        elif isinstance(result, dict):
+            yield json.dumps(result, ensure_ascii=False)
+        else:
+            yield from result
+        return
+    
+    if isinstance(result, str):
+        result = {'message': result}
+    if isinstance(result, dict):
+        if format == 'tsv':
+            for key, value in result.items():
+                yield f"{key}\t{_tsv_field(value)}"
+        else:
+            yield _encode_json(result)
+    elif format == 'ndjson':
+        yield from map(_json_record, result)
+    elif format == 'json':
+        prefix = '['
+        for record in result:
+            yield prefix + _json_record(record)
+            prefix = ','
+        yield '[]' if prefix == '[' else ']'
+    else:
+        columns = None
+        for record in result:
+            if columns is None:
+                columns = list(record)
+                if tuple(columns[:len(_TASK_RECORD)]) == _TASK_RECORD:
+                    # the optional task fields get their columns even when the first task has none
+                    columns = list(_TASK_RECORD + OPTIONAL_FIELDS)
+                yield '\t'.join(columns)
+            yield '\t'.join([_tsv_field(record.get(column)) for column in columns])
+
+
+def join_output(result, format: str = 'table') -> str:
+    """Returns a command result as one string, joining the lines of `render_output`."""
+    if isinstance(result, str) and format == 'table':
+        return result
+    return '\n'.join(render_output(result, format))
+
+
+def error_record(error: Exception) -> dict:
+    """
+    The result a failed command prints in the structured output formats, `{"error": message}`.
+    For a `SyntaxError` the message has no marker lines, and `argument` is the position of the
+    offending argument in the command when there is one.
+    """
+    if isinstance(error, SyntaxError):
+        record = {'error': error.text or "Invalid command"}
+        if error.arguments:
+            record['argument'] = error.index
+        return record
+    return {'error': str(error).rstrip(':')}
+
+
+def write_output(result, stream=None, format: str = 'table') -> None:
+    """Writes a command result to `stream` (stdout by default) line by line, see `render_output`."""
+    stream = stream or sys.stdout
+    for line in render_output(result, format):
+        stream.write(line + '\n')
+    stream.flush()
+
+
+# commands that are never forwarded to a running daemon
+LOCAL_COMMANDS = ('serve', 'batch', 'migrate', 'import', 'export', 'watch')
+
+
+def socket_path() -> str:
+    """Returns the path of the daemon's unix socket, `TASKCLI_SOCKET` or `task-cli.sock` next to the script."""
+    return os.environ.get('TASKCLI_SOCKET') or os.path.join(location, 'task-cli.sock')
+
+
+def select_project(database: Database, project: str) -> None:
+    """
+    Limits a `ShardedDatabase` to one project, for `--project`.
+
+    Raises:
+        Database_error: If the database is not sharded or the name is not a valid project name.
+    """
+    if not isinstance(database, ShardedDatabase):
+        raise Database_error("--project needs a sharded database, set TASKCLI_SHARDS to its root directory")
+    database.project = project
+
+
+def serve(parser: Parser, database: Database, interval: float = 1.0) -> str:
+    """
+    Keeps the database loaded and executes commands sent by `forward` over a unix domain socket
+    until SIGINT/SIGTERM is received. Mutations are collected in memory and written once per
+    `interval` seconds, and on shutdown.
+
+    Args:
+        parser (Parser): Parser holding the command table used to validate every request.
+        database (Database): The database the commands are bound to.
+        interval (float, optional): Seconds between two writes of the database. Defaults to 1.0.
+
+    Returns:
+        str: A message once the daemon stopped.
+
+    Raises:
+        Database_error: Raised if the platform has no unix domain sockets or the socket is in use.
+    """
+    if not hasattr(socket, 'AF_UNIX'):
+        raise Database_error("serve needs unix domain sockets, which this platform does not support")
+    
+    path = socket_path()
+    if forward(['help'], path) is not None:
+        raise Database_error("A daemon is already serving on", path)
+    if os.path.exists(path):
+        os.remove(path)  # left behind by a daemon that did not shut down cleanly
+    
+    import asyncio  # only the daemon needs it, and it is the slowest import of the CLI
+    database.deferred = True
+    try:
+        asyncio.run(_serve(parser, database, path, float(interval)))
+    finally:
+        database.deferred = False
+        database.close()
+        if os.path.exists(path):
+            os.remove(path)
+    return Color.color("Daemon stopped","yellow")
+
+
+async def _serve(parser: Parser, database: Database, path: str, interval: float) -> None:
+    """Runs the socket server and the write timer of `serve` until a stop signal arrives."""
+    import asyncio
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+    
+    async def handle(reader, writer):
+        colored, project = Color.enabled, database.project
+        try:
+            request = json.loads(await reader.readline())
+            # {"command": [...], "format": ..., "color": ..., "project": ...}, or just the command tokens
+            command = request.get('command') if isinstance(request, dict) else request
+            format = request.get('format', 'table') if isinstance(request, dict) else 'table'
+            Color.enabled = request.get('color', colored) if isinstance(request, dict) else colored
+            database.structured = format != 'table'
+            if isinstance(request, dict) and request.get('project') is not None:
+                select_project(database, request['project'])
+            if not command:
+                raise SyntaxError("There is no command to execute")
+            method_ = parser.help if command[0].lower() == 'help' else parser.check_syntax(command)
+            output = join_output(method_(), format)
+        except (SyntaxError, Database_error, ValueError) as e:
+            output = str(e) if format == 'table' else join_output(error_record(e), format)
+        except json.JSONDecodeError:
+            output = Color.color("Malformed request", 'red')
+        finally:
+            Color.enabled, database.structured = colored, False
+            if isinstance(database, ShardedDatabase):
+                database.project = project
+        writer.write(json.dumps({'output': output}, ensure_ascii=False).encode('utf-8') + b'\n')
+        await writer.drain()
+        writer.close()
+    
+    async def flush_timer():
+        while True:
+            await asyncio.sleep(interval)
+            database.flush()
+    
+    server = await asyncio.start_unix_server(handle, path)
+    timer = asyncio.create_task(flush_timer())
+    print(Color.color("Serving on ","yellow")+Color.color(path,"cyan"), flush=True)
+    async with server:
+        await stop.wait()
+    timer.cancel()
+
+
+def forward(command: list, path: str | None = None, format: str = 'table', project: str | None = None) -> str | None:
+    """
+    Sends a command to a running daemon and returns its output.
+
+    Args:
+        command (list): The command tokens, as in `sys.argv[1:]`.
+        path (str, optional): Path of the daemon's socket. Defaults to `socket_path()`.
+        format (str, optional): The output format, one of `OUTPUT_FORMATS`. Colors follow `Color.enabled`. Defaults to 'table'.
+        project (str, optional): The project of a sharded database the command is limited to. Defaults to none.
+
+    Returns:
+        str | None: The output of the command, or None if no daemon is running.
+    """
+    path = path or socket_path()
+    if not hasattr(socket, 'AF_UNIX') or not os.path.exists(path):
+        return None
+    
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(path)
+            request = {'command': command, 'format': format, 'color': Color.enabled}
+            if project is not None:
+                request['project'] = project
+            client.sendall(json.dumps(request, ensure_ascii=False).encode('utf-8') + b'\n')
+            client.shutdown(socket.SHUT_WR)
+            response = b''.join(iter(lambda: client.recv(65536), b''))
+        return json.loads(response)['output']
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def build_parser(database: Database) -> Parser:
+    """
+    Builds the command table bound to `database` and the parser validating commands against it.
+
+    Args:
+        database (Database): The database the commands operate on.
+
+    Returns:
+        Parser: A parser holding every command of the CLI.
+    """
     keywords = {
         'add': token(
             argument={'description': str},
             fallback=None,
             optiones=None,
             method=database.Add,
-            help_text='Adds a new item with the specified description.'
+            help_text='Adds a new item with the specified description. --due <time> sets when it is due (unix time, ISO date or +2d/+3h) and --priority <n> how important it is, higher first.',
+            flags={'due': deadline, 'priority': priority}
         ),
         'update': token(
             argument={'id_': int, 'description': str},
-            fallback=None,
+            fallback={'description': None},
             optiones=None,
             method=database.Update,
-            help_text='Updates the item with the specified ID to the new description.'
+            help_text='Updates the item with the specified ID to the new description, and/or its --due time and --priority (--due none and --priority 0 clear them).',
+            flags={'due': deadline, 'priority': priority}
         ),
         'delete': token(
             argument={'id_': int},
@@ -644,26 +5111,403 @@ def main():
             fallback={'filter': 'all'},
             optiones={'filter': ('done', 'todo', 'in-progress', 'all')},
             method=database.List,
-            help_text='Lists items based on the specified filter.'
+            help_text="Lists items based on the specified filter, one page at a time with --limit/--offset or after the ID given by --after, most recent first with --sort updated|created. --workers N formats large listings on N processes (0 for every core). --as-of <time> lists the tasks as they were at a unix time or ISO date.",
+            flags={'limit': int, 'offset': int, 'after': int, 'sort': str, 'workers': int, 'as_of': timestamp}
+        ),
+        'search': token(
+            argument={'query': str},
+            fallback=None,
+            optiones=None,
+            method=database.Search,
+            help_text="Lists the tasks whose description matches the query, best matches and most recently updated first: words are ANDed, OR separates alternatives and word* matches a prefix. Use --filter <status> and --limit.",
+            flags={'filter': str, 'limit': int}
+        ),
+        'undo': token(
+            argument={'count': int},
+            fallback={'count': 1},
+            optiones=None,
+            method=database.Undo,
+            help_text='Reverts the last change, or the last count changes, that were not undone yet.'
+        ),
+        'history': token(
+            argument={'id_': int},
+            fallback=None,
+            optiones=None,
+            method=database.History,
+            help_text='Lists every recorded change of the item with the specified ID.'
+        ),
+        'next': token(
+            argument={'count': int},
+            fallback={'count': 10},
+            optiones=None,
+            method=database.Next,
+            help_text='Lists the count open items that are due soonest, overdue items first.'
+        ),
+        'overdue': token(
+            argument={},
+            fallback=None,
+            optiones=None,
+            method=database.Overdue,
+            help_text='Lists the open items whose due time has passed, the longest overdue first. Use --limit.',
+            flags={'limit': int}
+        ),
+        'due': token(
+            argument={},
+            fallback=None,
+            optiones=None,
+            method=database.Due,
+            help_text='Lists the open items due before the time given by --before (every item with a due time without it), soonest first. Use --limit.',
+            flags={'before': timestamp, 'limit': int}
+        ),
+        'watch': token(
+            argument={},
+            fallback=None,
+            optiones=None,
+            method=database.Watch,
+            help_text='Prints the open items as they fall due until interrupted, sleeping until the next due time; --recheck <seconds> (60 by default) is the longest sleep, after which changes by other processes are picked up.',
+            flags={'recheck': float}
+        ),
+        'stats': token(
+            argument={},
+            fallback=None,
+            optiones=None,
+            method=database.Stats,
+            help_text="Prints the number of items per status, the items created and completed per day (--by week for weeks, --since <time> to start later) and the average time to done as JSON.",
+            flags={'by': str, 'since': timestamp}
+        ),
+        'migrate': token(
+            argument={'target': str},
+            fallback=None,
+            optiones={'target': ('sqlite', 'binary', 'segments', 'json')},
+            method=migrate,
+            help_text='Copies all tasks from Database.json, or the backend given by --source, into the storage of the given backend.',
+            flags={'source': str}
         ),
     }
     
     parser = Parser(keywords)
+    keywords['batch'] = token(
+        argument={'path': str, 'chunk': int},
+        fallback={'path': '-', 'chunk': 0},
+        optiones=None,
+        method=functools.partial(run_batch, parser, database),
+        help_text="Runs newline-delimited commands from a file ('-' for stdin), writing the database once per chunk of commands (0 for once at the end)."
+    )
+    keywords['import'] = token(
+        argument={'path': str},
+        fallback={'path': '-'},
+        optiones=None,
+        method=functools.partial(import_tasks, database),
+        help_text="Imports tasks from an NDJSON or CSV file ('-' for stdin, --format ndjson|csv), writing the database once.",
+        flags={'format': str}
+    )
+    keywords['export'] = token(
+        argument={'path': str},
+        fallback={'path': '-'},
+        optiones=None,
+        method=functools.partial(export_tasks, database),
+        help_text="Exports the tasks with the status given by --filter (all by default) as NDJSON or CSV to a file ('-' for stdout, --format ndjson|csv).",
+        flags={'format': str, 'filter': str}
+    )
+    keywords['serve'] = token(
+        argument={'interval': float},
+        fallback={'interval': 1.0},
+        optiones=None,
+        method=functools.partial(serve, parser, database),
+        help_text='Keeps the database loaded and serves commands over a unix socket, writing changes every interval seconds.'
+    )
+    return parser
 
-    # implementation
-    try: method_ = parser.get()
+
+class Tracer:
+    """
+    Instrumentation of one run for `--trace` / `TASKCLI_TRACE`: `perf_counter_ns` spans around the
+    hot stages, the bytes of the storage files the I/O stages read and wrote (`Database.bytes_read`
+    and `bytes_written`) and, with `TASKCLI_TRACE_MEMORY=1`, the tracemalloc peak of every span.
+    
+    Tracing is switched on by `install`, which wraps the traced methods in place. Nothing is wrapped
+    otherwise, so a run without tracing executes exactly the uninstrumented code.
+    
+    Attributes:
+        events (list): The finished spans as Chrome trace events (`ph: X`, microseconds since process start).
+        memory (bool): Whether the tracemalloc peak of every span is recorded.
+    """
+    # method name -> span name, wrapped on `Database` and every storage backend defining it
+    traced_methods = {'_load': 'load', '_update': 'update', '_persist': 'persist', '_refresh': 'refresh'}
+    io_spans = ('load', 'update', 'persist', 'refresh')
+    
+    def __init__(self, memory: bool = False) -> None:
+        self.events = []
+        self.memory = memory
+        self._origin = time.perf_counter_ns() - int((time.perf_counter() - started) * 1e9)
+        self._peaks = []
+        self._active = set()
+        if memory:
+            import tracemalloc
+            self._tracemalloc = tracemalloc
+            tracemalloc.start()
+    
+    @contextlib.contextmanager
+    def span(self, name: str, **args):
+        """
+        Times the code in the `with` block as a span named `name`.
+
+        Args:
+            name (str): The stage, like 'load'.
+            **args: Extra values stored with the span.
+        """
+        if self.memory:
+            # the peak is reset for this span, so the enclosing span keeps the peak reached so far
+            if self._peaks:
+                self._peaks[-1] = max(self._peaks[-1], self._tracemalloc.get_traced_memory()[1])
+            self._tracemalloc.reset_peak()
+            self._peaks.append(0)
+        start = time.perf_counter_ns()
+        try:
+            yield args
+        finally:
+            duration = time.perf_counter_ns() - start
+            if self.memory:
+                peak = max(self._peaks.pop(), self._tracemalloc.get_traced_memory()[1])
+                if self._peaks:
+                    self._peaks[-1] = max(self._peaks[-1], peak)
+                args['tracemalloc_peak'] = peak
+            self.events.append({'name': name, 'ph': 'X', 'ts': (start - self._origin) / 1e3, 'dur': duration / 1e3,
+                                'pid': os.getpid(), 'tid': 0, 'args': args})
+    
+    def wrap(self, name: str, function):
+        """
+        Returns `function` running inside a span named `name`, unless it is called from such a span (like `super()._load()`).
+        The spans of `io_spans` record how many bytes the database they were called on read and wrote.
+        """
+        @functools.wraps(function)
+        def traced(*args, **kwargs):
+            if name in self._active:
+                return function(*args, **kwargs)
+            self._active.add(name)
+            try:
+                with self.span(name) as values:
+                    if name not in self.io_spans:
+                        return function(*args, **kwargs)
+                    database = args[0]
+                    read, written = database.bytes_read, database.bytes_written
+                    try:
+                        return function(*args, **kwargs)
+                    finally:
+                        values['bytes_read'] = database.bytes_read - read
+                        values['bytes_written'] = database.bytes_written - written
+            finally:
+                self._active.discard(name)
+        return traced
+    
+    def generator(self, name: str, rows):
+        """
+        Passes the items of a lazy generator through, timing only the time spent producing them.
+        The total is recorded as one span starting at the first item, with the item count.
+        """
+        total, count, first = 0, 0, None
+        rows = iter(rows)
+        try:
+            while True:
+                start = time.perf_counter_ns()
+                first = first or start
+                try:
+                    row = next(rows)
+                except StopIteration:
+                    return
+                finally:
+                    total += time.perf_counter_ns() - start
+                count += 1
+                yield row
+        finally:
+            if first is not None:
+                self.events.append({'name': name, 'ph': 'X', 'ts': (first - self._origin) / 1e3, 'dur': total / 1e3,
+                                    'pid': os.getpid(), 'tid': 0, 'args': {'rows': count, 'cumulative': True}})
+    
+    def install(self) -> None:
+        """
+        Wraps the traced stages: the storage methods, `Parser.check_syntax` and `Database._format_table`,
+        which formats in this process or on the process pool, so a listing is one `format` span either way.
+        """
+        for cls in {Database, *STORAGE_BACKENDS.values()}:
+            for attribute, name in self.traced_methods.items():
+                if attribute in vars(cls):
+                    setattr(cls, attribute, self.wrap(name, vars(cls)[attribute]))
+        Parser.check_syntax = self.wrap('parse', Parser.check_syntax)
+        format_table = Database._format_table
+        Database._format_table = lambda database, tasks, workers=1: self.generator('format', format_table(database, tasks, workers))
+    
+    def summary(self) -> str:
+        """One line with the total time, the call count and the I/O bytes of every span name."""
+        totals = {}
+        for event in self.events:
+            total = totals.setdefault(event['name'], {'ms': 0.0, 'calls': 0, 'read': 0, 'written': 0, 'peak': 0})
+            total['ms'] += event['dur'] / 1e3
+            total['calls'] += 1
+            total['read'] += event['args'].get('bytes_read', 0)
+            total['written'] += event['args'].get('bytes_written', 0)
+            total['peak'] = max(total['peak'], event['args'].get('tracemalloc_peak', 0))
+        stages = []
+        for name, total in totals.items():
+            stage = f"{name} {total['ms']:.2f} ms"
+            if total['calls'] > 1:
+                stage += f" x{total['calls']}"
+            if total['read'] or total['written']:
+                stage += f" (read {total['read']} B, wrote {total['written']} B)"
+            if total['peak']:
+                stage += f" (peak {total['peak'] / 1e3:.0f} kB)"
+            stages.append(stage)
+        return Color.color("trace: ", 'yellow') + ' | '.join(stages)
+    
+    def report(self, target: str) -> None:
+        """
+        Writes the trace: a summary line to stderr when `target` is 'summary' (or '1'), otherwise
+        a Chrome trace file (`chrome://tracing`, Perfetto) at the path `target`.
+        """
+        if target in ('summary', '1'):
+            print(self.summary(), file=sys.stderr)
+            return
+        with open(target, mode="w", encoding="utf-8") as fp:
+            json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, fp)
+        print(Color.color("trace written to ", 'yellow') + Color.color(target, 'cyan'), file=sys.stderr)
+
+
+# options of the CLI itself rather than of a command, mapped to whether they take a value
+GLOBAL_OPTIONS = {'--profile-startup': False, '--trace': False, '--format': True, '--project': True}
+
+
+def split_global_options(command: list) -> tuple[dict, list]:
+    """
+    Takes the `GLOBAL_OPTIONS` off the front of the arguments. Only options before the command word
+    are global, everything after it belongs to the command, so `add "--profile-startup"` adds a task.
+
+    Args:
+        command (list): The arguments of the CLI.
+
+    Returns:
+        tuple[dict, list]: The given options by name, with their value or True, and the command.
+
+    Raises:
+        SyntaxError: If an option that takes a value is the last argument.
+    """
+    options = {}
+    position = 0
+    while position < len(command):
+        name, equals, value = command[position].partition('=')
+        if name not in GLOBAL_OPTIONS:
+            break
+        if GLOBAL_OPTIONS[name] and not equals:
+            if position + 1 == len(command):
+                raise SyntaxError(text=f"Missing value for option '{name}'", data_list=command + ['_______'], index=len(command))
+            position += 1
+            value = command[position]
+        options[name] = value if equals or GLOBAL_OPTIONS[name] else True
+        position += 1
+    return options, command[position:]
+
+
+def main(argv: list | None = None):
+    # colors only for a terminal, unless TASKCLI_COLOR=always|never says otherwise
+    colors = os.environ.get('TASKCLI_COLOR', 'auto').lower()
+    Color.enabled = colors == 'always' or colors != 'never' and sys.stdout.isatty()
+    try:
+        options, command = split_global_options(sys.argv[1:] if argv is None else list(argv))
     except SyntaxError as e: print(e); return
+    profile = '--profile-startup' in options
+    timings = {'import': time.perf_counter() - started}
+    
+    # --trace prints a summary, --trace=<file> writes a Chrome trace, like TASKCLI_TRACE=summary|<file>
+    trace = os.environ.get('TASKCLI_TRACE') or None
+    if '--trace' in options:
+        trace = 'summary' if options['--trace'] in (True, '') else options['--trace']
+    tracer = Tracer(memory=os.environ.get('TASKCLI_TRACE_MEMORY') == '1') if trace else None
+    span = tracer.span if tracer is not None else lambda name: contextlib.nullcontext()
+    if tracer is not None:
+        tracer.install()
+    
+    # --format json|ndjson|tsv before the command, after `import` and `export` it is their file format
+    format = options.get('--format', 'table')
+    if format not in OUTPUT_FORMATS:
+        print(SyntaxError(text=f"Output format should be one of {OUTPUT_FORMATS}", data_list=['--format', format], index=1))
+        return
+    Color.enabled = Color.enabled and format == 'table'
+    
+    # --project <name> limits a sharded database (TASKCLI_SHARDS) to one project
+    project = options.get('--project')
+    
+    # a running daemon already has the database loaded
+    start = time.perf_counter()
+    with span('forward'):
+        output = forward(command, format=format, project=project) if command and command[0].lower() not in LOCAL_COMMANDS else None
+    if output is not None:
+        print(output)
+        timings['forward'] = time.perf_counter() - start
+        if profile: print_profile(timings)
+        if tracer is not None: tracer.report(trace)
+        return
+    
+    # errors are printed like results, `{"error": ...}` in the structured formats
+    fail = lambda error: write_output(str(error) if format == 'table' else error_record(error), format=format)
+    try:
+        database = open_database()
+        if project is not None:
+            select_project(database, project)
+    except Database_error as e: fail(e); return
+    database.structured = format != 'table'
+    parser = build_parser(database)
+
+    # implementation
+    start = time.perf_counter()
+    try: method_ = parser.get(command)
+    except SyntaxError as e: fail(e); return
+    finally: timings['parse'] = time.perf_counter() - start
     
     #running the method
-    try: print(method_())
-    except (Database_error, ValueError) as e: print(e)
+    start = time.perf_counter()
+    try:
+        with span('execute'):
+            result = method_()
+        with span('output'):
+            write_output(result, format=format)
+    except (Database_error, ValueError) as e:
+        fail(e)
+    except BrokenPipeError:
+        # output piped into a command that stopped reading, like `head`
+        sys.stdout = open(os.devnull, 'w')
+    finally:
+        with span('close'):
+            database.close()
+        timings['load'] = database.load_seconds
+        timings['execute'] = time.perf_counter() - start - database.load_seconds
+        if profile: print_profile(timings)
+        if tracer is not None: tracer.report(trace)
+
 
+def print_profile(timings: dict) -> None:
+    """Prints the startup timings collected by `main` for --profile-startup to stderr."""
+    stages = ' | '.join(f"{stage} {seconds * 1e3:.2f} ms" for stage, seconds in timings.items())
+    total = Color.color(f"total {sum(timings.values()) * 1e3:.2f} ms", 'cyan')
+    print(Color.color("startup profile: ", 'yellow') + stages + ' | ' + total, file=sys.stderr)
 
-def color_fixer():
-    print(Color.color("Loading..", 'red'), flush=True)
-    os.system('cls' if os.name == 'nt' else "clear")
+
+def enable_terminal() -> None:
+    """
+    Makes the terminal interpret the ANSI color codes. Only the windows console needs this,
+    it is switched to virtual terminal processing in-process instead of through a `cls` shell.
+    """
+    if os.name != 'nt':
+        return
+    try:
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.GetStdHandle(-11)  # STD_OUTPUT_HANDLE
+        mode = ctypes.c_uint32()
+        if kernel32.GetConsoleMode(handle, ctypes.byref(mode)):
+            kernel32.SetConsoleMode(handle, mode.value | 0x0004)  # ENABLE_VIRTUAL_TERMINAL_PROCESSING
+    except (ImportError, AttributeError, OSError):
+        pass
 
 
 if __name__ == "__main__":
-    color_fixer()
-    main()
\ No newline at end of file
+    enable_terminal()
+    main()
@@ -0,0 +1,80 @@
+"""
+Shared fixtures of the task-cli tests.
+
+`task-cli.py` is a script with a dash in its name, so it is loaded from its file path like the
+benchmarks do. Every test gets its own database directory, and `open_database` opens one more
+`Database` on it, standing in for another process working on the same files.
+"""
+import os, sys, subprocess, importlib.util
+import pytest
+
+location = os.path.abspath(os.path.dirname(os.path.realpath(__file__)))
+script_path = os.path.join(os.path.dirname(location), 'task-cli.py')
+
+# (TASKCLI_STORAGE, TASKCLI_COMPACT) of every storage layout
+BACKENDS = {
+    'json': ('json', '0'),
+    'json-compact': ('json', '1'),
+    'wal': ('wal', '0'),
+    'wal-compact': ('wal', '1'),
+    'sqlite': ('sqlite', '0'),
+    'binary': ('binary', '0'),
+    'segments': ('segments', '0'),
+}
+
+
+@pytest.fixture(scope='session')
+def cli():
+    """The `task-cli.py` module."""
+    if 'task_cli' in sys.modules:
+        return sys.modules['task_cli']
+    spec = importlib.util.spec_from_file_location('task_cli', script_path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules['task_cli'] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(params=list(BACKENDS))
+def backend(request, monkeypatch) -> str:
+    """Runs the test once per storage layout, selected through the environment like the CLI does."""
+    storage, compact = BACKENDS[request.param]
+    monkeypatch.setenv('TASKCLI_STORAGE', storage)
+    monkeypatch.setenv('TASKCLI_COMPACT', compact)
+    return storage
+
+
+@pytest.fixture
+def database_path(tmp_path, monkeypatch) -> str:
+    """The `Database.json` path of the test, with no daemon to forward commands to."""
+    path = str(tmp_path / 'Database.json')
+    monkeypatch.setenv('TASKCLI_DATABASE', path)
+    monkeypatch.setenv('TASKCLI_SOCKET', str(tmp_path / 'none.sock'))
+    monkeypatch.delenv('TASKCLI_SHARDS', raising=False)
+    monkeypatch.delenv('TASKCLI_TRACE', raising=False)
+    return path
+
+
+@pytest.fixture
+def open_database(cli, database_path):
+    """Opens a new `Database` of the selected backend on the test database, closed after the test."""
+    opened = []
+
+    def open_():
+        database = cli.open_database(database_path)
+        opened.append(database)
+        return database
+
+    yield open_
+    for database in opened:
+        database.close()
+
+
+@pytest.fixture
+def run_cli(database_path):
+    """Runs `task-cli.py` in a child process on the test database and returns its output."""
+    def run(*command: str) -> str:
+        env = dict(os.environ, TASKCLI_COLOR='never')
+        return subprocess.run([sys.executable, script_path, *command], env=env, capture_output=True,
+                              text=True, check=True).stdout
+    return run
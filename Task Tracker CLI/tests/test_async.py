@@ -0,0 +1,70 @@
+"""`AsyncTaskStore`: concurrent calls share flushes, and every caller gets the outcome of its own call."""
+import asyncio
+
+
+def run(store, *calls):
+    """Runs the calls made by `calls(tasks)` concurrently on an `AsyncTaskStore` over `store` and returns their outcomes."""
+    async def main():
+        async with store as tasks:
+            return await asyncio.gather(*(call(tasks) for call in calls), return_exceptions=True)
+    return asyncio.run(main())
+
+
+def test_concurrent_adds_share_flushes(cli, backend, open_database, monkeypatch):
+    database = open_database()
+    flushes = []
+    persist = database._persist
+    monkeypatch.setattr(database, '_persist', lambda keys: (flushes.append(len(keys)), persist(keys)))
+    tasks = run(cli.AsyncTaskStore(database), *(lambda tasks, n=n: tasks.add(f"task {n}") for n in range(200)))
+    assert sorted(task.id for task in tasks) == list(range(200))
+    assert sum(flushes) == 200 and len(flushes) < 10
+    assert len(cli.TaskStore(open_database()).list()) == 200
+
+
+def test_failed_mutation_only_fails_its_caller(cli, backend, open_database):
+    added, missing, _ = run(
+        cli.AsyncTaskStore(open_database()),
+        lambda tasks: tasks.add("kept"),
+        lambda tasks: tasks.delete(7),
+        lambda tasks: tasks.list(),
+    )
+    assert added.description == "kept"
+    assert isinstance(missing, cli.Database_error) and missing.text == "Task with ID 7 does not exist."
+    assert [task.description for task in cli.TaskStore(open_database()).list()] == ["kept"]
+
+
+def test_unexpected_error_keeps_the_written_mutations(cli, backend, open_database):
+    store = cli.TaskStore(open_database())
+    update = store.update
+
+    def failing_update(id_, description=None, *args):
+        if description == "boom":
+            raise RuntimeError("boom")
+        return update(id_, description, *args)
+    store.update = failing_update
+
+    first, boom, second, renamed = run(
+        cli.AsyncTaskStore(store),
+        lambda tasks: tasks.add("first"),
+        lambda tasks: tasks.update(0, "boom"),
+        lambda tasks: tasks.add("second"),
+        lambda tasks: tasks.update(0, "renamed"),
+    )
+    assert (first.id, first.description) == (0, "first")
+    assert isinstance(boom, RuntimeError)
+    assert (second.id, second.description) == (1, "second")
+    assert renamed.description == "renamed"
+    assert [task.description for task in cli.TaskStore(open_database()).list()] == ["renamed", "second"]
+
+
+def test_failed_flush_fails_the_whole_batch(cli, open_database, monkeypatch):
+    database = open_database()
+    store = cli.AsyncTaskStore(database)
+
+    def persist(keys):
+        raise cli.Database_error("Error updating database")
+    monkeypatch.setattr(database, '_persist', persist)
+    outcomes = run(store, lambda tasks: tasks.add("one"), lambda tasks: tasks.add("two"))
+    assert all(isinstance(outcome, cli.Database_error) for outcome in outcomes)
+    monkeypatch.undo()
+    database.dirty.clear()
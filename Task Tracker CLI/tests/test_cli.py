@@ -0,0 +1,430 @@
+"""Command line parsing: arguments, options and the checks of their values."""
+import os, sys, json, signal, subprocess, tempfile
+import pytest
+
+
+@pytest.fixture
+def parser(cli, database_path):
+    return cli.build_parser(cli.Database(database_path))
+
+
+def test_double_dash_ends_the_options(parser):
+    command = parser.check_syntax(['add', '--', '--draft'])
+    assert command.keywords['description'] == '--draft'
+    command = parser.check_syntax(['update', '3', '--priority', '2', '--', '--renamed'])
+    assert (command.keywords['description'], command.keywords['priority']) == ('--renamed', 2)
+    command = parser.check_syntax(['list', '--limit', '5', '--', 'done'])
+    assert (command.keywords['filter'], command.keywords['limit']) == ('done', 5)
+
+
+def test_options_still_need_to_be_known(cli, parser):
+    with pytest.raises(cli.SyntaxError, match="Unknown option '--draft'"):
+        parser.check_syntax(['add', '--draft'])
+    with pytest.raises(cli.SyntaxError, match="Missing required argument"):
+        parser.check_syntax(['add', '--'])
+
+
+@pytest.mark.parametrize('arguments, message', [
+    ({'limit': -1}, "negative number of tasks"),
+    ({'offset': -2}, "skip a negative number"),
+])
+def test_negative_page_is_rejected(cli, backend, open_database, arguments, message):
+    store = cli.TaskStore(open_database())
+    store.add("one")
+    with pytest.raises(cli.Database_error, match=message):
+        store.list(**arguments)
+    with pytest.raises(cli.Database_error, match="negative number of tasks"):
+        store.search("one", limit=-1)
+
+
+def test_negative_limit_on_the_command_line(run_cli):
+    run_cli('add', "one")
+    assert run_cli('list', '--limit', '-1').startswith("Can not list a negative number of tasks")
+    assert run_cli('list', '--offset', '-2').startswith("Can not skip a negative number of tasks")
+    assert "islice" not in run_cli('search', 'one', '--limit', '-1')
+
+
+def test_global_options_only_before_the_command(cli):
+    split = cli.split_global_options
+    assert split(['--profile-startup', 'list', 'done']) == ({'--profile-startup': True}, ['list', 'done'])
+    assert split(['add', '--', '--profile-startup']) == ({}, ['add', '--', '--profile-startup'])
+    assert split(['list', '--profile-startup']) == ({}, ['list', '--profile-startup'])
+
+
+def test_global_option_as_description(run_cli):
+    run_cli('add', '--', '--profile-startup')
+    assert '--profile-startup' in run_cli('--profile-startup', 'list')
+
+
+def test_trace_only_before_the_command(cli, run_cli, tmp_path):
+    assert cli.split_global_options(['--trace=out.json', 'list']) == ({'--trace': 'out.json'}, ['list'])
+    run_cli('add', '--', '--trace')
+    assert '--trace' in run_cli('list')
+    trace = tmp_path / 'trace.json'
+    run_cli(f'--trace={trace}', 'list')
+    assert '"traceEvents"' in trace.read_text()
+
+
+def test_format_only_before_the_command(run_cli, tmp_path):
+    assert run_cli('--format', 'json', 'add', '--', '--format').startswith('{"id": 0')
+    assert run_cli('--format=ndjson', 'list').count('"description": "--format"') == 1
+    assert run_cli('--format', 'xml', 'list').startswith("Output format should be one of")
+    # after `export` --format is still the file format
+    assert run_cli('export', '-', '--format', 'csv').startswith('id,description')
+
+
+def test_trace_spans(run_cli, tmp_path, database_path):
+    run_cli('add', "one")
+    trace = tmp_path / 'trace.json'
+    run_cli(f'--trace={trace}', 'list', '--workers', '2')
+    events = json.loads(trace.read_text())['traceEvents']
+    assert [event['name'] for event in events].count('format') == 1
+    load = next(event for event in events if event['name'] == 'load')
+    assert load['args']['bytes_read'] == os.path.getsize(database_path)
+
+    run_cli(f'--trace={trace}', 'mark-done', '0')
+    events = json.loads(trace.read_text())['traceEvents']
+    update = next(event for event in events if event['name'] == 'update')
+    assert update['args']['bytes_written'] == os.path.getsize(database_path)
+
+
+@pytest.fixture
+def listing(cli, open_database, monkeypatch):
+    """A database of 40 tasks that `list --workers` formats in chunks of 7 tasks."""
+    monkeypatch.setattr(cli, 'PARALLEL_MIN_TASKS', 10)
+    monkeypatch.setattr(cli, 'PARALLEL_CHUNK', 7)
+    store = cli.TaskStore(open_database())
+    with store.batch():
+        for n in range(40):
+            store.add(f"task {n} " + "long description " * (n % 5))
+    return store.database
+
+
+def test_parallel_listing_matches_serial(cli, listing, monkeypatch):
+    monkeypatch.setattr(cli.os, 'sched_getaffinity', lambda pid: {0, 1}, raising=False)
+    serial = '\n'.join(listing.List('all'))
+    assert '\n'.join(listing.List('all', workers=2)) == serial
+    assert '\n'.join(listing.List('all', workers=0)) == serial
+    assert '\n'.join(listing.List('todo', limit=15, workers=2)) == '\n'.join(listing.List('todo', limit=15))
+
+
+def test_parallel_listing_on_one_core(cli, listing, monkeypatch):
+    monkeypatch.setattr(cli.os, 'sched_getaffinity', lambda pid: {0}, raising=False)
+    monkeypatch.setattr(cli.os, 'cpu_count', lambda: 1)
+    monkeypatch.setattr(cli.Database, '_format_parallel', None)  # not even started
+    assert cli.parallel_workers(4) == 1
+    assert list(listing.List('all', workers=4)) == list(listing.List('all'))
+
+
+@pytest.mark.parametrize('format', ['json', 'ndjson'])
+def test_syntax_errors_in_structured_formats(run_cli, format):
+    assert json.loads(run_cli('--format', format, 'lsit')) == {'error': "Invalid command", 'argument': 0}
+    assert json.loads(run_cli('--format', format, 'add')) == {'error': "Missing required argument: description", 'argument': 1}
+    assert json.loads(run_cli('--format', format, 'list', '--limit', 'x'))['error'] == "Option '--limit' should be of type int"
+    assert json.loads(run_cli('--format', format, 'delete', '7'))['error'] == "Task with ID 7 does not exist."
+
+
+def test_syntax_errors_in_tsv(run_cli):
+    assert run_cli('--format', 'tsv', 'lsit').splitlines() == ["error\tInvalid command", "argument\t0"]
+    assert run_cli('lsit').startswith("Invalid command\n>>> lsit")
+
+
+def test_startup_skips_the_slow_imports(cli):
+    # a fresh interpreter, pytest itself has imported most of these modules
+    slow = ('asyncio', 'threading', 'multiprocessing', 'concurrent.futures', 'csv')
+    code = f"import sys, runpy; runpy.run_path(sys.argv[1]); print([name for name in {slow!r} if name in sys.modules])"
+    output = subprocess.run([sys.executable, '-c', code, cli.__file__], capture_output=True, text=True, check=True).stdout
+    assert output.strip() == '[]'
+
+
+def test_cli_and_library_agree(cli, backend, run_cli, tmp_path):
+    # the commands render the same `Database` operations `TaskStore` returns
+    commands = [('add', 'write report', '--due', '2000', '--priority', '2'), ('add', 'review'), ('add', 'ship it'),
+                ('update', '1', 'review the report', '--due', '1000'), ('mark-done', '0'), ('mark-in-progress', '2'),
+                ('delete', '2'), ('add', 'report back')]
+    for command in commands:
+        run_cli(*command)
+    with cli.TaskStore(str(tmp_path / 'Library.json')) as store:
+        store.add("write report", due=2000, priority=2), store.add("review"), store.add("ship it")
+        store.update(1, "review the report", due=1000), store.mark(0, 'done'), store.mark(2, 'in-progress')
+        store.delete(2), store.add("report back")
+        expected = {
+            ('list',): store.list(),
+            ('list', 'todo', '--limit', '1'): store.list('todo', limit=1),
+            ('search', 'report'): store.search('report'),
+            ('due', '--before', '1500'): store.due(before=1500),
+            ('next',): store.next(),
+        }
+        with pytest.raises(cli.Database_error) as error:
+            store.delete(2)
+    
+    stamps = ('createdAt', 'updatedAt', 'completedAt')
+    for command, tasks in expected.items():
+        listed = [json.loads(line) for line in run_cli('--format', 'ndjson', *command).splitlines()]
+        assert [{key: value for key, value in task.items() if key not in stamps} for task in listed] == \
+               [{'id': task.id, 'description': task.description, 'status': task.status,
+                 **({'due': task.due} if task.due else {}), **({'priority': task.priority} if task.priority else {})}
+                for task in tasks], command
+    assert json.loads(run_cli('--format', 'json', 'delete', '2')) == {'error': error.value.text}
+
+
+@pytest.fixture
+def commands(tmp_path) -> str:
+    """A batch file with comments, blank lines, failing commands and a nested batch."""
+    path = tmp_path / 'commands'
+    path.write_text('add "first task"\n# comment\n\nadd\ndelete 9\nmark-done 0\nbatch more\nlist done\n')
+    return str(path)
+
+
+def test_batch_reports_every_line(cli, backend, run_cli, commands, open_database):
+    report = run_cli('batch', commands).splitlines()
+    assert report[0] == "1: Task added successfully, Task Id: 0"
+    assert report[1] == "4: Missing required argument: description"
+    assert [line for line in report if line[:2] in ('5:', '6:', '7:')] == [
+        "5: Task with ID 9 does not exist.:",
+        "6: Task with ID 0 updated:status changed from 'todo' to 'done'.",
+        "7: batch can not be nested",
+    ]
+    assert "first task" in report[-2] and report[-1] == "3 commands executed, 3 failed"
+    assert [task.status for task in cli.TaskStore(open_database()).list()] == ['done']
+
+
+@pytest.mark.parametrize('format', ['json', 'ndjson'])
+def test_batch_in_structured_formats(cli, backend, run_cli, commands, format):
+    output = run_cli('--format', format, 'batch', commands)
+    report = json.loads(output) if format == 'json' else [json.loads(line) for line in output.splitlines()]
+    assert [entry['line'] for entry in report] == [1, 4, 5, 6, 7, 8]
+    assert [sorted(entry) for entry in report] == [['line', 'result'], ['error', 'line'], ['error', 'line'],
+                                                   ['line', 'result'], ['error', 'line'], ['line', 'result']]
+    assert report[0]['result']['task']['status'] == 'todo'  # as it was added, not as the batch left it
+    assert report[2]['error'].startswith("Task with ID 9 does not exist.")
+    assert report[3]['result'] == {'id': 0, 'changes': {'status': {'old': 'todo', 'new': 'done'}}}
+    assert [task['id'] for task in report[5]['result']] == [0]
+
+
+def test_batch_writes_once_per_chunk(cli, open_database, tmp_path, monkeypatch):
+    database = open_database()
+    flushes = []
+    persist = database._persist
+    monkeypatch.setattr(database, '_persist', lambda keys: (flushes.append(len(keys)), persist(keys)))
+    path = tmp_path / 'adds'
+    path.write_text(''.join(f'add "task {n}"\n' for n in range(10)))
+    cli.run_batch(cli.build_parser(database), database, str(path), chunk=4)
+    assert flushes == [4, 4, 2]
+    assert len(cli.TaskStore(open_database()).list()) == 10
+
+
+@pytest.fixture
+def daemon(cli, database_path, monkeypatch):
+    """A `serve` daemon on the test database, writing every 60 seconds, stopped with SIGTERM after the test."""
+    directory = tempfile.mkdtemp(prefix='task-cli')  # socket paths are limited to about 100 bytes
+    monkeypatch.setenv('TASKCLI_SOCKET', os.path.join(directory, 'task-cli.sock'))
+    env = dict(os.environ, TASKCLI_COLOR='never')
+    process = subprocess.Popen([sys.executable, cli.__file__, 'serve', '60'], env=env, stdout=subprocess.PIPE, text=True)
+    assert process.stdout.readline().startswith("Serving on")
+    yield process
+    if process.poll() is None:
+        process.send_signal(signal.SIGTERM)
+        process.communicate(timeout=10)
+    os.rmdir(directory)
+
+
+def test_daemon_serves_forwarded_commands(cli, backend, daemon, run_cli, open_database):
+    assert run_cli('add', "served") == "Task added successfully, Task Id: 0\n"
+    assert cli.forward(['list']) is not None
+    assert "served" in run_cli('list')
+    assert json.loads(run_cli('--format', 'json', 'mark-done', '0'))['changes']['status'] == {'old': 'todo', 'new': 'done'}
+    assert json.loads(run_cli('--format', 'json', 'delete', '7')) == {'error': "Task with ID 7 does not exist."}
+    assert run_cli('lsit').startswith("Invalid command")
+    assert [task.description for task in cli.TaskStore(open_database()).list()] == []  # written every 60 seconds
+
+    daemon.send_signal(signal.SIGTERM)
+    assert daemon.communicate(timeout=10)[0] == "Daemon stopped\n"
+    assert not os.path.exists(os.environ['TASKCLI_SOCKET'])
+    assert [(task.description, task.status) for task in cli.TaskStore(open_database()).list()] == [("served", 'done')]
+
+
+def test_forward_without_daemon(cli, database_path):
+    assert cli.forward(['list']) is None
+
+
+@pytest.fixture(params=['0', '1'])
+def json_backend(request, monkeypatch) -> None:
+    """The `Database.json` storage, as dicts and as a `TaskTable`, the layouts `_recover` reads."""
+    monkeypatch.setenv('TASKCLI_STORAGE', 'json')
+    monkeypatch.setenv('TASKCLI_COMPACT', request.param)
+
+
+@pytest.mark.parametrize('damage', [
+    lambda data: data[:len(data) // 2],  # truncated by a crash of a writer that did not use `_update`
+    lambda data: b'\xff\xfe' + data,     # not even UTF-8
+])
+def test_corrupt_database_falls_back_to_the_backup(json_backend, run_cli, database_path, damage):
+    run_cli('add', "first")
+    run_cli('add', "second")  # keeps the file holding only "first" as Database.json.bak
+    with open(database_path, 'rb') as fp:
+        data = fp.read()
+    with open(database_path, 'wb') as fp:
+        fp.write(damage(data))
+
+    output = run_cli('list')
+    assert f"Loaded the previous generation from {database_path}.bak" in output
+    assert "first" in output and "second" not in output
+    run_cli('add', "third")  # replaces the damaged file
+    output = run_cli('list')
+    assert "Failed" not in output and "first" in output and "third" in output
+
+
+def test_corrupt_database_without_backup_is_moved_aside(json_backend, run_cli, database_path, tmp_path):
+    run_cli('add', "first")
+    for backup in (None, '{"0": '):  # no backup, then a damaged one
+        if backup is None:
+            os.remove(database_path + '.bak')
+        else:
+            with open(database_path + '.bak', 'w') as fp:
+                fp.write(backup)
+        with open(database_path, 'w') as fp:
+            fp.write('{"0": {"description": "fir')
+        output = run_cli('list')
+        assert "initialized a new empty Database" in output and "first" not in output
+    assert any('.corrupt-' in name for name in os.listdir(tmp_path))  # named by the second it was moved in
+    assert run_cli('add', "fresh").startswith("Task added successfully")
+    assert "fresh" in run_cli('list')
+
+
+def test_import_reports_invalid_lines(cli, backend, run_cli, tmp_path, open_database):
+    path = tmp_path / 'tasks.ndjson'
+    path.write_text('{"description": "ok"}\n\n{"description": ""}\nnot json\n[1]\n'
+                    '{"description": "x", "status": "late"}\n{"description": "y", "color": 1}\n'
+                    '{"description": "done", "status": "done", "createdAt": 1000}\n')
+    assert run_cli('import', str(path)).splitlines() == [
+        "3: 'description' must be a non-empty string",
+        "4: invalid JSON: Expecting value",
+        "5: expected an object",
+        "6: 'status' must be one of ('todo', 'in-progress', 'done'), not 'late'",
+        "7: unknown fields ['color']",
+        "2 tasks imported, 5 invalid",
+    ]
+    assert [(task.description, task.status) for task in cli.TaskStore(open_database()).list()] == [("ok", 'todo'), ("done", 'done')]
+
+
+def test_import_reports_csv_lines(cli, run_cli, tmp_path):
+    path = tmp_path / 'tasks.csv'
+    path.write_text('description,status,due\nok,todo,\n,todo,\nbad,todo,tomorrowish\nextra,todo,,1\n')
+    assert run_cli('import', str(path), '--format', 'csv').splitlines() == [
+        "3: 'description' must be a non-empty string",
+        "4: 'due' must be a unix timestamp, not 'tomorrowish'",
+        "5: more values than header fields",
+        "1 tasks imported, 3 invalid",
+    ]
+
+
+def test_import_shows_the_first_twenty_errors(run_cli, tmp_path):
+    path = tmp_path / 'tasks.ndjson'
+    path.write_text('{}\n' * 25)
+    report = run_cli('import', str(path)).splitlines()
+    assert report[0].startswith("1: ") and report[19].startswith("20: ")
+    assert report[20:] == ["... and 5 more", "0 tasks imported, 25 invalid"]
+
+
+@pytest.fixture
+def paged(cli, backend, open_database, monkeypatch):
+    """A store of 12 tasks, every third one done, updated in the order 11, 8, 5, 2 after they were all added."""
+    clock = iter(range(1000, 2000))
+    monkeypatch.setattr(cli.time, 'time', lambda: float(next(clock)))
+    store = cli.TaskStore(open_database())
+    for n in range(12):
+        store.add(f"task {n}")
+    for id_ in (11, 8, 5, 2):
+        store.mark(id_, 'done')
+    return store
+
+
+def ids(tasks) -> list:
+    return [task.id for task in tasks]
+
+
+def test_list_pages(paged):
+    assert ids(paged.list(limit=5)) == [0, 1, 2, 3, 4]
+    assert ids(paged.list(limit=5, offset=10)) == [10, 11]
+    assert ids(paged.list(limit=0)) == []
+    assert ids(paged.list(after=9)) == [10, 11]
+    assert ids(paged.list('todo', limit=3, after=3)) == [4, 6, 7]
+    assert ids(paged.list('done', offset=1)) == [5, 8, 11]
+    assert ids(paged.list(after=11)) == []
+
+
+def test_list_sorted_by_date(cli, paged):
+    assert ids(paged.list(sort='created', limit=3)) == [11, 10, 9]
+    assert ids(paged.list(sort='updated', limit=5)) == [2, 5, 8, 11, 10]
+    assert ids(paged.list('done', sort='updated', offset=1, limit=2)) == [5, 8]
+    with pytest.raises(cli.Database_error, match="in ID order"):
+        paged.list(sort='updated', after=3)
+    with pytest.raises(cli.Database_error, match="Can not sort by"):
+        paged.list(sort='due')
+
+
+def test_list_pages_on_the_command_line(paged, run_cli):
+    def listed(*arguments):
+        return [json.loads(line)['id'] for line in run_cli('--format', 'ndjson', 'list', *arguments).splitlines()]
+    assert listed('--limit', '2', '--offset', '3') == [3, 4]
+    assert listed('todo', '--after', '7') == [9, 10]
+    assert listed('--sort', 'updated', '--limit', '3') == [2, 5, 8]
+    # every page continues after the last ID of the one before
+    pages, after = [], -1
+    while page := listed('--limit', '5', '--after', str(after)):
+        pages.append(page)
+        after = page[-1]
+    assert pages == [[0, 1, 2, 3, 4], [5, 6, 7, 8, 9], [10, 11]]
+
+
+RECORDS = [
+    {'id': 0, 'description': 'tab\there, "quoted"\nnext line', 'status': 'todo', 'createdAt': 1.5, 'updatedAt': 2.0},
+    {'id': 1, 'description': 'dué', 'status': 'done', 'createdAt': 1.0, 'updatedAt': 3.0, 'due': 5.0, 'priority': 2, 'completedAt': 3.0},
+]
+
+
+def test_render_json_and_ndjson(cli):
+    assert json.loads(cli.join_output(RECORDS, 'json')) == RECORDS
+    assert json.loads(cli.join_output(iter(RECORDS), 'json')) == RECORDS  # streamed like `List`
+    assert [json.loads(line) for line in cli.render_output(iter(RECORDS), 'ndjson')] == RECORDS
+    # the fast path of plain task records writes the same JSON as the encoder
+    assert list(cli.render_output(iter(RECORDS), 'ndjson')) == [json.dumps(record, ensure_ascii=False) for record in RECORDS]
+    assert list(cli.render_output(iter([]), 'json')) == ['[]']
+    assert list(cli.render_output(iter([]), 'ndjson')) == []
+
+
+def test_render_tsv(cli):
+    lines = list(cli.render_output(iter(RECORDS), 'tsv'))
+    assert lines[0].split('\t') == ['id', 'description', 'status', 'createdAt', 'updatedAt', 'due', 'priority', 'completedAt']
+    assert lines[1] == '0\ttab\\there, "quoted"\\nnext line\ttodo\t1.5\t2.0\t\t\t'
+    assert lines[2] == '1\tdué\tdone\t1.0\t3.0\t5.0\t2\t3.0'
+    assert list(cli.render_output({'id': 0, 'changes': {'status': {'old': 'todo', 'new': 'done'}}}, 'tsv')) == \
+           ['id\t0', 'changes\t{"status": {"old": "todo", "new": "done"}}']
+
+
+@pytest.mark.parametrize('format', ['json', 'ndjson', 'tsv'])
+def test_render_messages_and_records(cli, format):
+    assert cli.join_output("Task added", format) == ('message\tTask added' if format == 'tsv' else '{"message": "Task added"}')
+    assert cli.join_output({'id': 3}, format) == ('id\t3' if format == 'tsv' else '{"id": 3}')
+    assert cli.join_output("Task added", 'table') == "Task added"
+
+
+@pytest.mark.parametrize('format', ['json', 'ndjson', 'tsv'])
+def test_listing_in_every_format(cli, backend, run_cli, format):
+    run_cli('add', "first\tcolumn", '--due', '5000')
+    run_cli('add', "second")
+    run_cli('mark-done', '1')
+    output = run_cli('--format', format, 'list')
+    if format == 'json':
+        records = json.loads(output)
+    elif format == 'ndjson':
+        records = [json.loads(line) for line in output.splitlines()]
+    else:
+        header, *rows = output.splitlines()
+        assert header.split('\t')[:3] == ['id', 'description', 'status'] and len(rows) == 2
+        records = [dict(zip(header.split('\t'), row.split('\t'))) for row in rows]
+        assert records[0]['description'] == 'first\\tcolumn' and records[0]['due'] == '5000.0'
+        return
+    assert [(record['id'], record['description'], record['status']) for record in records] == [(0, "first\tcolumn", 'todo'), (1, "second", 'done')]
+    assert records[0]['due'] == 5000 and 'completedAt' in records[1] and '\x1b' not in output
@@ -0,0 +1,187 @@
+"""The persisted indexes notice writes that were made without updating them, and are rebuilt."""
+import json
+import pytest
+
+
+def test_search_index_sees_migrated_tasks(cli, backend, open_database):
+    store = cli.TaskStore(open_database())
+    store.add("report for the board")
+    assert [task.id for task in store.search("json")] == []
+
+    # `migrate` writes the storage without recording the tasks in the search index
+    open_database().migrate({'7': {'description': "json only task", 'status': 'todo', 'createdAt': 1.0, 'updatedAt': 1.0}})
+    assert [task.id for task in store.search("json")] == [7]
+    assert [task.id for task in cli.TaskStore(open_database()).search("json")] == [7]
+
+
+def test_search_index_sees_writes_of_other_process(cli, backend, open_database, run_cli):
+    store = cli.TaskStore(open_database())
+    store.add("invoice march")
+    assert [task.id for task in store.search("invoice")] == [0]
+
+    run_cli('add', "invoice april")
+    run_cli('update', '0', "receipt march")
+    assert [task.id for task in store.search("invoice")] == [1]
+    assert [task.id for task in store.search("receipt")] == [0]
+
+
+def test_search_after_migrating_to_sqlite(cli, database_path, monkeypatch, run_cli):
+    run_cli('add', "json only task")
+    run_cli('add', "json other")
+    monkeypatch.setenv('TASKCLI_STORAGE', 'sqlite')
+    assert 'json' not in run_cli('search', 'json')  # builds the index of the empty sqlite file
+
+    monkeypatch.setenv('TASKCLI_STORAGE', 'json')
+    run_cli('migrate', 'sqlite')
+    monkeypatch.setenv('TASKCLI_STORAGE', 'sqlite')
+    output = run_cli('search', 'json')
+    assert "json only task" in output and "json other" in output
+
+
+def test_stats_see_migrated_tasks(cli, backend, open_database):
+    store = cli.TaskStore(open_database())
+    store.add("counted")
+    assert store.stats()['tasks'] == 1
+
+    open_database().migrate({'7': {'description': "copied", 'status': 'done', 'createdAt': 1.0, 'updatedAt': 61.0}})
+    assert store.stats()['tasks'] == 2
+    stats = cli.TaskStore(open_database()).stats()
+    assert (stats['tasks'], stats['statuses'], stats['average_seconds_to_done']) == (2, {'done': 1, 'todo': 1}, 60.0)
+
+
+def test_stats_see_writes_of_other_process(cli, backend, open_database, run_cli):
+    store = cli.TaskStore(open_database())
+    store.add("one")
+    assert store.stats()['statuses'] == {'todo': 1}
+
+    run_cli('add', "two")
+    run_cli('mark-done', '0')
+    assert store.stats()['statuses'] == {'done': 1, 'todo': 1}
+
+
+def test_stats_after_migrating_to_sqlite(cli, database_path, monkeypatch, run_cli):
+    run_cli('add', "json only task")
+    run_cli('add', "json other")
+    monkeypatch.setenv('TASKCLI_STORAGE', 'sqlite')
+    assert '"tasks": 0' in run_cli('stats')
+
+    monkeypatch.setenv('TASKCLI_STORAGE', 'json')
+    run_cli('migrate', 'sqlite')
+    monkeypatch.setenv('TASKCLI_STORAGE', 'sqlite')
+    assert '"tasks": 2' in run_cli('stats')
+
+
+def test_stats_by_week(cli):
+    day = cli.time.mktime((2024, 12, 30, 12, 0, 0, 0, 0, -1))  # monday of ISO week 1 of 2025
+    stats = cli.TaskStats.build([('0', {'status': 'todo', 'createdAt': day, 'updatedAt': day})], '')
+    assert stats.report('week')['created'] == {'2025-W01': 1}
+
+
+def test_stats_keep_the_completion_of_edited_done_tasks(cli, backend, open_database, monkeypatch):
+    store = cli.TaskStore(open_database())
+    store.add("ship it")
+    store.add("still open")
+    completed_at = store.mark(0, 'done').completed_at
+    assert completed_at is not None
+    stats = store.stats()
+
+    now = cli.time.time()
+    monkeypatch.setattr(cli.time, 'time', lambda: now + 3 * 86400)
+    assert store.update(0, "shipped it").completed_at == completed_at
+    store.update(1, "still open, later")
+    assert store.stats() == stats
+    assert cli.TaskStore(open_database()).stats() == stats
+    open_database().migrate({})  # rebuilds the aggregates from the stored tasks
+    assert cli.TaskStore(open_database()).stats() == stats
+
+    assert store.mark(0, 'todo').completed_at is None
+    assert store.stats()['completed'] == {}
+
+
+def scheduled(store, **query):
+    return [task.id for task in store.due(**query)]
+
+
+def test_schedule_orders_by_due_time_then_priority(cli, backend, open_database):
+    store = cli.TaskStore(open_database())
+    store.add("later", due=3000)
+    store.add("soon", due=1000)
+    store.add("soon, important", due=1000, priority=3)
+    store.add("soon, urgent", due=1000, priority=5)
+    store.add("no due time", priority=9)
+    assert scheduled(store) == [3, 2, 1, 0]
+    assert [task.id for task in store.next(2)] == [3, 2]
+    assert [task.id for task in cli.TaskStore(open_database()).next()] == [3, 2, 1, 0]
+
+    store.update(1, priority=4)  # a changed priority moves the task among those due at the same time
+    store.update(0, due=500)
+    assert scheduled(store) == [0, 3, 1, 2]
+
+
+def test_schedule_drops_done_and_deleted_tasks(cli, backend, open_database):
+    store = cli.TaskStore(open_database())
+    for due in (1000, 2000, 3000, 4000):
+        store.add(f"due at {due}", due=due)
+    store.mark(0, 'done')
+    store.delete(1)
+    store.update(2, due=0)  # clearing the due time unschedules it too
+    assert scheduled(store) == [3]
+    assert scheduled(cli.TaskStore(open_database())) == [3]
+
+    store.mark(0, 'in-progress')  # reopened, due again
+    assert scheduled(store) == [0, 3]
+
+
+def test_due_before_is_exclusive(cli, backend, open_database):
+    store = cli.TaskStore(open_database())
+    for due in (1000, 2000, 2000.5, 3000):
+        store.add(f"due at {due}", due=due)
+    assert scheduled(store, before=2000) == [0]
+    assert scheduled(store, before=2000.5) == [0, 1]
+    assert scheduled(store, before=3000.001) == [0, 1, 2, 3]
+    assert scheduled(store, before=500) == []
+    assert scheduled(store, before=3000, limit=2) == [0, 1]
+    with pytest.raises(cli.Database_error):
+        store.due(limit=-1)
+
+
+def test_overdue_and_watch(cli, backend, open_database, monkeypatch):
+    store = cli.TaskStore(open_database())
+    now = cli.time.time()
+    store.add("tomorrow", due=now + 86400)
+    store.add("yesterday", due=now - 86400)
+    store.add("an hour ago", due=now - 3600, priority=1)
+    assert [task.id for task in store.overdue()] == [1, 2]
+
+    sleeps = []
+    def sleep(seconds):  # interrupted like the command by Ctrl-C, after the first wait
+        sleeps.append(seconds)
+        raise KeyboardInterrupt
+    monkeypatch.setattr(cli.time, 'sleep', sleep)
+    assert [task.id for task in store.watch(recheck=60)] == [1, 2]
+    assert len(sleeps) == 1 and 0 < sleeps[0] <= 60
+
+
+def test_schedule_sees_writes_of_other_process(cli, backend, open_database, run_cli):
+    store = cli.TaskStore(open_database())
+    store.add("here", due=2000)
+    assert scheduled(store) == [0]
+
+    run_cli('add', "there", '--due', '1000', '--priority', '2')
+    run_cli('update', '0', '--due', '500')
+    assert scheduled(store) == [0, 1]
+    run_cli('mark-done', '0')
+    assert scheduled(store) == [1]
+    for command, ids in ((('due', '--before', '1500'), [1]), (('next', '1'), [1]), (('overdue',), [1])):
+        assert [json.loads(line)['id'] for line in run_cli('--format', 'ndjson', *command).splitlines()] == ids
+
+
+def test_schedule_sees_migrated_tasks(cli, backend, open_database):
+    store = cli.TaskStore(open_database())
+    store.add("here", due=2000)
+    assert scheduled(store) == [0]
+
+    # `migrate` writes the storage without going through `_changed`, the schedule is rebuilt from it
+    open_database().migrate({'7': {'description': "copied", 'status': 'todo', 'createdAt': 1.0, 'updatedAt': 1.0, 'due': 1500.0}})
+    assert scheduled(store) == [7, 0]
+    assert scheduled(cli.TaskStore(open_database())) == [7, 0]
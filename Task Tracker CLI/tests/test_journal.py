@@ -0,0 +1,67 @@
+"""`undo` restores the tasks as they were, in ID order, on every backend."""
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def history(monkeypatch):
+    monkeypatch.setenv('TASKCLI_HISTORY', '1')
+
+
+def ids(tasks) -> list:
+    return [task.id for task in tasks]
+
+
+def test_undo_delete_restores_id_order(cli, backend, open_database):
+    store = cli.TaskStore(open_database())
+    for n in range(3):
+        store.add(f"task {n}")
+    store.delete(0)
+    store.undo()
+
+    for reader in (store, cli.TaskStore(open_database())):
+        assert ids(reader.list()) == [0, 1, 2]
+        assert ids(reader.list(limit=2)) == [0, 1]
+        assert ids(reader.list(after=0)) == [1, 2]
+        assert ids(reader.list('todo', limit=2)) == [0, 1]
+    assert store.add("task 3").id == 3
+
+
+def test_undo_delete_in_the_middle(cli, backend, open_database):
+    store = cli.TaskStore(open_database())
+    for n in range(5):
+        store.add(f"task {n}")
+    store.delete(1)
+    store.delete(3)
+    store.undo(2)
+    assert ids(cli.TaskStore(open_database()).list()) == [0, 1, 2, 3, 4]
+    assert ids(cli.TaskStore(open_database()).list(after=2)) == [3, 4]
+
+
+def test_undo_through_cli_process(cli, backend, open_database, run_cli):
+    store = cli.TaskStore(open_database())
+    for n in range(3):
+        store.add(f"task {n}")
+    run_cli('delete', '0')
+    run_cli('undo')
+    assert ids(store.list()) == [0, 1, 2]
+    assert run_cli('list', '--limit', '1').splitlines()[2].startswith('0 ')
+
+
+def test_undo_update_and_add(cli, backend, open_database):
+    store = cli.TaskStore(open_database())
+    store.add("first")
+    store.update(0, "renamed", due=100.0)
+    store.add("second")
+    store.undo(2)
+    task = cli.TaskStore(open_database()).get(0)
+    assert (task.description, task.due) == ("first", None)
+    assert ids(cli.TaskStore(open_database()).list()) == [0]
+
+
+def test_history_is_off_by_default(cli, backend, open_database, database_path, monkeypatch):
+    monkeypatch.delenv('TASKCLI_HISTORY')
+    store = cli.TaskStore(open_database())
+    store.add("not journaled")
+    with pytest.raises(cli.Database_error, match="TASKCLI_HISTORY=1"):
+        store.undo()
+    assert not [name for name in cli.os.listdir(cli.os.path.dirname(database_path)) if name.endswith('.history')]
@@ -0,0 +1,72 @@
+"""Sharded projects: one database per project under `TASKCLI_SHARDS`, with IDs unique over all of them."""
+import pytest
+
+
+@pytest.fixture
+def shards(tmp_path, database_path, monkeypatch) -> str:
+    root = str(tmp_path / 'shards')
+    monkeypatch.setenv('TASKCLI_SHARDS', root)
+    monkeypatch.delenv('TASKCLI_PROJECT', raising=False)
+    return root
+
+
+def test_sharded_database_has_the_database_attributes(cli, shards, database_path):
+    database = cli.ShardedDatabase(shards)
+    missing = [name for name in vars(cli.Database(database_path)) if not hasattr(database, name)]
+    assert missing == []
+    assert database.journal is None and database.blocks is not None
+
+
+def test_project_only_before_the_command(cli, backend, shards, run_cli):
+    run_cli('--project', 'web', 'add', "Fix the login page")
+    run_cli('--project', 'docs', 'add', '--', "--project docs")
+    assert "Fix the login page" in run_cli('--project', 'web', 'list')
+    assert "--project docs" not in run_cli('--project', 'web', 'list')
+    output = run_cli('list')
+    assert "Fix the login page" in output and "--project docs" in output
+    assert run_cli('add', "x", '--project', 'web').startswith("Unknown option '--project'")
+
+
+def test_ids_are_unique_over_projects(cli, backend, shards):
+    web, docs = cli.ShardedDatabase(shards, 'web'), cli.ShardedDatabase(shards, 'docs')
+    stores = [cli.TaskStore(web), cli.TaskStore(docs)]
+    ids = [store.add(f"task {n}").id for n in range(3) for store in stores]
+    assert len(set(ids)) == len(ids)
+    everything = cli.TaskStore(cli.ShardedDatabase(shards))
+    assert [task.id for task in everything.list()] == sorted(ids)
+    everything.mark(ids[1], 'done')
+    assert [task.id for task in cli.TaskStore(cli.ShardedDatabase(shards, 'docs')).list('done')] == [ids[1]]
+
+
+def test_changes_by_id_leave_other_projects_alone(cli, backend, shards, run_cli):
+    run_cli('--project', 'web', 'add', "Fix the login page")
+    assert run_cli('--project', 'wbe', 'mark-done', '0').startswith("Task with ID 0 does not exist.")
+    assert run_cli('--project', 'wbe', 'delete', '0').startswith("Task with ID 0 does not exist.")
+    assert cli.ShardedDatabase(shards).projects() == ['web']
+    run_cli('mark-done', '0')
+    assert "done" in run_cli('--project', 'web', 'list')
+
+
+def test_listing_pages_are_merged_lazily(cli, backend, shards, monkeypatch):
+    monkeypatch.setenv('TASKCLI_SHARD_BLOCK', '2')  # the IDs of the projects interleave every two tasks
+    stores = {name: cli.TaskStore(cli.ShardedDatabase(shards, name)) for name in ('web', 'docs', 'ops')}
+    for n in range(10):
+        for store in stores.values():
+            store.add(f"task {n}")
+    everything = cli.ShardedDatabase(shards)
+    ids = [int(key) for key, _ in everything._query()]
+    assert ids == sorted(ids) and len(ids) == 30
+    assert [int(key) for key, _ in everything._query(limit=5, offset=4)] == ids[4:9]
+    assert [int(key) for key, _ in everything._query(limit=3, after=ids[10])] == ids[11:14]
+    newest = [int(key) for key, _ in everything._query(sort='created')]
+    assert [int(key) for key, _ in everything._query(sort='created', limit=4, offset=2)] == newest[2:6]
+    
+    taken = []
+    query = cli.Database._query
+    def counted(shard, *args):
+        for item in query(shard, *args):
+            taken.append(item)
+            yield item
+    monkeypatch.setattr(cli.Database, '_query', counted)
+    assert len(list(everything._query(limit=2))) == 2
+    assert len(taken) <= 2 + len(stores)  # `heapq.merge` holds one task ahead of every shard
@@ -0,0 +1,78 @@
+"""Every storage backend sees and keeps the writes of other processes on the same files."""
+
+
+def test_update_by_other_process_is_seen(cli, backend, open_database):
+    first = cli.TaskStore(open_database())
+    first.add("original")
+    assert first.get(0).description == "original"
+
+    cli.TaskStore(open_database()).update(0, "changed by other")
+    assert first.get(0).description == "changed by other"
+
+    # a later change of the first store must not write its old copy back
+    first.mark(0, 'done')
+    task = cli.TaskStore(open_database()).get(0)
+    assert (task.description, task.status) == ("changed by other", 'done')
+
+
+def test_update_by_cli_process_is_seen(cli, backend, open_database, run_cli):
+    store = cli.TaskStore(open_database())
+    store.add("original")
+    assert store.get(0).description == "original"
+
+    run_cli('update', '0', "changed by the cli")
+    assert store.get(0).description == "changed by the cli"
+    store.mark(0, 'in-progress')
+    assert "changed by the cli" in run_cli('list', 'in-progress')
+
+
+def test_delete_by_other_process_is_seen(cli, backend, open_database):
+    first = cli.TaskStore(open_database())
+    first.add("one")
+    first.add("two")
+    cli.TaskStore(open_database()).delete(0)
+    assert [task.id for task in first.list()] == [1]
+    try:
+        first.get(0)
+    except cli.Database_error:
+        pass
+    else:
+        raise AssertionError("the deleted task was still handed out")
+
+
+def test_ids_are_unique_between_processes(cli, backend, open_database):
+    stores = [cli.TaskStore(open_database()) for _ in range(3)]
+    ids = [store.add(f"task {n}").id for n in range(4) for store in stores]
+    assert len(set(ids)) == len(ids)
+    assert sorted(task.id for task in cli.TaskStore(open_database()).list()) == sorted(ids)
+
+
+def test_list_is_read_inside_the_lock(cli, backend, open_database):
+    store = cli.TaskStore(open_database())
+    for n in range(3):
+        store.add(f"task {n}")
+    tasks = store.list()
+    cli.TaskStore(open_database()).delete(1)
+    assert [task.id for task in tasks] == [0, 1, 2]
+    assert [task.id for task in store.list()] == [0, 2]
+
+
+def test_snapshot_reads_are_not_changes(cli, open_database, monkeypatch):
+    monkeypatch.setenv('TASKCLI_STORAGE', 'binary')
+    monkeypatch.setattr(cli.SnapshotTasks, 'cache_size', 2)
+    database = open_database()
+    store = cli.TaskStore(database)
+    for n in range(5):
+        store.add(f"task {n}")
+    database.compact()
+
+    assert [store.get(n).description for n in range(5)] == [f"task {n}" for n in range(5)]
+    assert len(store.list('todo')) == 5 and [task.id for task in store.search("task")] != []
+    assert database.data.changes == {} and len(database.data.decoded) <= 2
+
+    store.update(1, "changed")
+    store.get(4)
+    store.get(3)  # pushes the changed task out of the read cache
+    assert list(database.data.changes) == [1]
+    assert [task.description for task in cli.TaskStore(open_database()).list()] == \
+        ["task 0", "changed", "task 2", "task 3", "task 4"]